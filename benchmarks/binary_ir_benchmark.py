@@ -0,0 +1,110 @@
+from typing import Any, Callable, List, Tuple
+from ir import IRClass
+from ir_binary import BinaryIRReader, get_class_paths, write_ir_binary
+from ir_registry import IRRegistry
+from ir_serializer import IRJsonWriter, write_ir_json
+import main
+import argparse
+import io
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+
+
+def to_json(value: Any) -> str:
+    output = io.StringIO()
+    writer = IRJsonWriter(output)
+    writer.write_value(value)
+    writer.flush()
+    return output.getvalue()
+
+
+def verify_round_trip(registry: IRRegistry, json_path: str, binary_path: str):
+    metadata = {'ir_version': main.IR_VERSION, 'tox_version': main.TOX_VERSION}
+    with BinaryIRReader(binary_path) as reader:
+        # Every class on its own, read from a fresh reader so nothing else was loaded before
+        for class_path, ir_class in get_class_paths(registry.classes):
+            with BinaryIRReader(binary_path) as class_reader:
+                if to_json(class_reader.get_class(class_path)) != to_json(ir_class):
+                    raise RuntimeError(f'The class {class_path} read from the binary IR differs from the JSON IR')
+
+        output = io.StringIO()
+        write_ir_json(output, reader.metadata, reader.enums, reader.exceptions, reader.classes)
+        with open(json_path) as f:
+            if output.getvalue() != f.read():
+                raise RuntimeError('The IR read from the binary IR differs from the JSON IR')
+        if reader.metadata != metadata:
+            raise RuntimeError('The metadata read from the binary IR differs from the JSON IR')
+
+
+def find_json_class(classes: List[dict], class_path: str) -> dict:
+    name, _, inner_path = class_path.partition('.')
+    ir_class = next(ir_class for ir_class in classes if ir_class['name'] == name)
+    return find_json_class(ir_class['inner_classes'], inner_path) if inner_path else ir_class
+
+
+def load_class_from_json(path: str, class_path: str) -> dict:
+    with open(path) as f:
+        return find_json_class(json.load(f)['classes'], class_path)
+
+
+def load_class_from_binary(path: str, class_path: str) -> IRClass:
+    with BinaryIRReader(path) as reader:
+        return reader.get_class(class_path)
+
+
+def measure(load: Callable[[str, str], Any], path: str, class_path: str, repeat: int) -> Tuple[float, int]:
+    best_time = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        load(path, class_path)
+        best_time = min(best_time, time.perf_counter() - start)
+
+    tracemalloc.start()
+    load(path, class_path)
+    peak_memory = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return best_time, peak_memory
+
+
+def main_benchmark():
+    arg_parser = argparse.ArgumentParser(
+        description='Verify that the binary IR reads back the same as the JSON IR and compare the time and peak memory '
+                    'of loading a single class from each.')
+    arg_parser.add_argument('--headers-dir', default=main.HEADERS_DIR, help='directory of the headers to generate from')
+    arg_parser.add_argument('--class-path', default='ToxOptions', help='class to load, e.g. Tox.Friend')
+    arg_parser.add_argument('--repeat', type=int, default=20, help='number of timed loads from each format')
+    args = arg_parser.parse_args()
+
+    registry = IRRegistry()
+    header_files = sorted(f'{args.headers_dir}/{header}' for header in os.listdir(args.headers_dir)
+                          if header.endswith('.h'))
+    main.generate_ir(header_files, registry, main.create_header_pipeline())
+    metadata = {'ir_version': main.IR_VERSION, 'tox_version': main.TOX_VERSION}
+
+    with tempfile.TemporaryDirectory() as output_dir:
+        json_path = f'{output_dir}/ir.json'
+        binary_path = f'{output_dir}/ir{main.BINARY_OUTPUT_EXTENSION}'
+        with open(json_path, 'w') as f:
+            write_ir_json(f, metadata, registry.enums, registry.exceptions, registry.classes)
+        with open(binary_path, 'wb') as f:
+            write_ir_binary(f, metadata, registry.enums, registry.exceptions, registry.classes)
+
+        verify_round_trip(registry, json_path, binary_path)
+        print('Round trip: the binary IR reads back the same as the JSON IR')
+
+        json_time, json_memory = measure(load_class_from_json, json_path, args.class_path, args.repeat)
+        binary_time, binary_memory = measure(load_class_from_binary, binary_path, args.class_path, args.repeat)
+        json_size = os.path.getsize(json_path)
+        binary_size = os.path.getsize(binary_path)
+
+    print(f'Loading the class {args.class_path}')
+    print(f'{"format":<8} {"size KiB":>10} {"time ms":>10} {"peak KiB":>10}')
+    print(f'{"json":<8} {json_size / 1024:>10.1f} {json_time * 1000:>10.3f} {json_memory / 1024:>10.1f}')
+    print(f'{"binary":<8} {binary_size / 1024:>10.1f} {binary_time * 1000:>10.3f} {binary_memory / 1024:>10.1f}')
+
+
+if __name__ == '__main__':
+    main_benchmark()
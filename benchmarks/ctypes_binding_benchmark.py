@@ -0,0 +1,360 @@
+from typing import Callable, List, Tuple
+from ctypes_binding import generate_ctypes_binding
+from ir_index import build_ir_index
+from ir_loader import load_ir
+from ir_registry import IRRegistry
+from ir_serializer import write_ir_json
+import main
+import argparse
+import ctypes
+import importlib.util
+import os
+import subprocess
+import tempfile
+import time
+
+STUB_SOURCE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tox_stub.c')
+
+
+def build_stub_library(headers_dir: str, output_dir: str) -> str:
+    path = f'{output_dir}/libtoxstub.so'
+    subprocess.run([os.environ.get('CC', 'cc'), '-shared', '-fPIC', '-O2', f'-I{headers_dir}', '-o', path,
+                    STUB_SOURCE], check=True)
+    return path
+
+
+def generate_binding(headers_dir: str, output_dir: str):
+    registry = IRRegistry()
+    header_files = sorted(f'{headers_dir}/{header}' for header in os.listdir(headers_dir) if header.endswith('.h'))
+    main.generate_ir(header_files, registry, main.create_header_pipeline())
+    ir_path = f'{output_dir}/ir.json'
+    with open(ir_path, 'w') as f:
+        write_ir_json(f, {'ir_version': main.IR_VERSION, 'tox_version': main.TOX_VERSION}, registry.enums,
+                      registry.exceptions, registry.classes, index=build_ir_index(registry.enums, registry.classes))
+
+    binding_path = f'{output_dir}/tox_binding.py'
+    with open(binding_path, 'w') as f:
+        f.write(generate_ctypes_binding(load_ir(ir_path)))
+    spec = importlib.util.spec_from_file_location('tox_binding', binding_path)
+    binding = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(binding)
+    return binding
+
+
+def address_of(value) -> int:
+    # The address of the memory of a bytes-like object, the one the C function must receive
+    if isinstance(value, bytes):
+        return ctypes.cast(ctypes.c_char_p(value), ctypes.c_void_p).value
+    view = memoryview(value)
+    if view.readonly:
+        raise ValueError('Only writable views have an address')
+    return ctypes.addressof(ctypes.c_char.from_buffer(view))
+
+
+def check(condition: bool, message: str):
+    if not condition:
+        raise RuntimeError(message)
+
+
+# The options that a client sets, all of them fields of the struct
+OPTIONS_VALUES = {'ipv6_enabled': False, 'udp_enabled': False, 'local_discovery_enabled': False, 'proxy_port': 8080,
+                  'start_port': 40000, 'end_port': 40100, 'tcp_port': 3389, 'hole_punching_enabled': False,
+                  'experimental_thread_safety': True}
+
+
+def set_options(options, values: dict):
+    for name, value in values.items():
+        setattr(options, name, value)
+
+
+def stub_function(library: ctypes.CDLL, name: str, restype, argtypes: list):
+    function = library[name]
+    function.restype = restype
+    function.argtypes = argtypes
+    return function
+
+
+def event_objects(get_event: Callable[[int], object]) -> list:
+    # The binding doesn't expose the number of events, the getter returns None past the last one
+    objects = []
+    event = get_event(0)
+    while event is not None:
+        objects.append(event)
+        event = get_event(len(objects))
+    return objects
+
+
+def drain_events(events) -> list:
+    # The fields of every event, reading an object for each
+    friend_messages = event_objects(events.get_friend_message)
+    file_recv_chunks = event_objects(events.get_file_recv_chunk)
+    return [
+        [(event.friend_number, int(event.type), event.message) for event in friend_messages],
+        [(event.friend_number, event.file_number, event.position, event.data) for event in file_recv_chunks],
+    ]
+
+
+def drain_events_batch(events) -> list:
+    # The same fields, read into the arrays of the batches
+    friend_messages = events.get_friend_message_batch()
+    offsets = friend_messages.message_offsets
+    file_recv_chunks = events.get_file_recv_chunk_batch()
+    data_offsets = file_recv_chunks.data_offsets
+    return [
+        [(friend_messages.friend_number[i], friend_messages.type[i],
+          bytes(friend_messages.message[offsets[i]:offsets[i + 1]])) for i in range(friend_messages.count)],
+        [(file_recv_chunks.friend_number[i], file_recv_chunks.file_number[i], file_recv_chunks.position[i],
+          bytes(file_recv_chunks.data[data_offsets[i]:data_offsets[i + 1]])) for i in range(file_recv_chunks.count)],
+    ]
+
+
+def verify_binding(binding, library: ctypes.CDLL):
+    last_data = stub_function(library, 'tox_stub_last_data', ctypes.c_void_p, [])
+    set_events_count = stub_function(library, 'tox_stub_set_events_count', None, [ctypes.c_void_p, ctypes.c_uint32])
+
+    options = binding.ToxOptions()
+    check(options.udp_enabled and options.start_port == 33445, 'The options don\'t have their default values')
+    options.udp_enabled = False
+    options.start_port = 40000
+    options.proxy_host = 'localhost'
+    check(not options.udp_enabled and options.start_port == 40000 and options.proxy_host == 'localhost',
+          'The options don\'t have the values they were set to')
+
+    # update() writes the plain fields to the struct of the options, the getters read what it wrote
+    options_size = stub_function(library, 'tox_stub_options_size', ctypes.c_size_t, [])
+    check(ctypes.sizeof(binding._ToxOptionsStruct) == options_size(), 'The struct of the options has the wrong size')
+    options.update(**OPTIONS_VALUES, proxy_host='example.org')
+    check(all(getattr(options, name) == value for name, value in OPTIONS_VALUES.items()),
+          'The options don\'t have the values update() wrote')
+    check(options.proxy_host == 'example.org', 'update() didn\'t set the proxy host')
+
+    with binding.Tox(options) as tox:
+        check(tox.self_public_key == bytes(range(32)), 'Wrong public key')
+        for name in ('name', b'name', bytearray(b'name'), memoryview(bytearray(b'xname'))[1:]):
+            tox.self_name = name
+            check(tox.self_name == 'name', f'Wrong name after setting it to {name!r}')
+        try:
+            tox.self_name = 'x' * 1000
+            raise RuntimeError('Setting a name that is too long didn\'t raise')
+        except binding.ToxSetInfoError as e:
+            check(e.code == binding.ToxErrSetInfo.TOO_LONG, f'Wrong error code {e.code!r}')
+
+        friends = [tox.add_friend_norequest(bytes([number]) * 32) for number in range(3)]
+        check([friend.number for friend in friends] == [0, 1, 2], 'Wrong friend numbers')
+        check(friends[1].public_key == bytes([1]) * 32, 'Wrong public key of a friend')
+        # The same number is the same object, until the friend is deleted and its number is given to another friend
+        check(all(a is b for a, b in zip(tox.self_friend_list, friends)), 'The friends aren\'t interned')
+        check(friends[1].send_file(0, 4, bytes(32), 'file') is friends[1].send_file(0, 4, bytes(32), 'file'),
+              'The files aren\'t interned')
+        file = friends[1].send_file(0, 4, bytes(32), 'file')
+        friends[1].delete()
+        check(tox.self_friend_list == [friends[0], friends[2]], 'Wrong friend list')
+        check(not friends[1].exists(), 'A deleted friend exists')
+        check(id(friends[1]) not in binding.File._interned, 'The files of a deleted friend are still interned')
+        check(tox.add_friend_norequest(bytes([1]) * 32) is not friends[1], 'A deleted friend is still interned')
+        tox.self_friend_list[1].delete()
+
+        # The memory of bytes, bytearray and writable memoryview objects is passed as it is
+        for data in (b'message', bytearray(b'message'), memoryview(bytearray(b'xmessage'))[1:]):
+            friends[0].send_message(binding.ToxMessageType.NORMAL, data)
+            check(last_data() == address_of(data), f'The message {data!r} was copied')
+            check(binding.Tox.hash(data) == bytes([sum(b'message') % 256]) * 32, 'Wrong hash')
+            check(last_data() == address_of(data), f'The data of the hash {data!r} was copied')
+        try:
+            friends[1].send_message(binding.ToxMessageType.NORMAL, b'message')
+            raise RuntimeError('Sending a message to a deleted friend didn\'t raise')
+        except binding.ToxFriendSendMessageError as e:
+            check(e.code == binding.ToxErrFriendSendMessage.FRIEND_NOT_FOUND, f'Wrong error code {e.code!r}')
+
+        file = friends[0].send_file(0, 4, bytes(32), 'file')
+        chunk = bytearray(4)
+        file.send_chunk(0, chunk)
+        check(last_data() == address_of(chunk), 'The chunk was copied')
+
+        names: List[Tuple[int, str]] = []
+        tox.callback_friend_name(lambda tox_, friend, name: names.append((friend.number, name)))
+        tox.iterate()
+        check(names == [(0, 'name'), (2, 'name')], f'Wrong calls of the friend name callback {names!r}')
+        tox.callback_friend_name(None)
+
+        # The chunks that callbacks receive are views of the library's memory, released when the callback returns
+        views: List[memoryview] = []
+
+        def file_recv_chunk(tox_, friend, file_, position, data):
+            check(bytes(data) == b'name', f'Wrong chunk {bytes(data)!r}')
+            check(ctypes.addressof(data.obj) == last_data(), 'The chunk was copied')
+            views.append(data)
+
+        tox.callback_file_recv_chunk(file_recv_chunk)
+        tox.iterate()
+        check(len(views) == 2, 'Wrong calls of the file chunk callback')
+        try:
+            bytes(views[0])
+            raise RuntimeError('The view of a chunk wasn\'t released after the callback')
+        except ValueError:
+            pass
+        tox.callback_file_recv_chunk(None)
+
+        # The batches hold the same fields as the event objects, read one by one
+        set_events_count(tox._handle, 20)
+        with tox.events_iterate(False) as events:
+            check(drain_events(events) == drain_events_batch(events), 'The batches differ from the event objects')
+            check(events.get_friend_message_batch().count == 20, 'Wrong number of friend messages in the batch')
+    options.close()
+
+
+# What a binding that doesn't use the buffer wrappers and size functions does: copy every buffer into a new ctypes
+# array and ask the library for the size of every buffer it returns
+class CopyingBinding:
+    def __init__(self, library: ctypes.CDLL):
+        self.send_message = library['tox_friend_send_message']
+        self.send_message.restype = ctypes.c_uint32
+        self.send_message.argtypes = [ctypes.c_void_p, ctypes.c_uint32, ctypes.c_int, ctypes.POINTER(ctypes.c_uint8),
+                                      ctypes.c_size_t, ctypes.POINTER(ctypes.c_int)]
+        self.send_chunk = library['tox_file_send_chunk']
+        self.send_chunk.restype = ctypes.c_bool
+        self.send_chunk.argtypes = [ctypes.c_void_p, ctypes.c_uint32, ctypes.c_uint32, ctypes.c_uint64,
+                                    ctypes.POINTER(ctypes.c_uint8), ctypes.c_size_t, ctypes.POINTER(ctypes.c_int)]
+        self.get_name_size = library['tox_self_get_name_size']
+        self.get_name_size.restype = ctypes.c_size_t
+        self.get_name_size.argtypes = [ctypes.c_void_p]
+        self.get_name = library['tox_self_get_name']
+        self.get_name.restype = None
+        self.get_name.argtypes = [ctypes.c_void_p, ctypes.POINTER(ctypes.c_uint8)]
+        self.get_friend_list_size = library['tox_self_get_friend_list_size']
+        self.get_friend_list_size.restype = ctypes.c_size_t
+        self.get_friend_list_size.argtypes = [ctypes.c_void_p]
+        self.get_friend_list = library['tox_self_get_friend_list']
+        self.get_friend_list.restype = None
+        self.get_friend_list.argtypes = [ctypes.c_void_p, ctypes.POINTER(ctypes.c_uint32)]
+        self.public_key_size = library['tox_public_key_size']
+        self.public_key_size.restype = ctypes.c_uint32
+        self.get_public_key = library['tox_self_get_public_key']
+        self.get_public_key.restype = None
+        self.get_public_key.argtypes = [ctypes.c_void_p, ctypes.POINTER(ctypes.c_uint8)]
+
+    def friend_send_message(self, tox, friend_number: int, message) -> int:
+        error = ctypes.c_int()
+        message = (ctypes.c_uint8 * len(message)).from_buffer_copy(message)
+        result = self.send_message(tox, friend_number, 0, message, len(message), ctypes.byref(error))
+        if error.value:
+            raise RuntimeError(f'tox_friend_send_message failed with {error.value}')
+        return result
+
+    def file_send_chunk(self, tox, friend_number: int, file_number: int, data):
+        error = ctypes.c_int()
+        data = (ctypes.c_uint8 * len(data)).from_buffer_copy(data)
+        self.send_chunk(tox, friend_number, file_number, 0, data, len(data), ctypes.byref(error))
+        if error.value:
+            raise RuntimeError(f'tox_file_send_chunk failed with {error.value}')
+
+    def self_get_friend_list(self, binding, tox) -> list:
+        friend_list = (ctypes.c_uint32 * self.get_friend_list_size(tox._handle))()
+        self.get_friend_list(tox._handle, friend_list)
+        return [binding.Friend(tox, number) for number in friend_list]
+
+    def self_get_name(self, tox) -> str:
+        name = (ctypes.c_uint8 * self.get_name_size(tox))()
+        self.get_name(tox, name)
+        return bytes(name).decode(errors='replace')
+
+    def self_get_public_key(self, tox) -> bytes:
+        public_key = (ctypes.c_uint8 * self.public_key_size())()
+        self.get_public_key(tox, public_key)
+        return bytes(public_key)
+
+
+def calls_per_second(call: Callable[[], object], number: int, repeat: int) -> float:
+    best_time = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            call()
+        best_time = min(best_time, time.perf_counter() - start)
+    return number / best_time
+
+
+def main_benchmark():
+    arg_parser = argparse.ArgumentParser(
+        description='Check the ctypes binding generated from the IR against a stub library compiled from the headers, '
+                    'and compare its calls per second with a binding that copies every buffer.')
+    arg_parser.add_argument('--headers-dir', default=main.HEADERS_DIR, help='directory of the headers to generate from')
+    arg_parser.add_argument('--sizes', default='16,1372,65536',
+                            help='comma-separated sizes in bytes of the messages (up to the maximum message length) and '
+                                 'file chunks that are sent')
+    arg_parser.add_argument('--number', type=int, default=100000, help='number of calls in a timed run')
+    arg_parser.add_argument('--repeat', type=int, default=5, help='number of timed runs of each call')
+    arg_parser.add_argument('--friends', type=int, default=32, help='number of friends in the listed friend list')
+    arg_parser.add_argument('--events', type=int, default=1000,
+                            help='number of events of each kind that one tox_events_iterate() returns')
+    args = arg_parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as output_dir:
+        library_path = build_stub_library(args.headers_dir, output_dir)
+        binding = generate_binding(args.headers_dir, output_dir)
+        library = binding.load_library(library_path)
+    verify_binding(binding, library)
+    print('The binding works with the stub library, passes bytes, bytearray and memoryview objects without copying '
+          'and lends the buffers of callbacks as views')
+
+    copying = CopyingBinding(library)
+    tox = binding.Tox(None)
+    tox.self_name = 'benchmark'
+    friend = tox.add_friend_norequest(bytes(32))
+    file = friend.send_file(0, 0, bytes(32), 'file')
+    message_type = binding.ToxMessageType.NORMAL
+    results: List[Tuple[str, float, float]] = []
+    for size in (int(size) for size in args.sizes.split(',')):
+        for kind, data in (('bytes', b'x' * size), ('bytearray', bytearray(size)),
+                           ('memoryview', memoryview(bytearray(size + 1))[1:])):
+            if size <= binding.Tox.max_message_length():
+                results.append((
+                    f'send_message {kind} {size}',
+                    calls_per_second(lambda: friend.send_message(message_type, data), args.number, args.repeat),
+                    calls_per_second(lambda: copying.friend_send_message(tox._handle, friend.number, data),
+                                     args.number, args.repeat),
+                ))
+            results.append((
+                f'send_chunk {kind} {size}',
+                calls_per_second(lambda: file.send_chunk(0, data), args.number, args.repeat),
+                calls_per_second(lambda: copying.file_send_chunk(tox._handle, friend.number, file.number, data),
+                                 args.number, args.repeat),
+            ))
+    results.append(('self_name', calls_per_second(lambda: tox.self_name, args.number, args.repeat),
+                     calls_per_second(lambda: copying.self_get_name(tox._handle), args.number, args.repeat)))
+    results.append(('self_public_key', calls_per_second(lambda: tox.self_public_key, args.number, args.repeat),
+                     calls_per_second(lambda: copying.self_get_public_key(tox._handle), args.number, args.repeat)))
+
+    # Listing the friends with an interned object for each or a new one every time
+    friends = [friend] + [tox.add_friend_norequest(bytes([number]) * 32) for number in range(1, args.friends)]
+    results.append((f'self_friend_list {len(friends)}',
+                    calls_per_second(lambda: tox.self_friend_list, args.number, args.repeat),
+                    calls_per_second(lambda: copying.self_get_friend_list(binding, tox), args.number, args.repeat)))
+
+    # Setting the options with a call to the library for each or writing them to the struct at once
+    options = binding.ToxOptions()
+    results.append((f'set {len(OPTIONS_VALUES)} options',
+                    calls_per_second(lambda: options.update(**OPTIONS_VALUES), args.number, args.repeat),
+                    calls_per_second(lambda: set_options(options, OPTIONS_VALUES), args.number, args.repeat)))
+    options.close()
+
+    # Reading the fields of the events of one iteration, with an object for every event or into the batch arrays
+    stub_function(library, 'tox_stub_set_events_count', None, [ctypes.c_void_p, ctypes.c_uint32])(
+        tox._handle, args.events)
+    events_number = max(1, args.number // (10 * args.events))
+    with tox.events_iterate(False) as events:
+        results.append((f'drain {args.events} events',
+                        calls_per_second(lambda: (events.get_friend_message_batch(),
+                                                  events.get_file_recv_chunk_batch()), events_number, args.repeat),
+                        calls_per_second(lambda: drain_events(events), events_number, args.repeat)))
+    tox.close()
+
+    # The binding column lists interned friends, writes the options with update() and drains the events into batches,
+    # the copying column makes a new object for every friend and event and sets every option with its setter
+    print(f'{"call":<28} {"binding/s":>12} {"copying/s":>12} {"speedup":>8}')
+    for call, binding_rate, copying_rate in results:
+        print(f'{call:<28} {binding_rate:>12.0f} {copying_rate:>12.0f} {binding_rate / copying_rate:>7.2f}x')
+
+
+if __name__ == '__main__':
+    main_benchmark()
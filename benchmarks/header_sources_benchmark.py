@@ -0,0 +1,93 @@
+from typing import Callable, Dict
+from download_headers import HEADERS_MANIFEST, read_headers_from_git, read_headers_from_tarball
+import main
+import argparse
+import os
+import subprocess
+import tarfile
+import tempfile
+import time
+
+HEADER_PATHS = {'tox.h': 'toxcore/tox.h', 'toxencryptsave.h': 'toxencryptsave/toxencryptsave.h'}
+
+
+def git(repo_dir: str, *args: str):
+    subprocess.run(['git', '-C', repo_dir, '-c', 'user.name=benchmark', '-c', 'user.email=benchmark@localhost'] +
+                   list(args), check=True, stdout=subprocess.DEVNULL)
+
+
+def create_stand_in_repository(repo_dir: str, headers: Dict[str, bytes], tag: str, commits: int):
+    # A repository laid out like c-toxcore with many tags, so finding the tag would be slow if tags were enumerated
+    git(repo_dir, 'init', '-q')
+    for path, content in headers.items():
+        os.makedirs(os.path.dirname(f'{repo_dir}/{path}'), exist_ok=True)
+        with open(f'{repo_dir}/{path}', 'wb') as f:
+            f.write(content)
+    for index in range(commits):
+        with open(f'{repo_dir}/CHANGELOG.md', 'a') as f:
+            f.write(f'Release {index}\n')
+        git(repo_dir, 'add', '-A')
+        git(repo_dir, 'commit', '-q', '-m', f'Release {index}')
+        git(repo_dir, 'tag', '-a', tag if index == commits - 1 else f'v0.0.{index}', '-m', f'Release {index}')
+
+
+def create_stand_in_tarball(tarball: str, repo_dir: str, tag: str):
+    with tarfile.open(tarball, 'w:gz') as archive:
+        archive.add(repo_dir, arcname=f'c-toxcore-{tag.lstrip("v")}', filter=lambda info: None
+                    if info.name.endswith('/.git') else info)
+
+
+def measure(read_headers: Callable[[str], None], download_dir: str, expected_headers: Dict[str, bytes]) -> float:
+    start = time.perf_counter()
+    read_headers(download_dir)
+    elapsed_time = time.perf_counter() - start
+    for path, content in expected_headers.items():
+        with open(f'{download_dir}/{os.path.basename(path)}', 'rb') as f:
+            if f.read() != content:
+                raise RuntimeError(f'The header {path} read from the stand-in source differs from the original')
+    return elapsed_time
+
+
+def main_benchmark():
+    arg_parser = argparse.ArgumentParser(
+        description='Read the headers from a local stand-in c-toxcore repository and release tarball, the first time '
+                    'and when they are unchanged.')
+    arg_parser.add_argument('--headers-dir', default=main.HEADERS_DIR, help='directory of the headers to put in the '
+                                                                            'stand-in repository')
+    arg_parser.add_argument('--tags', type=int, default=50, help='number of tags in the stand-in repository')
+    args = arg_parser.parse_args()
+
+    tag = 'v' + main.TOX_VERSION
+    headers: Dict[str, bytes] = {}
+    for header, path in HEADER_PATHS.items():
+        with open(f'{args.headers_dir}/{header}', 'rb') as f:
+            headers[path] = f.read()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        repo_dir = f'{work_dir}/c-toxcore'
+        os.mkdir(repo_dir)
+        create_stand_in_repository(repo_dir, headers, tag, args.tags)
+        tarball = f'{work_dir}/c-toxcore-{main.TOX_VERSION}.tar.gz'
+        create_stand_in_tarball(tarball, repo_dir, tag)
+
+        sources = {
+            'git': lambda download_dir: read_headers_from_git(download_dir, repo_dir, tag, list(headers)),
+            'tarball': lambda download_dir: read_headers_from_tarball(download_dir, tarball, list(headers)),
+        }
+        print(f'{"source":<10} {"first ms":>10} {"unchanged ms":>14}')
+        for source, read_headers in sources.items():
+            download_dir = f'{work_dir}/{source}'
+            os.mkdir(download_dir)
+            first_time = measure(read_headers, download_dir, headers)
+            modification_times = {header: os.stat(f'{download_dir}/{header}').st_mtime_ns for header in HEADER_PATHS}
+            unchanged_time = measure(read_headers, download_dir, headers)
+            if any(os.stat(f'{download_dir}/{header}').st_mtime_ns != modification_time
+                   for header, modification_time in modification_times.items()):
+                raise RuntimeError(f'Unchanged headers were written again from the {source} source')
+            if not os.path.exists(f'{download_dir}/{HEADERS_MANIFEST}'):
+                raise RuntimeError(f'The {source} source didn\'t write the manifest')
+            print(f'{source:<10} {first_time * 1000:>10.1f} {unchanged_time * 1000:>14.1f}')
+
+
+if __name__ == '__main__':
+    main_benchmark()
@@ -0,0 +1,89 @@
+from typing import Dict, List
+from ir_diff import apply_ir_delta, diff_ir, is_delta_empty
+from ir_index import build_ir_index
+from ir_loader import load_ir
+from ir_registry import IRRegistry
+from ir_serializer import write_ir_json
+import main
+import argparse
+import io
+import json
+import os
+import re
+import shutil
+import tempfile
+
+
+def write_variant_headers(headers_dir: str, variant_dir: str, removed_functions: List[str], defines: Dict[str, str]):
+    # A copy of the headers whose tox.h lacks the removed functions and has other values for the defines
+    os.makedirs(variant_dir)
+    for header in os.listdir(headers_dir):
+        if header.endswith('.h'):
+            shutil.copy(f'{headers_dir}/{header}', f'{variant_dir}/{header}')
+    with open(f'{variant_dir}/tox.h') as f:
+        text = f.read()
+    for func_name in removed_functions:
+        text, count = re.subn(rf'^[^;{{}}#]*\b{func_name}\([^;]*;\n', '', text, flags=re.MULTILINE)
+        if not count:
+            raise RuntimeError(f'There is no function {func_name} in tox.h')
+    for name, value in defines.items():
+        text, count = re.subn(rf'^(#define {name}) .*$', rf'\g<1> {value}', text, flags=re.MULTILINE)
+        if not count:
+            raise RuntimeError(f'There is no define {name} in tox.h')
+    with open(f'{variant_dir}/tox.h', 'w') as f:
+        f.write(text)
+
+
+def generate_ir_file(headers_dir: str, output_path: str, deduplicate: bool):
+    registry = IRRegistry()
+    header_files = sorted(f'{headers_dir}/{header}' for header in os.listdir(headers_dir) if header.endswith('.h'))
+    main.generate_ir(header_files, registry, main.create_header_pipeline())
+    with open(output_path, 'w') as f:
+        write_ir_json(f, {'ir_version': main.IR_VERSION, 'tox_version': main.TOX_VERSION}, registry.enums,
+                      registry.exceptions, registry.classes, deduplicate=deduplicate,
+                      index=build_ir_index(registry.enums, registry.classes))
+
+
+def check_round_trip(old_path: str, new_path: str, deduplicate: bool):
+    # The delta goes through JSON like the one the diff command writes
+    delta = json.loads(json.dumps(diff_ir(load_ir(old_path), load_ir(new_path))))
+    if is_delta_empty(delta):
+        raise RuntimeError(f'The delta from {old_path} to {new_path} is empty')
+    new_ir = apply_ir_delta(load_ir(old_path), delta)
+    output = io.StringIO()
+    write_ir_json(output, new_ir.metadata, new_ir.enums, new_ir.exceptions, new_ir.classes, deduplicate=deduplicate,
+                  index=new_ir.index)
+    with open(new_path) as f:
+        if output.getvalue() != f.read():
+            raise RuntimeError(f'Applying the delta from {old_path} to {new_path} gives another IR')
+
+
+def main_check():
+    arg_parser = argparse.ArgumentParser(
+        description='Check that applying the delta of ir_diff.py between the IRs of two variants of the headers to '
+                    'the older IR gives the newer IR byte for byte, in both directions and with and without '
+                    '--deduplicate.')
+    arg_parser.add_argument('--headers-dir', default=main.HEADERS_DIR, help='directory of the headers to generate from')
+    arg_parser.add_argument('--remove', nargs='*', default=['tox_conference_delete', 'tox_file_send_chunk'],
+                            metavar='FUNCTION', help='functions of tox.h that the variant lacks')
+    arg_parser.add_argument('--define', nargs='*', default=['TOX_PUBLIC_KEY_SIZE=33'], metavar='NAME=VALUE',
+                            help='defines of tox.h that have another value in the variant')
+    args = arg_parser.parse_args()
+
+    defines = dict(define.split('=', 1) for define in args.define)
+    with tempfile.TemporaryDirectory() as output_dir:
+        write_variant_headers(args.headers_dir, f'{output_dir}/variant', args.remove, defines)
+        for deduplicate in (False, True):
+            suffix = '_deduplicated' if deduplicate else ''
+            headers_path = f'{output_dir}/headers{suffix}.json'
+            variant_path = f'{output_dir}/variant{suffix}.json'
+            generate_ir_file(args.headers_dir, headers_path, deduplicate)
+            generate_ir_file(f'{output_dir}/variant', variant_path, deduplicate)
+            check_round_trip(variant_path, headers_path, deduplicate)
+            check_round_trip(headers_path, variant_path, deduplicate)
+    print('Applying the deltas between the IRs of the headers and of their variant gives the IRs byte for byte, in '
+          'both directions, with and without --deduplicate')
+
+
+if __name__ == '__main__':
+    main_check()
@@ -0,0 +1,101 @@
+from typing import List, Optional, Tuple
+from ir import IRClass, IRFunction, IRNativeHandle, IRProperty
+from ir_index import build_ir_index
+from ir_loader import LoadedIR, load_ir
+from ir_registry import IRRegistry
+from ir_serializer import write_ir_json
+from ir_shards import load_ir_shards, write_ir_shards
+import main
+import argparse
+import io
+import os
+import tempfile
+import time
+
+
+# What a consumer without the index does: walk every class until the function is found
+def naive_owner_of(ir_classes: List[IRClass], cname: str) -> Tuple[Optional[IRClass], Optional[IRProperty]]:
+    for ir_class in ir_classes:
+        functions: List[Tuple[Optional[IRFunction], Optional[IRProperty]]] = []
+        if isinstance(ir_class.handle, IRNativeHandle):
+            functions.extend([(ir_class.handle.alloc_func, None), (ir_class.handle.dealloc_func, None)])
+        functions.append((ir_class.default_init, None))
+        for ir_property in ir_class.properties:
+            functions.extend([(ir_property.getter, ir_property), (ir_property.setter, ir_property)])
+        functions.extend((func, None) for func in ir_class.functions)
+        for func, ir_property in functions:
+            if func and func.cname == cname:
+                return ir_class, ir_property
+
+        owner = naive_owner_of(ir_class.inner_classes, cname)
+        if owner[0]:
+            return owner
+    return None, None
+
+
+def verify_loaded_ir(loaded_ir: LoadedIR, json_path: str):
+    output = io.StringIO()
+    write_ir_json(output, loaded_ir.metadata, loaded_ir.enums, loaded_ir.exceptions, loaded_ir.classes,
+                  index=build_ir_index(loaded_ir.enums, loaded_ir.classes))
+    with open(json_path) as f:
+        if output.getvalue() != f.read():
+            raise RuntimeError(f'The IR loaded from {json_path} differs from the generated IR')
+
+
+def main_benchmark():
+    arg_parser = argparse.ArgumentParser(
+        description='Check that load_ir() and load_ir_shards() read back the generated IR and compare finding the '
+                    'owner of every C function with the prebuilt index of load_ir() and with a scan of the classes.')
+    arg_parser.add_argument('--headers-dir', default=main.HEADERS_DIR, help='directory of the headers to generate from')
+    arg_parser.add_argument('--repeat', type=int, default=5, help='number of timed runs of each lookup')
+    args = arg_parser.parse_args()
+
+    registry = IRRegistry()
+    header_files = sorted(f'{args.headers_dir}/{header}' for header in os.listdir(args.headers_dir)
+                          if header.endswith('.h'))
+    main.generate_ir(header_files, registry, main.create_header_pipeline())
+
+    with tempfile.TemporaryDirectory() as output_dir:
+        for deduplicate in (False, True):
+            json_path = f'{output_dir}/ir{"_deduplicated" if deduplicate else ""}.json'
+            with open(json_path, 'w') as f:
+                write_ir_json(f, {'ir_version': main.IR_VERSION, 'tox_version': main.TOX_VERSION},
+                              registry.enums, registry.exceptions, registry.classes, deduplicate=deduplicate,
+                              index=build_ir_index(registry.enums, registry.classes))
+        start = time.perf_counter()
+        loaded_ir = load_ir(f'{output_dir}/ir.json')
+        load_time = time.perf_counter() - start
+        verify_loaded_ir(loaded_ir, f'{output_dir}/ir.json')
+        verify_loaded_ir(load_ir(f'{output_dir}/ir_deduplicated.json'), f'{output_dir}/ir.json')
+        # The shards copy the objects they share, so they are compared by value: written without deduplication they
+        # must be the same JSON as the full IR
+        write_ir_shards(f'{output_dir}/shards', {'ir_version': main.IR_VERSION, 'tox_version': main.TOX_VERSION},
+                        registry.enums, registry.exceptions, registry.classes, deduplicate=True)
+        verify_loaded_ir(load_ir_shards(f'{output_dir}/shards'), f'{output_dir}/ir.json')
+
+    cnames = list(loaded_ir.index['functions'])
+    for cname in cnames:
+        if loaded_ir.owner_of(cname) != naive_owner_of(loaded_ir.classes, cname):
+            raise RuntimeError(f'The index and the scan disagree on the owner of {cname}')
+
+    indexed_time = naive_time = float('inf')
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        for cname in cnames:
+            loaded_ir.owner_of(cname)
+        indexed_time = min(indexed_time, time.perf_counter() - start)
+
+        start = time.perf_counter()
+        for cname in cnames:
+            naive_owner_of(loaded_ir.classes, cname)
+        naive_time = min(naive_time, time.perf_counter() - start)
+
+    print(f'Loading the IR: {load_time * 1000:.2f} ms')
+    print(f'Looking up the owner of {len(cnames)} C functions')
+    print(f'{"lookup":<8} {"time ms":>10}')
+    print(f'{"index":<8} {indexed_time * 1000:>10.3f}')
+    print(f'{"scan":<8} {naive_time * 1000:>10.3f}')
+
+
+if __name__ == '__main__':
+    main_benchmark()
@@ -0,0 +1,102 @@
+from typing import Dict, List, Tuple
+from benchmarks.synthetic_header import write_synthetic_header
+from ir import IRObject
+from ir_registry import IRRegistry
+import main
+import argparse
+import gc
+import os
+import sys
+import tempfile
+import tracemalloc
+
+
+def collect_ir_objects(registry: IRRegistry) -> Tuple[List[IRObject], List[list], List[str]]:
+    objects: List[IRObject] = []
+    lists: List[list] = []
+    strings: List[str] = []
+    visited = set()
+    stack: list = [registry.enums, registry.exceptions, registry.classes]
+    while stack:
+        obj = stack.pop()
+        if id(obj) in visited:
+            continue
+        if isinstance(obj, list):
+            visited.add(id(obj))
+            lists.append(obj)
+            stack.extend(obj)
+        elif isinstance(obj, IRObject):
+            visited.add(id(obj))
+            objects.append(obj)
+            stack.extend(obj.field_values())
+        elif isinstance(obj, str):
+            # Every string object once, so equal names that aren't interned count as many times as they're allocated
+            visited.add(id(obj))
+            strings.append(obj)
+    return objects, lists, strings
+
+
+def object_size(obj: object) -> int:
+    size = sys.getsizeof(obj)
+    if hasattr(obj, '__dict__'):
+        size += sys.getsizeof(obj.__dict__)
+    return size
+
+
+def measure_ir_memory(header_files: List[str]) -> Dict[str, float]:
+    # Parse first so the pyclibrary cache is warm and only the IR is left allocated after the measured run
+    main.generate_ir(header_files, IRRegistry(), main.create_header_pipeline())
+    gc.collect()
+
+    tracemalloc.start()
+    registry = IRRegistry()
+    main.generate_ir(header_files, registry, main.create_header_pipeline())
+    gc.collect()
+    retained_memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    objects, lists, strings = collect_ir_objects(registry)
+    nodes_memory = sum(object_size(obj) for obj in objects)
+    lists_memory = sum(sys.getsizeof(obj_list) for obj_list in lists)
+    return {
+        'strings': len(strings),
+        'distinct_strings': len(set(strings)),
+        'strings_memory': sum(sys.getsizeof(string) for string in strings),
+        'nodes': len(objects),
+        'nodes_memory': nodes_memory,
+        'bytes_per_node': nodes_memory / len(objects) if objects else 0,
+        'lists_memory': lists_memory,
+        'retained_memory': retained_memory,
+    }
+
+
+def main_benchmark():
+    arg_parser = argparse.ArgumentParser(
+        description='Measure the memory of the IR objects generated from the Tox headers and from a synthetic header.')
+    arg_parser.add_argument('--headers-dir', default=main.HEADERS_DIR, help='directory of the real headers')
+    arg_parser.add_argument('--groups', type=int, default=50,
+                            help='number of groups of declarations in the synthetic header')
+    args = arg_parser.parse_args()
+
+    results: List[Tuple[str, Dict[str, float]]] = []
+    if os.path.isdir(args.headers_dir):
+        header_files = sorted(f'{args.headers_dir}/{header}' for header in os.listdir(args.headers_dir)
+                              if header.endswith('.h'))
+        if header_files:
+            results.append((', '.join(os.path.basename(header) for header in header_files),
+                            measure_ir_memory(header_files)))
+    with tempfile.TemporaryDirectory() as headers_dir:
+        header_file = write_synthetic_header(headers_dir, args.groups)
+        results.append((f'synthetic ({args.groups} groups)', measure_ir_memory([header_file])))
+
+    print(f'{"headers":<30} {"nodes":>8} {"nodes KiB":>10} {"B/node":>8} {"lists KiB":>10} {"strings":>8} '
+          f'{"distinct":>9} {"strings KiB":>12} {"total IR KiB":>13}')
+    for name, result in results:
+        print(f'{name:<30} {result["nodes"]:>8} {result["nodes_memory"] / 1024:>10.1f} '
+              f'{result["bytes_per_node"]:>8.1f} {result["lists_memory"] / 1024:>10.1f} {result["strings"]:>8} '
+              f'{result["distinct_strings"]:>9} {result["strings_memory"] / 1024:>12.1f} '
+              f'{result["retained_memory"] / 1024:>13.1f}')
+
+
+if __name__ == '__main__':
+    main_benchmark()
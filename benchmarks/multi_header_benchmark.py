@@ -0,0 +1,61 @@
+from typing import List, Tuple
+from benchmarks.synthetic_header import write_synthetic_header
+from ir_registry import IRRegistry
+from ir_serializer import write_ir_json
+import main
+import argparse
+import io
+import os
+import shutil
+import tempfile
+import time
+
+
+def generate_cold(header_files: List[str], jobs: int) -> Tuple[float, str]:
+    # Parsing is most of the work, so the pyclibrary caches are removed before every run
+    for header_file in header_files:
+        if os.path.exists(f'{header_file}.cache'):
+            os.remove(f'{header_file}.cache')
+
+    registry = IRRegistry()
+    start = time.perf_counter()
+    main.generate_ir(header_files, registry, main.create_header_pipeline(), jobs=jobs)
+    elapsed_time = time.perf_counter() - start
+
+    output = io.StringIO()
+    write_ir_json(output, {}, registry.enums, registry.exceptions, registry.classes)
+    return elapsed_time, output.getvalue()
+
+
+def main_benchmark():
+    arg_parser = argparse.ArgumentParser(
+        description='Compare generating the headers one after another with generating them in parallel processes.')
+    arg_parser.add_argument('--headers-dir', default=main.HEADERS_DIR, help='directory of the headers to generate from')
+    arg_parser.add_argument('--groups', type=int, default=0,
+                            help='replace tox.h with a synthetic header with this number of groups of declarations')
+    arg_parser.add_argument('--jobs', type=int, default=os.cpu_count() or 1, help='number of parallel processes')
+    arg_parser.add_argument('--repeat', type=int, default=3, help='number of timed runs of each mode')
+    args = arg_parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as headers_dir:
+        for header in os.listdir(args.headers_dir):
+            if header in main.SUPPORTED_HEADERS_AND_BASE_CLASS:
+                shutil.copy(f'{args.headers_dir}/{header}', headers_dir)
+        if args.groups:
+            write_synthetic_header(headers_dir, args.groups)
+        header_files = sorted(f'{headers_dir}/{header}' for header in os.listdir(headers_dir))
+
+        sequential_time, sequential_output = min(generate_cold(header_files, 1) for _ in range(args.repeat))
+        parallel_time, parallel_output = min(generate_cold(header_files, args.jobs) for _ in range(args.repeat))
+        if sequential_output != parallel_output:
+            raise RuntimeError('The IR generated in parallel differs from the IR generated sequentially')
+
+    print(f'Headers: {", ".join(os.path.basename(header_file) for header_file in header_files)}')
+    print(f'{"mode":<20} {"time ms":>10}')
+    print(f'{"sequential":<20} {sequential_time * 1000:>10.1f}')
+    print(f'{f"parallel ({args.jobs} jobs)":<20} {parallel_time * 1000:>10.1f}')
+    print(f'Speedup: {sequential_time / parallel_time:.2f}x')
+
+
+if __name__ == '__main__':
+    main_benchmark()
@@ -0,0 +1,53 @@
+from ir_registry import IRRegistry
+from ir_serializer import write_ir_json
+from pass_manager import PassManager
+import main
+import argparse
+import io
+import os
+import random
+
+
+def generate_ir_text(header_files: list, pipeline: PassManager) -> str:
+    registry = IRRegistry()
+    main.generate_ir(header_files, registry, pipeline)
+    output = io.StringIO()
+    write_ir_json(output, {'ir_version': main.IR_VERSION, 'tox_version': main.TOX_VERSION}, registry.enums,
+                  registry.exceptions, registry.classes)
+    return output.getvalue()
+
+
+def shuffled_pipeline(pipeline: PassManager, rng: random.Random) -> PassManager:
+    # The same passes registered in another order, so the sort only keeps the order the dependencies impose
+    passes = list(pipeline.ordered_passes())
+    rng.shuffle(passes)
+    shuffled = PassManager()
+    for ir_pass in passes:
+        shuffled.add(ir_pass.name, ir_pass.run, ir_pass.depends_on)
+    return shuffled
+
+
+def main_check():
+    arg_parser = argparse.ArgumentParser(
+        description='Check that the dependencies of the header passes are complete: registering the passes in random '
+                    'orders must generate the same IR as the registration order of create_header_pipeline().')
+    arg_parser.add_argument('--headers-dir', default=main.HEADERS_DIR, help='directory of the headers to generate from')
+    arg_parser.add_argument('--orders', type=int, default=50, help='number of random registration orders')
+    arg_parser.add_argument('--seed', type=int, default=0, help='seed of the random orders')
+    args = arg_parser.parse_args()
+
+    header_files = sorted(f'{args.headers_dir}/{header}' for header in os.listdir(args.headers_dir)
+                          if header.endswith('.h'))
+    pipeline = main.create_header_pipeline()
+    expected = generate_ir_text(header_files, pipeline)
+    rng = random.Random(args.seed)
+    for order in range(args.orders):
+        shuffled = shuffled_pipeline(pipeline, rng)
+        if generate_ir_text(header_files, shuffled) != expected:
+            names = [ir_pass.name for ir_pass in shuffled.ordered_passes()]
+            raise RuntimeError(f'The passes in the order {", ".join(names)} generate another IR (order {order})')
+    print(f'{args.orders} random registration orders of {len(pipeline.ordered_passes())} passes generate the same IR')
+
+
+if __name__ == '__main__':
+    main_check()
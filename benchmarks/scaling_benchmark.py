@@ -0,0 +1,142 @@
+from typing import Any, Dict, List
+from benchmarks.synthetic_header import add_shape_arguments, get_shape, group_function_count, write_synthetic_header
+from ir_registry import IRRegistry
+from ir_serializer import write_ir_json
+from parse_cache import ParseCache
+from pass_manager import PassHook
+import main
+import argparse
+import io
+import json
+import math
+import os
+import platform
+import sys
+import tempfile
+import time
+
+
+class StageTimer(PassHook):
+    # Only the wall time, the memory tracing of PassProfiler would slow the stages down
+    def __init__(self):
+        self.times: Dict[str, float] = {}
+        self._start_time = 0.0
+
+    def on_pass_start(self, pass_name: str, context: Any):
+        self._start_time = time.perf_counter()
+
+    def on_pass_end(self, pass_name: str, context: Any):
+        self.times[pass_name] = self.times.get(pass_name, 0.0) + time.perf_counter() - self._start_time
+
+
+def time_stages(header_file: str) -> Dict[str, float]:
+    # Parsing is part of the measurement, so the pyclibrary cache is removed first
+    if os.path.exists(f'{header_file}.cache'):
+        os.remove(f'{header_file}.cache')
+    registry = IRRegistry()
+    header_pipeline = main.create_header_pipeline()
+    timer = StageTimer()
+    header_pipeline.add_hook(timer)
+    main.generate_ir([header_file], registry, header_pipeline)
+    with header_pipeline.stage('serialize', registry):
+        write_ir_json(io.StringIO(), {}, registry.enums, registry.exceptions, registry.classes)
+    return timer.times
+
+
+def growth_exponent(sizes: List[float], times: List[float]) -> float:
+    # The slope of the least squares line through the points in log-log space: 1 is linear, 2 is quadratic
+    xs = [math.log(size) for size in sizes]
+    ys = [math.log(max(stage_time, 1e-9)) for stage_time in times]
+    x_mean = sum(xs) / len(xs)
+    y_mean = sum(ys) / len(ys)
+    variance = sum((x - x_mean) ** 2 for x in xs)
+    if not variance:
+        return 0.0
+    return sum((x - x_mean) * (y - y_mean) for x, y in zip(xs, ys)) / variance
+
+
+def check_growth(results: Dict[str, Any], max_exponent: float, min_time: float) -> Dict[str, Dict[str, Any]]:
+    # The growth of every stage, flagged when it's worse than max_exponent. Stages that take less than min_time seconds
+    # in the largest run are too noisy to judge and never flagged.
+    runs = results['runs']
+    sizes = [run['functions'] for run in runs]
+    growth: Dict[str, Dict[str, Any]] = {}
+    for stage in runs[-1]['stages']:
+        times = [run['stages'].get(stage, 0.0) for run in runs]
+        exponent = growth_exponent(sizes, times)
+        growth[stage] = {
+            'exponent': exponent,
+            'superlinear': len(runs) > 1 and times[-1] >= min_time and exponent > max_exponent,
+        }
+    return growth
+
+
+def print_results(results: Dict[str, Any]):
+    runs = results['runs']
+    print(f'{"stage":<60}' + ''.join(f'{str(run["scale"]) + "x ms":>12}' for run in runs) + f'{"exponent":>10}')
+    for stage, stage_growth in sorted(results['growth'].items(), key=lambda item: -item[1]['exponent']):
+        flag = ' superlinear' if stage_growth['superlinear'] else ''
+        print(f'{stage:<60}' + ''.join(f'{run["stages"].get(stage, 0.0) * 1000:>12.1f}' for run in runs) +
+              f'{stage_growth["exponent"]:>10.2f}{flag}')
+
+
+def main_benchmark():
+    arg_parser = argparse.ArgumentParser(
+        description='Time parsing, every pass and serialization on synthetic headers from 1x to 100x the size of '
+                    'tox.h, write the results as JSON and flag the stages whose time grows worse than linearly.')
+    arg_parser.add_argument('--headers-dir', default=main.HEADERS_DIR,
+                            help='directory of the tox.h whose number of functions is the 1x size')
+    arg_parser.add_argument('--scales', type=lambda scales: [float(scale) for scale in scales.split(',')],
+                            default=[1, 3, 10, 30, 100], metavar='SCALE,...',
+                            help='sizes of the synthetic headers relative to tox.h (default: 1,3,10,30,100)')
+    arg_parser.add_argument('--repeat', type=int, default=1,
+                            help='number of timed runs of every size, the fastest one is kept')
+    arg_parser.add_argument('--output', default='scaling_benchmark.json', help='file to write the results to')
+    arg_parser.add_argument('--check', metavar='RESULTS',
+                            help='check the results of an earlier run instead of running the benchmark')
+    arg_parser.add_argument('--max-exponent', type=float, default=1.2,
+                            help='stages whose time grows faster than size ** MAX_EXPONENT are flagged '
+                                 '(default: %(default)s)')
+    arg_parser.add_argument('--min-time', type=float, default=0.01,
+                            help='stages that take less seconds than this at the largest size aren\'t flagged '
+                                 '(default: %(default)s)')
+    add_shape_arguments(arg_parser)
+    args = arg_parser.parse_args()
+
+    if args.check:
+        with open(args.check) as f:
+            results = json.load(f)
+    else:
+        shape = get_shape(args)
+        base_functions = len(ParseCache().parse(f'{args.headers_dir}/tox.h')['functions'])
+        results = {
+            'ir_version': main.IR_VERSION,
+            'python_version': platform.python_version(),
+            'base_functions': base_functions,
+            'shape': shape,
+            'runs': [],
+        }
+        with tempfile.TemporaryDirectory() as headers_dir:
+            for scale in sorted(args.scales):
+                groups = max(round(scale * base_functions / group_function_count(
+                    shape['functions'], shape['number_depth'], shape['size_getters'], shape['callbacks'])), 1)
+                header_file = write_synthetic_header(headers_dir, groups, **shape)
+                stages: Dict[str, float] = {}
+                for _ in range(args.repeat):
+                    for stage, stage_time in time_stages(header_file).items():
+                        stages[stage] = min(stages.get(stage, stage_time), stage_time)
+                functions = len(ParseCache(f'{headers_dir}/parse').parse(header_file)['functions'])
+                results['runs'].append({'scale': scale, 'groups': groups, 'functions': functions, 'stages': stages})
+                print(f'{scale}x: {functions} functions, {sum(stages.values()):.2f} s', file=sys.stderr)
+
+    results['growth'] = check_growth(results, args.max_exponent, args.min_time)
+    if not args.check:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    print_results(results)
+    if any(stage_growth['superlinear'] for stage_growth in results['growth'].values()):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main_benchmark()
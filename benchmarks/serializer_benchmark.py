@@ -0,0 +1,104 @@
+from typing import Callable, Tuple
+from ir import IRObject
+from ir_registry import IRRegistry
+from ir_serializer import open_ir_output, write_ir_json
+import main
+import argparse
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+
+
+# The recursive converter the generator used before the streaming serializer, kept as the baseline.
+# IR objects no longer have a __dict__, so their slots are read instead.
+# https://stackoverflow.com/a/1118038
+def legacy_todict(obj, classkey=None):
+    if isinstance(obj, dict):
+        data = {}
+        for (k, v) in obj.items():
+            data[k] = legacy_todict(v, classkey)
+        return data
+    elif hasattr(obj, "_ast"):
+        return legacy_todict(obj._ast())
+    elif hasattr(obj, "__iter__") and not isinstance(obj, str):
+        return [legacy_todict(v, classkey) for v in obj]
+    elif isinstance(obj, IRObject):
+        data = {'object_name': obj.object_name}
+        data.update([(key, legacy_todict(getattr(obj, key), classkey))
+                     for key in obj.__slots__
+                     if not callable(getattr(obj, key)) and not key.startswith('_')])
+        if classkey is not None and hasattr(obj, "__class__"):
+            data[classkey] = obj.__class__.__name__
+        return data
+    else:
+        return obj
+
+
+def legacy_serialize(registry: IRRegistry, path: str):
+    root = {
+        'ir_version': main.IR_VERSION,
+        'tox_version': main.TOX_VERSION,
+        'enums': legacy_todict(registry.enums),
+        'exceptions': legacy_todict(registry.exceptions),
+        'classes': legacy_todict(registry.classes),
+    }
+    with open(path, 'w') as f:
+        f.write(json.dumps(root))
+
+
+def streaming_serialize(registry: IRRegistry, path: str):
+    with open_ir_output(path) as f:
+        write_ir_json(f, {
+            'ir_version': main.IR_VERSION,
+            'tox_version': main.TOX_VERSION,
+        }, registry.enums, registry.exceptions, registry.classes)
+
+
+def measure(serialize: Callable[[IRRegistry, str], None], registry: IRRegistry, path: str,
+            repeat: int) -> Tuple[float, int]:
+    best_time = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        serialize(registry, path)
+        best_time = min(best_time, time.perf_counter() - start)
+
+    tracemalloc.start()
+    serialize(registry, path)
+    peak_memory = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return best_time, peak_memory
+
+
+def main_benchmark():
+    arg_parser = argparse.ArgumentParser(
+        description='Compare the time and peak memory of the streaming IR serializer with the legacy todict() and '
+                    'json.dumps() serialization.')
+    arg_parser.add_argument('--headers-dir', default=main.HEADERS_DIR, help='directory of the headers to generate from')
+    arg_parser.add_argument('--repeat', type=int, default=5, help='number of timed runs of each serializer')
+    args = arg_parser.parse_args()
+
+    registry = IRRegistry()
+    header_files = sorted(f'{args.headers_dir}/{header}' for header in os.listdir(args.headers_dir)
+                          if header.endswith('.h'))
+    main.generate_ir(header_files, registry, main.create_header_pipeline())
+
+    with tempfile.TemporaryDirectory() as output_dir:
+        legacy_path = f'{output_dir}/legacy.json'
+        streaming_path = f'{output_dir}/streaming.json'
+        legacy_time, legacy_memory = measure(legacy_serialize, registry, legacy_path, args.repeat)
+        streaming_time, streaming_memory = measure(streaming_serialize, registry, streaming_path, args.repeat)
+        with open(legacy_path) as legacy_file, open(streaming_path) as streaming_file:
+            if legacy_file.read() != streaming_file.read():
+                raise RuntimeError('The streaming serializer output differs from the legacy output')
+        output_size = os.path.getsize(streaming_path)
+
+    print(f'Output size: {output_size / 1024:.1f} KiB')
+    print(f'{"serializer":<12} {"time ms":>10} {"peak KiB":>10}')
+    print(f'{"legacy":<12} {legacy_time * 1000:>10.2f} {legacy_memory / 1024:>10.1f}')
+    print(f'{"streaming":<12} {streaming_time * 1000:>10.2f} {streaming_memory / 1024:>10.1f}')
+
+
+if __name__ == '__main__':
+    main_benchmark()
@@ -0,0 +1,152 @@
+from typing import Dict, List
+import argparse
+import os
+
+HEADER_PREAMBLE = '''#include <stdbool.h>
+#include <stddef.h>
+#include <stdint.h>
+
+typedef struct Tox Tox;
+
+#define TOX_PUBLIC_KEY_SIZE 32
+uint32_t tox_public_key_size(void);
+#define TOX_MAX_MESSAGE_LENGTH 1372
+uint32_t tox_max_message_length(void);
+
+typedef enum Tox_Err_Options_New {
+    TOX_ERR_OPTIONS_NEW_OK,
+    TOX_ERR_OPTIONS_NEW_MALLOC,
+} Tox_Err_Options_New;
+
+struct Tox_Options {
+    bool ipv6_enabled;
+    uint16_t start_port;
+};
+
+bool tox_options_get_ipv6_enabled(const struct Tox_Options *options);
+void tox_options_set_ipv6_enabled(struct Tox_Options *options, bool ipv6_enabled);
+uint16_t tox_options_get_start_port(const struct Tox_Options *options);
+void tox_options_set_start_port(struct Tox_Options *options, uint16_t start_port);
+void tox_options_default(struct Tox_Options *options);
+struct Tox_Options *tox_options_new(Tox_Err_Options_New *error);
+void tox_options_free(struct Tox_Options *options);
+
+typedef enum Tox_Err_New {
+    TOX_ERR_NEW_OK,
+    TOX_ERR_NEW_MALLOC,
+} Tox_Err_New;
+
+Tox *tox_new(const struct Tox_Options *options, Tox_Err_New *error);
+void tox_kill(Tox *tox);
+void tox_self_get_public_key(const Tox *tox, uint8_t *public_key);
+'''
+
+# Names of the number handles below the group, e.g. tox_group0_peer_role_get_name(tox, group0_number, peer_number,
+# role_number, ...). Deeper levels are numbered.
+NESTED_HANDLE_NAMES = ('peer', 'role', 'item')
+
+
+def nested_handle_name(level: int) -> str:
+    if level <= len(NESTED_HANDLE_NAMES):
+        return NESTED_HANDLE_NAMES[level - 1]
+    return f'level{level}'
+
+
+def group_function_count(functions: int = 2, number_depth: int = 2, size_getters: int = 1, callbacks: int = 1) -> int:
+    # The C functions (not callback typedefs) in a group of generate_group()
+    return number_depth * (functions + 2 * size_getters + callbacks) + (number_depth - 1) + 2
+
+
+def generate_group(n: int, functions: int = 2, number_depth: int = 2, error_enums: int = 1, size_getters: int = 1,
+                   callbacks: int = 1) -> str:
+    # A group of declarations in the style of the friend and conference parts of tox.h: a number handle with
+    # number_depth - 1 levels of nested number handles. Every level has the given number of plain functions, '_size'
+    # getters (with their getters) and '_cb' callbacks, and the functions report errors with error_enums enums.
+    error_enum_names = [f'Tox_Err_Group{n}_Query' + (str(index) if index else '') for index in range(error_enums)]
+    parts: List[str] = []
+    for error_enum_name in error_enum_names:
+        value_prefix = error_enum_name.upper()
+        parts.append(f'\ntypedef enum {error_enum_name} {{\n    {value_prefix}_OK,\n    {value_prefix}_NULL,\n'
+                     f'    {value_prefix}_NOT_FOUND,\n}} {error_enum_name};\n')
+    parts.append(f'\nuint32_t tox_group{n}_new(Tox *tox, {error_enum_names[0]} *error);\n')
+    parts.append(f'bool tox_group{n}_delete(Tox *tox, uint32_t group{n}_number, {error_enum_names[0]} *error);\n')
+
+    function_index = 0
+    for level in range(number_depth):
+        prefix = '_'.join([f'group{n}'] + [nested_handle_name(index) for index in range(1, level + 1)])
+        numbers = ', '.join([f'uint32_t group{n}_number'] +
+                            [f'uint32_t {nested_handle_name(index)}_number' for index in range(1, level + 1)])
+        if level:
+            parent_prefix = prefix.rsplit('_', 1)[0]
+            parent_numbers = numbers.rsplit(', ', 1)[0]
+            error_enum_name = error_enum_names[function_index % error_enums]
+            function_index += 1
+            parts.append(f'uint32_t tox_{parent_prefix}_{nested_handle_name(level)}_count(const Tox *tox, '
+                         f'{parent_numbers}, {error_enum_name} *error);\n')
+        for index in range(functions):
+            error_enum_name = error_enum_names[function_index % error_enums]
+            function_index += 1
+            parts.append(f'bool tox_{prefix}_send_message{index}(Tox *tox, {numbers}, const uint8_t *message, '
+                         f'size_t length, {error_enum_name} *error);\n')
+        for index in range(size_getters):
+            error_enum_name = error_enum_names[function_index % error_enums]
+            function_index += 1
+            parts.append(f'size_t tox_{prefix}_get_name{index}_size(const Tox *tox, {numbers}, '
+                         f'{error_enum_name} *error);\n')
+            parts.append(f'bool tox_{prefix}_get_name{index}(const Tox *tox, {numbers}, uint8_t *name{index}, '
+                         f'{error_enum_name} *error);\n')
+        for index in range(callbacks):
+            parts.append(f'typedef void tox_{prefix}_message{index}_cb(Tox *tox, {numbers}, const uint8_t *message, '
+                         f'size_t length, void *user_data);\n')
+            parts.append(f'void tox_callback_{prefix}_message{index}(Tox *tox, tox_{prefix}_message{index}_cb '
+                         f'*callback);\n')
+    return ''.join(parts)
+
+
+def generate_synthetic_header(groups: int, **shape: int) -> str:
+    # shape is passed to generate_group()
+    parts: List[str] = [HEADER_PREAMBLE]
+    for index in range(groups):
+        parts.append(generate_group(index, **shape))
+    return ''.join(parts)
+
+
+# Writes the header as tox.h so the generator treats it as the main Tox header
+def write_synthetic_header(directory: str, groups: int, **shape: int) -> str:
+    header_file = f'{directory}/tox.h'
+    with open(header_file, 'w') as f:
+        f.write(generate_synthetic_header(groups, **shape))
+    return header_file
+
+
+def add_shape_arguments(arg_parser: argparse.ArgumentParser):
+    arg_parser.add_argument('--functions', type=int, default=2,
+                            help='number of plain functions of every number handle (default: %(default)s)')
+    arg_parser.add_argument('--number-depth', type=int, default=2,
+                            help='number of nested \'_number\' handles in a group (default: %(default)s)')
+    arg_parser.add_argument('--error-enums', type=int, default=1,
+                            help='number of error enums of a group (default: %(default)s)')
+    arg_parser.add_argument('--size-getters', type=int, default=1,
+                            help='number of \'_size\' getters of every number handle (default: %(default)s)')
+    arg_parser.add_argument('--callbacks', type=int, default=1,
+                            help='number of \'_cb\' callbacks of every number handle (default: %(default)s)')
+
+
+def get_shape(args: argparse.Namespace) -> Dict[str, int]:
+    return {
+        'functions': args.functions,
+        'number_depth': args.number_depth,
+        'error_enums': args.error_enums,
+        'size_getters': args.size_getters,
+        'callbacks': args.callbacks,
+    }
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description='Generate a synthetic header in the style of tox.h.')
+    arg_parser.add_argument('directory', help='directory to write tox.h to')
+    arg_parser.add_argument('--groups', type=int, default=10, help='number of groups of declarations')
+    add_shape_arguments(arg_parser)
+    args = arg_parser.parse_args()
+    os.makedirs(args.directory, exist_ok=True)
+    print(write_synthetic_header(args.directory, args.groups, **get_shape(args)))
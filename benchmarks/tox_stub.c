@@ -0,0 +1,406 @@
+// A stand-in for the Tox library, compiled against the headers, with just enough of tox.h to check and measure the
+// ctypes binding: the options, a Tox instance with a name and friends, messages, hashes, file chunks and events.
+// Nothing goes over the network. tox_stub_last_data() returns the address of the last buffer a function received, so
+// the benchmark can check that the binding passed the memory of the Python object without copying it.
+#include <stdlib.h>
+#include <string.h>
+#include "tox.h"
+
+#define STUB_MAX_FRIENDS 64
+
+struct Tox {
+    uint8_t public_key[TOX_PUBLIC_KEY_SIZE];
+    uint8_t name[TOX_MAX_NAME_LENGTH];
+    size_t name_length;
+    bool friend_exists[STUB_MAX_FRIENDS];
+    uint8_t friend_public_keys[STUB_MAX_FRIENDS][TOX_PUBLIC_KEY_SIZE];
+    uint32_t message_id;
+    tox_friend_name_cb *friend_name_callback;
+    tox_file_recv_chunk_cb *file_recv_chunk_callback;
+    uint32_t events_count;
+};
+
+struct Tox_Event_Friend_Message {
+    uint32_t friend_number;
+    Tox_Message_Type type;
+    uint8_t message[16];
+    uint32_t message_length;
+};
+
+struct Tox_Event_File_Recv_Chunk {
+    uint32_t friend_number;
+    uint32_t file_number;
+    uint64_t position;
+    uint8_t data[16];
+    uint32_t length;
+};
+
+struct Tox_Events {
+    uint32_t friend_message_size;
+    Tox_Event_Friend_Message *friend_message;
+    uint32_t file_recv_chunk_size;
+    Tox_Event_File_Recv_Chunk *file_recv_chunk;
+};
+
+static const void *last_data;
+
+const void *tox_stub_last_data(void)
+{
+    return last_data;
+}
+
+uint32_t tox_public_key_size(void) { return TOX_PUBLIC_KEY_SIZE; }
+uint32_t tox_max_name_length(void) { return TOX_MAX_NAME_LENGTH; }
+uint32_t tox_max_message_length(void) { return TOX_MAX_MESSAGE_LENGTH; }
+uint32_t tox_hash_length(void) { return TOX_HASH_LENGTH; }
+uint32_t tox_file_id_length(void) { return TOX_FILE_ID_LENGTH; }
+
+void tox_options_default(struct Tox_Options *options)
+{
+    memset(options, 0, sizeof(*options));
+    options->ipv6_enabled = true;
+    options->udp_enabled = true;
+    options->local_discovery_enabled = true;
+    options->hole_punching_enabled = true;
+    options->start_port = 33445;
+    options->end_port = 33545;
+}
+
+struct Tox_Options *tox_options_new(Tox_Err_Options_New *error)
+{
+    struct Tox_Options *options = malloc(sizeof(*options));
+    if (error != NULL) {
+        *error = options == NULL ? TOX_ERR_OPTIONS_NEW_MALLOC : TOX_ERR_OPTIONS_NEW_OK;
+    }
+    if (options != NULL) {
+        tox_options_default(options);
+    }
+    return options;
+}
+
+void tox_options_free(struct Tox_Options *options)
+{
+    free(options);
+}
+
+// The size of the struct, to check the layout the binding declares against the compiler's
+size_t tox_stub_options_size(void) { return sizeof(struct Tox_Options); }
+
+#define STUB_OPTION(type, name) \
+    type tox_options_get_##name(const struct Tox_Options *options) { return options->name; } \
+    void tox_options_set_##name(struct Tox_Options *options, type name) { options->name = name; }
+
+STUB_OPTION(bool, ipv6_enabled)
+STUB_OPTION(bool, udp_enabled)
+STUB_OPTION(bool, local_discovery_enabled)
+STUB_OPTION(Tox_Proxy_Type, proxy_type)
+STUB_OPTION(uint16_t, proxy_port)
+STUB_OPTION(uint16_t, start_port)
+STUB_OPTION(uint16_t, end_port)
+STUB_OPTION(uint16_t, tcp_port)
+STUB_OPTION(bool, hole_punching_enabled)
+STUB_OPTION(Tox_Savedata_Type, savedata_type)
+STUB_OPTION(bool, experimental_thread_safety)
+const char *tox_options_get_proxy_host(const struct Tox_Options *options) { return options->proxy_host; }
+void tox_options_set_proxy_host(struct Tox_Options *options, const char *host) { options->proxy_host = host; }
+
+Tox *tox_new(const struct Tox_Options *options, Tox_Err_New *error)
+{
+    Tox *tox = calloc(1, sizeof(Tox));
+    if (error != NULL) {
+        *error = tox == NULL ? TOX_ERR_NEW_MALLOC : TOX_ERR_NEW_OK;
+    }
+    if (tox != NULL) {
+        for (uint32_t i = 0; i < TOX_PUBLIC_KEY_SIZE; ++i) {
+            tox->public_key[i] = (uint8_t)i;
+        }
+    }
+    return tox;
+}
+
+void tox_kill(Tox *tox)
+{
+    free(tox);
+}
+
+void tox_self_get_public_key(const Tox *tox, uint8_t *public_key)
+{
+    memcpy(public_key, tox->public_key, TOX_PUBLIC_KEY_SIZE);
+}
+
+bool tox_self_set_name(Tox *tox, const uint8_t *name, size_t length, Tox_Err_Set_Info *error)
+{
+    last_data = name;
+    if (name == NULL && length != 0) {
+        *error = TOX_ERR_SET_INFO_NULL;
+        return false;
+    }
+    if (length > TOX_MAX_NAME_LENGTH) {
+        *error = TOX_ERR_SET_INFO_TOO_LONG;
+        return false;
+    }
+    memcpy(tox->name, name, length);
+    tox->name_length = length;
+    *error = TOX_ERR_SET_INFO_OK;
+    return true;
+}
+
+size_t tox_self_get_name_size(const Tox *tox)
+{
+    return tox->name_length;
+}
+
+void tox_self_get_name(const Tox *tox, uint8_t *name)
+{
+    memcpy(name, tox->name, tox->name_length);
+}
+
+uint32_t tox_friend_add_norequest(Tox *tox, const uint8_t *public_key, Tox_Err_Friend_Add *error)
+{
+    for (uint32_t friend_number = 0; friend_number < STUB_MAX_FRIENDS; ++friend_number) {
+        if (!tox->friend_exists[friend_number]) {
+            tox->friend_exists[friend_number] = true;
+            memcpy(tox->friend_public_keys[friend_number], public_key, TOX_PUBLIC_KEY_SIZE);
+            *error = TOX_ERR_FRIEND_ADD_OK;
+            return friend_number;
+        }
+    }
+    *error = TOX_ERR_FRIEND_ADD_MALLOC;
+    return UINT32_MAX;
+}
+
+bool tox_friend_delete(Tox *tox, uint32_t friend_number, Tox_Err_Friend_Delete *error)
+{
+    if (friend_number >= STUB_MAX_FRIENDS || !tox->friend_exists[friend_number]) {
+        *error = TOX_ERR_FRIEND_DELETE_FRIEND_NOT_FOUND;
+        return false;
+    }
+    tox->friend_exists[friend_number] = false;
+    *error = TOX_ERR_FRIEND_DELETE_OK;
+    return true;
+}
+
+bool tox_friend_exists(const Tox *tox, uint32_t friend_number)
+{
+    return friend_number < STUB_MAX_FRIENDS && tox->friend_exists[friend_number];
+}
+
+size_t tox_self_get_friend_list_size(const Tox *tox)
+{
+    size_t size = 0;
+    for (uint32_t friend_number = 0; friend_number < STUB_MAX_FRIENDS; ++friend_number) {
+        size += tox->friend_exists[friend_number];
+    }
+    return size;
+}
+
+void tox_self_get_friend_list(const Tox *tox, uint32_t *friend_list)
+{
+    for (uint32_t friend_number = 0; friend_number < STUB_MAX_FRIENDS; ++friend_number) {
+        if (tox->friend_exists[friend_number]) {
+            *friend_list++ = friend_number;
+        }
+    }
+}
+
+bool tox_friend_get_public_key(const Tox *tox, uint32_t friend_number, uint8_t *public_key,
+                               Tox_Err_Friend_Get_Public_Key *error)
+{
+    if (!tox_friend_exists(tox, friend_number)) {
+        *error = TOX_ERR_FRIEND_GET_PUBLIC_KEY_FRIEND_NOT_FOUND;
+        return false;
+    }
+    memcpy(public_key, tox->friend_public_keys[friend_number], TOX_PUBLIC_KEY_SIZE);
+    *error = TOX_ERR_FRIEND_GET_PUBLIC_KEY_OK;
+    return true;
+}
+
+uint32_t tox_friend_send_message(Tox *tox, uint32_t friend_number, Tox_Message_Type type, const uint8_t *message,
+                                 size_t length, Tox_Err_Friend_Send_Message *error)
+{
+    last_data = message;
+    if (!tox_friend_exists(tox, friend_number)) {
+        *error = TOX_ERR_FRIEND_SEND_MESSAGE_FRIEND_NOT_FOUND;
+        return 0;
+    }
+    if (length == 0) {
+        *error = TOX_ERR_FRIEND_SEND_MESSAGE_EMPTY;
+        return 0;
+    }
+    if (length > TOX_MAX_MESSAGE_LENGTH) {
+        *error = TOX_ERR_FRIEND_SEND_MESSAGE_TOO_LONG;
+        return 0;
+    }
+    *error = TOX_ERR_FRIEND_SEND_MESSAGE_OK;
+    return ++tox->message_id;
+}
+
+void tox_callback_friend_name(Tox *tox, tox_friend_name_cb *callback)
+{
+    tox->friend_name_callback = callback;
+}
+
+void tox_callback_file_recv_chunk(Tox *tox, tox_file_recv_chunk_cb *callback)
+{
+    tox->file_recv_chunk_callback = callback;
+}
+
+// Calls the callbacks as if every friend had sent their name and a file chunk with our name in it
+void tox_iterate(Tox *tox, void *user_data)
+{
+    for (uint32_t friend_number = 0; friend_number < STUB_MAX_FRIENDS; ++friend_number) {
+        if (!tox->friend_exists[friend_number]) {
+            continue;
+        }
+        if (tox->friend_name_callback != NULL) {
+            tox->friend_name_callback(tox, friend_number, tox->name, tox->name_length, user_data);
+        }
+        if (tox->file_recv_chunk_callback != NULL) {
+            last_data = tox->name;
+            tox->file_recv_chunk_callback(tox, friend_number, 0, 0, tox->name, tox->name_length, user_data);
+        }
+    }
+}
+
+// The number of events of each kind that tox_events_iterate() returns
+void tox_stub_set_events_count(Tox *tox, uint32_t count)
+{
+    tox->events_count = count;
+}
+
+Tox_Events *tox_events_iterate(Tox *tox, bool fail_hard, Tox_Err_Events_Iterate *error)
+{
+    uint32_t count = tox->events_count;
+    Tox_Events *events = calloc(1, sizeof(Tox_Events));
+    if (events == NULL) {
+        *error = TOX_ERR_EVENTS_ITERATE_MALLOC;
+        return NULL;
+    }
+    events->friend_message = calloc(count, sizeof(Tox_Event_Friend_Message));
+    events->file_recv_chunk = calloc(count, sizeof(Tox_Event_File_Recv_Chunk));
+    if (count != 0 && (events->friend_message == NULL || events->file_recv_chunk == NULL)) {
+        tox_events_free(events);
+        *error = TOX_ERR_EVENTS_ITERATE_MALLOC;
+        return NULL;
+    }
+    events->friend_message_size = count;
+    events->file_recv_chunk_size = count;
+    for (uint32_t i = 0; i < count; ++i) {
+        Tox_Event_Friend_Message *friend_message = &events->friend_message[i];
+        friend_message->friend_number = i % STUB_MAX_FRIENDS;
+        friend_message->type = (Tox_Message_Type)(i % 2);
+        friend_message->message_length = i % sizeof(friend_message->message);
+        memset(friend_message->message, 'a' + i % 26, friend_message->message_length);
+
+        Tox_Event_File_Recv_Chunk *file_recv_chunk = &events->file_recv_chunk[i];
+        file_recv_chunk->friend_number = i % STUB_MAX_FRIENDS;
+        file_recv_chunk->file_number = i;
+        file_recv_chunk->position = (uint64_t)i * sizeof(file_recv_chunk->data);
+        file_recv_chunk->length = sizeof(file_recv_chunk->data);
+        memset(file_recv_chunk->data, i % 256, file_recv_chunk->length);
+    }
+    *error = TOX_ERR_EVENTS_ITERATE_OK;
+    return events;
+}
+
+void tox_events_free(Tox_Events *events)
+{
+    if (events != NULL) {
+        free(events->friend_message);
+        free(events->file_recv_chunk);
+        free(events);
+    }
+}
+
+uint32_t tox_events_get_friend_message_size(const Tox_Events *events) { return events->friend_message_size; }
+uint32_t tox_events_get_file_recv_chunk_size(const Tox_Events *events) { return events->file_recv_chunk_size; }
+
+const Tox_Event_Friend_Message *tox_events_get_friend_message(const Tox_Events *events, uint32_t index)
+{
+    return index < events->friend_message_size ? &events->friend_message[index] : NULL;
+}
+
+const Tox_Event_File_Recv_Chunk *tox_events_get_file_recv_chunk(const Tox_Events *events, uint32_t index)
+{
+    return index < events->file_recv_chunk_size ? &events->file_recv_chunk[index] : NULL;
+}
+
+uint32_t tox_event_friend_message_get_friend_number(const Tox_Event_Friend_Message *friend_message)
+{
+    return friend_message->friend_number;
+}
+
+Tox_Message_Type tox_event_friend_message_get_type(const Tox_Event_Friend_Message *friend_message)
+{
+    return friend_message->type;
+}
+
+uint32_t tox_event_friend_message_get_message_length(const Tox_Event_Friend_Message *friend_message)
+{
+    return friend_message->message_length;
+}
+
+const uint8_t *tox_event_friend_message_get_message(const Tox_Event_Friend_Message *friend_message)
+{
+    return friend_message->message;
+}
+
+const uint8_t *tox_event_file_recv_chunk_get_data(const Tox_Event_File_Recv_Chunk *file_recv_chunk)
+{
+    return file_recv_chunk->data;
+}
+
+uint32_t tox_event_file_recv_chunk_get_length(const Tox_Event_File_Recv_Chunk *file_recv_chunk)
+{
+    return file_recv_chunk->length;
+}
+
+uint32_t tox_event_file_recv_chunk_get_file_number(const Tox_Event_File_Recv_Chunk *file_recv_chunk)
+{
+    return file_recv_chunk->file_number;
+}
+
+uint32_t tox_event_file_recv_chunk_get_friend_number(const Tox_Event_File_Recv_Chunk *file_recv_chunk)
+{
+    return file_recv_chunk->friend_number;
+}
+
+uint64_t tox_event_file_recv_chunk_get_position(const Tox_Event_File_Recv_Chunk *file_recv_chunk)
+{
+    return file_recv_chunk->position;
+}
+
+// Not a real hash, the sum of the data in every byte is enough to check the result
+bool tox_hash(uint8_t *hash, const uint8_t *data, size_t length)
+{
+    uint8_t sum = 0;
+    last_data = data;
+    for (size_t i = 0; i < length; ++i) {
+        sum += data[i];
+    }
+    memset(hash, sum, TOX_HASH_LENGTH);
+    return true;
+}
+
+uint32_t tox_file_send(Tox *tox, uint32_t friend_number, uint32_t kind, uint64_t file_size, const uint8_t *file_id,
+                       const uint8_t *filename, size_t filename_length, Tox_Err_File_Send *error)
+{
+    if (!tox_friend_exists(tox, friend_number)) {
+        *error = TOX_ERR_FILE_SEND_NULL;
+        return UINT32_MAX;
+    }
+    *error = TOX_ERR_FILE_SEND_OK;
+    return 0;
+}
+
+bool tox_file_send_chunk(Tox *tox, uint32_t friend_number, uint32_t file_number, uint64_t position,
+                         const uint8_t *data, size_t length, Tox_Err_File_Send_Chunk *error)
+{
+    last_data = data;
+    if (!tox_friend_exists(tox, friend_number)) {
+        *error = TOX_ERR_FILE_SEND_CHUNK_NOT_FOUND;
+        return false;
+    }
+    *error = TOX_ERR_FILE_SEND_CHUNK_OK;
+    return true;
+}
@@ -0,0 +1,199 @@
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from collections import OrderedDict
+from ir import IRObject, IREnum, IRException, IRClass
+from ir_registry import IRRegistry
+import hashlib
+import io
+import os
+import pickle
+
+CACHE_DIR = '.ir_cache'
+DEFAULT_CACHE_SIZE_LIMIT = 64 * 1024 * 1024
+
+IR_ENTRY_EXTENSION = '.ir.pickle'
+
+# The enums, exceptions and classes generated from a header
+IRFragment = Tuple[List[IREnum], List[IRException], List[IRClass]]
+
+
+def hash_generator_sources(directory: str) -> str:
+    # Any change to the generator's code can change its output, so the code is part of every key
+    source_hash = hashlib.sha256()
+    for filename in sorted(os.listdir(directory)):
+        if filename.endswith('.py'):
+            source_hash.update(filename.encode() + b'\0')
+            with open(f'{directory}/{filename}', 'rb') as f:
+                source_hash.update(f.read())
+            source_hash.update(b'\0')
+    return source_hash.hexdigest()
+
+
+class _IRPickler(pickle.Pickler):
+    def __init__(self, file, constants: Sequence[IRObject]):
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self._constant_indexes = {id(constant): index for index, constant in enumerate(constants)}
+
+    def persistent_id(self, obj: Any) -> Optional[int]:
+        return self._constant_indexes.get(id(obj))
+
+
+class _IRUnpickler(pickle.Unpickler):
+    def __init__(self, file, constants: Sequence[IRObject]):
+        super().__init__(file)
+        self._constants = constants
+
+    def persistent_load(self, pid: int) -> IRObject:
+        return self._constants[pid]
+
+
+# Constants are module level IR objects that are shared by the IR (e.g. types every handle uses). They are stored by
+# reference so the loaded IR shares them with IR that is generated in this process.
+def dump_ir(registry: IRRegistry, constants: Sequence[IRObject] = ()) -> bytes:
+    buffer = io.BytesIO()
+    _IRPickler(buffer, constants).dump((registry.enums, registry.exceptions, registry.classes))
+    return buffer.getvalue()
+
+
+def load_ir(data: bytes, constants: Sequence[IRObject] = ()) -> IRFragment:
+    return _IRUnpickler(io.BytesIO(data), constants).load()
+
+
+def evict_least_recently_used(directory: str, size_limit: int, extension: str = ''):
+    # Removes the entries (the files with the extension) of a cache directory whose modification time (their last use)
+    # is the oldest until the size of the others is under the limit
+    entries: List[Tuple[float, int, str]] = []
+    for filename in os.listdir(directory):
+        path = f'{directory}/{filename}'
+        if filename.endswith('.tmp') or not filename.endswith(extension):
+            continue
+        # Another run sharing the directory may have evicted the entry since it was listed
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+
+    total_size = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total_size <= size_limit:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total_size -= size
+
+
+def touch(path: str) -> bool:
+    # The modification time is the last use of an entry
+    try:
+        os.utime(path)
+        return True
+    except FileNotFoundError:
+        return False
+
+
+# Content-addressed cache of the generator's results. The IR of every header is stored with a key that covers the
+# header, the IR version and the generator's code, so unchanged headers are loaded instead of generated. Finished
+# outputs are stored too, with the Tox version and the output options in their key, so a fully unchanged run only
+# copies a file.
+# Entries are evicted least recently used first when the cache grows over its size limit. Without a directory the
+# entries are kept in memory, for sharing the IR of identical headers within a single run (or a --watch session),
+# under the same size limit.
+class BuildCache:
+    def __init__(self, directory: Optional[str] = CACHE_DIR, salt: str = '',
+                 size_limit: int = DEFAULT_CACHE_SIZE_LIMIT, read: bool = True, constants: Sequence[IRObject] = ()):
+        self.directory = directory
+        # The entries in memory, the least recently used first
+        self._memory_entries: 'OrderedDict[str, bytes]' = OrderedDict()
+        self._memory_size = 0
+        self.salt = salt
+        self.size_limit = size_limit
+        # When not reading, entries are still written so the next run can use them
+        self.read = read
+        self.constants = constants
+
+    def header_key(self, header_file: str) -> str:
+        key_hash = hashlib.sha256()
+        key_hash.update(f'{self.salt}\0{os.path.basename(header_file)}\0'.encode())
+        with open(header_file, 'rb') as f:
+            key_hash.update(f.read())
+        return key_hash.hexdigest()
+
+    def header_keys(self, header_files: List[str]) -> List[str]:
+        return [self.header_key(header_file) for header_file in header_files]
+
+    @staticmethod
+    def output_key(header_keys: List[str], options: str) -> str:
+        return hashlib.sha256('\0'.join(header_keys + [options]).encode()).hexdigest()
+
+    def _path(self, key: str, extension: str) -> str:
+        return f'{self.directory}/{key}{extension}'
+
+    def _load_entry(self, key: str, extension: str) -> Optional[bytes]:
+        if not self.read:
+            return None
+        if self.directory is None:
+            data = self._memory_entries.get(key + extension)
+            if data is not None:
+                self._memory_entries.move_to_end(key + extension)
+            return data
+
+        path = self._path(key, extension)
+        if not touch(path):
+            return None
+        try:
+            with open(path, 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def _store_entry(self, key: str, extension: str, data: bytes):
+        if self.directory is None:
+            old_data = self._memory_entries.pop(key + extension, None)
+            if old_data is not None:
+                self._memory_size -= len(old_data)
+            self._memory_entries[key + extension] = data
+            self._memory_size += len(data)
+            while self._memory_size > self.size_limit:
+                self._memory_size -= len(self._memory_entries.popitem(last=False)[1])
+            return
+
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(key, extension)
+        temp_path = f'{path}.{os.getpid()}.tmp'
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, path)
+        self.evict()
+
+    def load_ir(self, key: str) -> Optional[IRFragment]:
+        data = self._load_entry(key, IR_ENTRY_EXTENSION)
+        if data is None:
+            return None
+        try:
+            return load_ir(data, self.constants)
+        except (EOFError, pickle.UnpicklingError, AttributeError, IndexError, TypeError):
+            # A corrupt or outdated entry is generated again and overwritten
+            return None
+
+    def store_ir(self, key: str, data: bytes):
+        self._store_entry(key, IR_ENTRY_EXTENSION, data)
+
+    def load_output(self, key: str, extension: str, output_file: str) -> bool:
+        data = self._load_entry(key, extension)
+        if data is None:
+            return False
+        # Like the entries, an interrupted restore doesn't leave a truncated output behind
+        temp_path = f'{output_file}.{os.getpid()}.tmp'
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, output_file)
+        return True
+
+    def store_output(self, key: str, extension: str, output_file: str):
+        with open(output_file, 'rb') as f:
+            self._store_entry(key, extension, f.read())
+
+    def evict(self):
+        evict_least_recently_used(self.directory, self.size_limit)
@@ -0,0 +1,934 @@
+from typing import Dict, List, Optional, Set, Tuple
+from ir import *
+from ir_binary import get_class_paths
+from ir_loader import LoadedIR, load_ir
+import argparse
+import keyword
+import os
+
+PRIMITIVE_CTYPES = {
+    'bool': 'ctypes.c_bool',
+    'char': 'ctypes.c_char',
+    'uint8_t': 'ctypes.c_uint8',
+    'uint16_t': 'ctypes.c_uint16',
+    'uint32_t': 'ctypes.c_uint32',
+    'uint64_t': 'ctypes.c_uint64',
+    'int32_t': 'ctypes.c_int32',
+    'size_t': 'ctypes.c_size_t',
+}
+
+ERROR_ARGUMENT_CTYPE = 'ctypes.POINTER(ctypes.c_int)'
+
+# The array type codes of the fields of batches, enums are 'i'
+ARRAY_TYPECODES = {
+    'bool': 'B',
+    'uint8_t': 'B',
+    'uint16_t': 'H',
+    'uint32_t': 'I',
+    'uint64_t': 'Q',
+    'int32_t': 'i',
+    'size_t': 'Q',
+}
+
+# The part of every generated binding that doesn't depend on the IR: loading the library and passing bytes-like
+# objects to it without copying them.
+BINDING_RUNTIME = '''
+import array
+import ctypes
+import ctypes.util
+import enum
+import weakref
+
+
+class ToxError(Exception):
+    # The enum of the error codes, set by the exception of every error enum
+    codes = None
+
+    def __init__(self, code, message=None):
+        if code is not None and self.codes is not None:
+            code = self.codes(code)
+        self.code = code
+        super().__init__(message or (code.name if isinstance(code, enum.Enum) else code))
+
+
+def _missing_function(cname):
+    def missing_function(*args):
+        raise NotImplementedError(f'{cname} is not in the loaded library')
+    return missing_function
+
+
+def _pointer_to(buffer):
+    # A pointer to the first byte of a writable buffer, without copying it. Making a pointer is cheaper than making an
+    # array type of the size of every buffer.
+    return ctypes.byref(ctypes.c_char.from_buffer(buffer))
+
+
+def _buffer(value):
+    # The memory of a bytes-like object as a ctypes argument. bytes are passed as they are and writable buffers
+    # (bytearray, writable memoryview) are passed without copying, only a read-only view of a part of an object is
+    # copied.
+    if value is None or value.__class__ is bytes:
+        return value
+    if value.__class__ is bytearray:
+        return _pointer_to(value) if value else b''
+    view = memoryview(value)
+    if view.readonly:
+        if view.obj.__class__ is bytes and view.contiguous and view.nbytes == len(view.obj):
+            return view.obj
+        return view.tobytes()
+    if not view.c_contiguous:
+        return view.tobytes()
+    return _pointer_to(view) if view.nbytes else b''
+
+
+def _buffer_size(value):
+    if value.__class__ is bytes or value.__class__ is bytearray:
+        return len(value)
+    return memoryview(value).nbytes
+
+
+def _buffer_and_size(value):
+    if value is None:
+        return None, 0
+    if value.__class__ is bytearray:
+        return _pointer_to(value) if value else b'', len(value)
+    if value.__class__ is memoryview and not value.readonly and value.c_contiguous:
+        return _pointer_to(value) if value.nbytes else b'', value.nbytes
+    return _buffer(value), _buffer_size(value)
+
+
+def _writable_buffer(value):
+    # The C function writes to the buffer, so it must be writable and is never copied
+    if value.__class__ is bytearray:
+        return _pointer_to(value) if value else None
+    view = memoryview(value)
+    if view.readonly or not view.c_contiguous:
+        raise TypeError('The buffer must be writable and contiguous, e.g. a bytearray')
+    return _pointer_to(view) if view.nbytes else None
+
+
+def _borrowed_view(pointer, size):
+    # A view of memory that the library only lends, without copying it. It must be released before the memory is
+    # given back; bytes(view) copies what must be kept.
+    if not size:
+        return memoryview(b'')
+    return memoryview((ctypes.c_ubyte * size).from_address(pointer))
+
+
+def _string(value):
+    if value.__class__ is str:
+        return value.encode()
+    return value
+
+
+def _check_size(value, size, name):
+    if value is not None and _buffer_size(value) < size:
+        raise ValueError(f'{name} must be at least {size} bytes long')
+
+
+class _Object:
+    __slots__ = ('_handle', '_scratch')
+
+    def _scratch_buffer(self, size):
+        # Getters of buffers write to a buffer of the object that is reused as long as it's large enough, and only
+        # the written bytes are copied out of it
+        scratch = self._scratch
+        if scratch is None or len(scratch) < size:
+            scratch = self._scratch = ctypes.create_string_buffer(max(size, 64))
+        return scratch
+
+
+class _NativeObject(_Object):
+    # Wraps a pointer. An object that owns it frees it in close(), one that doesn't keeps its owner alive.
+    __slots__ = ('_owner', '_kept', '_callbacks')
+
+    def __init__(self):
+        raise TypeError(f'{type(self).__name__} objects are only returned by the library')
+
+    @classmethod
+    def _wrap(cls, handle, owner=None):
+        obj = cls.__new__(cls)
+        obj._handle = handle
+        obj._owner = owner
+        obj._scratch = None
+        obj._kept = None
+        obj._callbacks = None
+        return obj
+
+    def _init_handle(self, handle):
+        self._handle = handle
+        self._owner = None
+        self._scratch = None
+        self._kept = None
+        self._callbacks = None
+
+    def _keep(self, key, value):
+        # The library keeps some pointers it's given (e.g. the strings of options), so are their objects
+        if self._kept is None:
+            self._kept = {}
+        self._kept[key] = value
+
+    def close(self):
+        self._handle = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __del__(self):
+        if getattr(self, '_handle', None) is not None:
+            self.close()
+
+
+def _no_object():
+    # What a missing weak reference returns, so a lookup of an interned object is a dict lookup and a call
+    return None
+
+
+def _forget_number(interned, parent_id, number):
+    # The callback of the weak reference to an interned object, which removes it when the object is gone
+    def forget(reference):
+        references = interned.get(parent_id)
+        if references is not None and references.get(number) is reference:
+            del references[number]
+            if not references:
+                del interned[parent_id]
+    return forget
+
+
+class _NumberObject(_Object):
+    # Wraps a number that identifies an object within its parent, e.g. a friend of a Tox instance
+    __slots__ = ('_parent', '__weakref__')
+
+    def __init__(self, parent, number):
+        self._parent = parent
+        self._handle = number
+        self._scratch = None
+
+    @property
+    def number(self):
+        return self._handle
+
+    # The library returns the same numbers over and over (every friend list has all the friends), so there is one
+    # object per number as long as it's referenced, which also keeps its scratch buffer between calls. Every class
+    # has an _interned dict of the weak references to its objects by the id of their parent and their number.
+
+    @classmethod
+    def _references(cls, parent):
+        references = cls._interned.get(id(parent))
+        if references is None:
+            references = cls._interned[id(parent)] = {}
+        return references
+
+    @classmethod
+    def _intern(cls, parent, number):
+        references = cls._references(parent)
+        reference = references.get(number)
+        obj = reference() if reference is not None else None
+        if obj is None:
+            obj = cls(parent, number)
+            references[number] = weakref.ref(obj, _forget_number(cls._interned, id(parent), number))
+        return obj
+
+    def _invalidate(self, *inner_classes):
+        # The library reuses the numbers of deleted objects, so the object and the objects it contains (of the
+        # inner classes) aren't returned for the number anymore
+        interned = type(self)._interned
+        references = interned.get(id(self._parent), {})
+        if references.get(self._handle, _no_object)() is self:
+            del references[self._handle]
+            if not references:
+                del interned[id(self._parent)]
+        for inner_class in inner_classes:
+            for parent_id, references in list(inner_class._interned.items()):
+                obj = next((obj for obj in (reference() for reference in references.values()) if obj), None)
+                parent = obj._parent if obj is not None else None
+                while isinstance(parent, _NumberObject) and parent is not self:
+                    parent = parent._parent
+                if parent is self:
+                    del inner_class._interned[parent_id]
+
+    @classmethod
+    def _invalidate_numbers(cls, parent, *inner_classes):
+        # The library reassigns every number of the parent (the peers of a conference whose peer list changed)
+        references = cls._interned.pop(id(parent), {})
+        for obj in (reference() for reference in references.values()):
+            if obj is not None and inner_classes:
+                obj._invalidate(*inner_classes)
+
+    def __eq__(self, other):
+        return type(other) is type(self) and other._parent is self._parent and other._handle == self._handle
+
+    def __hash__(self):
+        return hash((type(self), id(self._parent), self._handle))
+
+    def __repr__(self):
+        return f'{type(self).__name__}({self._handle})'
+
+
+def load_library(path=None):
+    # Loads the Tox library (found by its name when the path isn't given) and binds every function of the IR to it.
+    # Functions that the library doesn't have raise NotImplementedError when called.
+    if path is None:
+        path = ctypes.util.find_library('toxcore')
+        if path is None:
+            raise OSError('Can\\'t find the toxcore library')
+    library = ctypes.CDLL(path)
+    module_globals = globals()
+    for cname, (restype, argtypes) in _PROTOTYPES.items():
+        function = getattr(library, cname, None)
+        if function is None:
+            module_globals['_' + cname] = _missing_function(cname)
+            continue
+        function.restype = restype
+        function.argtypes = argtypes
+        module_globals['_' + cname] = function
+    # Sizes that don't depend on an object are constants of the library, read once
+    for cname in _CONSTANT_SIZE_FUNCTIONS:
+        if hasattr(library, cname):
+            module_globals['_SIZE_' + cname] = module_globals['_' + cname]()
+    return library
+'''
+
+
+def _python_name(name: str) -> str:
+    return name + '_' if keyword.iskeyword(name) or name == 'self' else name
+
+
+def _is_user_data(ir_type: IRType) -> bool:
+    return ir_type.ctype.name == 'void' and ir_type.ctype.is_pointer
+
+
+# Generates the source of a Python module that calls the Tox library through ctypes, with a class for every class of
+# the IR. Buffers are passed to the library without copying them (bytes, bytearray and memoryview all work), returned
+# buffers are sized with their size function before the call and getters write to a buffer of the object that is
+# reused between calls, so a returned buffer is copied once.
+class CtypesBindingGenerator:
+    def __init__(self, ir: LoadedIR):
+        self.ir = ir
+        self.enum_names = {ir_enum.name for ir_enum in ir.enums}
+        self.exceptions_by_name: Dict[str, IRException] = {ir_exception.name: ir_exception
+                                                           for ir_exception in ir.exceptions}
+        self.class_paths: Dict[str, IRClass] = dict(get_class_paths(ir.classes))
+        self.class_path_by_name: Dict[str, str] = {}
+        for class_path, ir_class in self.class_paths.items():
+            self.class_path_by_name.setdefault(ir_class.name, class_path)
+        self.prototypes: Dict[str, Tuple[str, List[str]]] = {}
+        self.constant_size_functions: List[str] = []
+        self.callback_type_lines: List[str] = []
+        # The C names of the functions after which the number of an object of a number handle class is invalid, by
+        # class path
+        self.invalidate_funcs: Dict[str, Set[str]] = {
+            class_path: {func.cname for func in ir_class.handle.invalidate_funcs or []}
+            for class_path, ir_class in self.class_paths.items() if isinstance(ir_class.handle, IRNumberHandle)
+        }
+        # The class paths of the number handle classes whose numbers the library may reuse after a callback, by the C
+        # name of the callback
+        self.invalidate_callbacks: Dict[str, List[str]] = {}
+        for class_path, ir_class in self.class_paths.items():
+            if isinstance(ir_class.handle, IRNumberHandle):
+                for callback_func in ir_class.handle.invalidate_callbacks or []:
+                    self.invalidate_callbacks.setdefault(callback_func.cname, []).append(class_path)
+        # The classes with a batch layout by the C name of the function that returns one of their objects
+        self.batch_classes_by_item_func: Dict[str, IRClass] = {
+            ir_class.batch_layout.item_func.cname: ir_class for ir_class in self.class_paths.values()
+            if ir_class.batch_layout
+        }
+
+    # Types
+
+    def _class_of_type(self, ir_type: IRType) -> Optional[IRClass]:
+        class_path = self.class_path_by_name.get(ir_type.name)
+        return self.class_paths[class_path] if class_path else None
+
+    def _ctype(self, ir_type: IRType) -> str:
+        ctype = ir_type.ctype
+        if ir_type.contains_number_handle and not ir_type.is_array:
+            return PRIMITIVE_CTYPES.get(ctype.name, 'ctypes.c_uint32')
+        if ctype.is_pointer:
+            callback_class = self._class_of_type(ir_type)
+            if callback_class and callback_class.is_callback:
+                return f'_{callback_class.name}Function'
+            return 'ctypes.c_char_p' if ctype.name == 'char' else 'ctypes.c_void_p'
+        if ctype.name == 'void':
+            return 'None'
+        if ir_type.name in self.enum_names:
+            return 'ctypes.c_int'
+        return PRIMITIVE_CTYPES.get(ctype.name, 'ctypes.c_void_p')
+
+    def _param_ctype(self, ir_param: IRParam) -> str:
+        # Parameters that hold a native handle are pointers in C
+        return 'ctypes.c_void_p' if ir_param.replaced_type else self._ctype(ir_param.type)
+
+    def _return_ctype(self, func: IRFunction) -> str:
+        return_type = func.return_type
+        if return_type.param_index is not None:
+            return self._ctype(return_type.replaced)
+        if return_type.replaced and func.name == 'allocate_native':
+            return 'ctypes.c_void_p'
+        return self._ctype(return_type.replaced or return_type.type)
+
+    # Class hierarchy
+
+    def _handle_expressions(self, class_path: str) -> List[str]:
+        # The handles of the class and its outer classes, outermost first, as seen from an object of the class
+        depth = class_path.count('.')
+        return ['self' + '._parent' * (depth - level) + '._handle' for level in range(depth + 1)]
+
+    def _object_expression(self, owner_path: Optional[str], target_path: str) -> Optional[str]:
+        # The object of the class at target_path as seen from an object of the class at owner_path (or one of its
+        # outer classes)
+        if owner_path is None:
+            return None
+        expression = 'self'
+        path = owner_path
+        while path != target_path:
+            if '.' not in path:
+                return None
+            path = path.rsplit('.', 1)[0]
+            expression += '._parent'
+        return expression
+
+    def _number_handle_parent(self, owner_path: Optional[str], ir_type: IRType) -> str:
+        class_path = self.class_path_by_name[ir_type.name]
+        parent = self._object_expression(owner_path, class_path.rsplit('.', 1)[0]) if '.' in class_path else None
+        if parent is None:
+            raise RuntimeError(f'Can\'t find the parent of a {ir_type.name} object from {owner_path}')
+        return parent
+
+    # Functions
+
+    def _size_lines(self, ir_type: IRType, owner_path: Optional[str], indent: str) -> Tuple[List[str], str]:
+        # The lines that compute the size of a buffer before the call and the expression of the size. A size that is
+        # a constant of the headers is written as a number.
+        if ir_type.constant_size is not None:
+            return [], str(ir_type.constant_size)
+        size_func = ir_type.get_size_func
+        self._add_prototype(size_func, owner_path)
+        if size_func.is_static and not size_func.params and not size_func.throws:
+            if size_func.cname not in self.constant_size_functions:
+                self.constant_size_functions.append(size_func.cname)
+            return [], f'_SIZE_{size_func.cname}'
+        args = [] if size_func.is_static or owner_path is None else self._handle_expressions(owner_path)
+        lines = []
+        if size_func.throws:
+            lines.append(f'{indent}_error = ctypes.c_int()')
+            args.append('ctypes.byref(_error)')
+        lines.append(f'{indent}_size = _{size_func.cname}({", ".join(args)})')
+        if size_func.throws:
+            lines.extend(self._error_check_lines(size_func, indent))
+        return lines, '_size'
+
+    def _error_check_lines(self, func: IRFunction, indent: str) -> List[str]:
+        return [f'{indent}if _error.value:',
+                f'{indent}    raise {func.throws}Error(_error.value)']
+
+    def _add_prototype(self, func: IRFunction, owner_path: Optional[str]):
+        if func.cname in self.prototypes:
+            return
+        argtypes: List[str] = []
+        if not func.is_static and owner_path is not None:
+            for class_path in self._class_path_prefixes(owner_path):
+                handle = self.class_paths[class_path].handle
+                argtypes.append(self._ctype(handle.type) if isinstance(handle, IRNumberHandle) else 'ctypes.c_void_p')
+        param_argtypes: List[str] = []
+        for ir_param in func.params:
+            if isinstance(ir_param, IRBufferWrapper):
+                param_argtypes.extend([self._param_ctype(ir_param.buffer_param),
+                                       self._param_ctype(ir_param.length_param)])
+            else:
+                param_argtypes.append(self._param_ctype(ir_param))
+        if func.return_type.param_index is not None:
+            param_argtypes.insert(func.return_type.param_index, 'ctypes.c_void_p')
+        argtypes.extend(param_argtypes)
+        if func.throws:
+            argtypes.append(ERROR_ARGUMENT_CTYPE)
+        self.prototypes[func.cname] = (self._return_ctype(func), argtypes)
+
+    def _class_path_prefixes(self, class_path: str) -> List[str]:
+        names = class_path.split('.')
+        return ['.'.join(names[:index + 1]) for index in range(len(names))]
+
+    def _convert_param(self, ir_param: IRParam, owner_path: Optional[str], indent: str,
+                       lines: List[str]) -> Tuple[Optional[str], List[str]]:
+        # The name of the Python parameter (None if there isn't one) and the C arguments it's passed as
+        name = _python_name(ir_param.name)
+        ir_type = ir_param.type
+        if ir_param.replaced_type:
+            return name, [f'{name}._handle if {name} is not None else None']
+        if _is_user_data(ir_type):
+            return None, ['None']
+        if ir_type.contains_number_handle:
+            return name, [f'{name}._handle']
+        if not ir_type.ctype.is_pointer:
+            return name, [name]
+        if ir_type.ctype.name == 'char':
+            lines.append(f'{indent}_arg_{name} = _string({name})')
+            return name, [f'_arg_{name}']
+        pointed_class = self._class_of_type(ir_type)
+        if pointed_class and not ir_type.is_array:
+            return name, [f'{name}._handle']
+        if ir_type.get_size_func:
+            size_lines, size = self._size_lines(ir_type, owner_path, indent)
+            lines.extend(size_lines)
+            lines.append(f'{indent}_check_size({name}, {size}, {ir_param.name!r})')
+        if ir_type.mutable:
+            lines.append(f'{indent}_arg_{name} = _writable_buffer({name})')
+        else:
+            if ir_type.acts_as_string:
+                lines.append(f'{indent}{name} = _string({name})')
+            lines.append(f'{indent}_arg_{name} = _buffer({name})')
+        return name, [f'_arg_{name}']
+
+    def _convert_buffer_wrapper(self, buffer_wrapper: IRBufferWrapper, indent: str,
+                                lines: List[str]) -> Tuple[str, List[str]]:
+        name = _python_name(buffer_wrapper.buffer_param.name)
+        if buffer_wrapper.buffer_param.type.acts_as_string:
+            lines.append(f'{indent}if {name}.__class__ is str:')
+            lines.append(f'{indent}    {name} = {name}.encode()')
+        # bytes, the most common argument, are passed without any call
+        lines.append(f'{indent}if {name}.__class__ is bytes:')
+        lines.append(f'{indent}    _arg_{name}, _size_{name} = {name}, len({name})')
+        lines.append(f'{indent}else:')
+        lines.append(f'{indent}    _arg_{name}, _size_{name} = _buffer_and_size({name})')
+        return name, [f'_arg_{name}', f'_size_{name}']
+
+    def _function_lines(self, func: IRFunction, owner_path: Optional[str], method_name: str,
+                        indent: str) -> List[str]:
+        # A method of the class at owner_path (a static method if the function is static) that calls the function
+        self._add_prototype(func, owner_path)
+        is_static = func.is_static or owner_path is None
+        body_indent = indent + '    '
+        lines: List[str] = []
+        python_params: List[str] = []
+        args: List[str] = []
+        after_call_lines: List[str] = []
+        for ir_param in func.params:
+            if isinstance(ir_param, IRBufferWrapper):
+                python_param, param_args = self._convert_buffer_wrapper(ir_param, body_indent, lines)
+                set_size_func = ir_param.buffer_param.type.set_size_func
+                if set_size_func:
+                    self._add_prototype(set_size_func, owner_path)
+                    set_size_args = [] if set_size_func.is_static else self._handle_expressions(owner_path)
+                    after_call_lines.append(f'{body_indent}_{set_size_func.cname}('
+                                            f'{", ".join(set_size_args + [param_args[1]])})')
+            else:
+                callback_class = self._class_of_type(ir_param.type)
+                if callback_class and callback_class.is_callback:
+                    return self._callback_registration_lines(func, owner_path, method_name, ir_param,
+                                                             callback_class, indent)
+                python_param, param_args = self._convert_param(ir_param, owner_path, body_indent, lines)
+            if python_param:
+                python_params.append(python_param)
+            args.extend(param_args)
+            # The library keeps the pointer, so the object keeps the memory alive until it's set again
+            if ir_param.ownership == BUFFER_RETAINED and not is_static and param_args[0].startswith('_arg_'):
+                after_call_lines.append(f'{body_indent}self._keep({func.cname!r}, {param_args[0]})')
+
+        return_type = func.return_type
+        return_ir_type = return_type.type
+        size = None
+        if return_ir_type.get_size_func and (return_type.param_index is not None or
+                                             not self._class_of_type(return_ir_type)):
+            size_lines, size = self._size_lines(return_ir_type, owner_path, body_indent)
+            lines.extend(size_lines)
+        if return_type.param_index is not None:
+            if return_ir_type.contains_number_handle:
+                lines.append(f'{body_indent}_buffer = ({self._ctype_of_array_item(return_ir_type)} * {size})()')
+            elif is_static:
+                lines.append(f'{body_indent}_buffer = ctypes.create_string_buffer({size})')
+            else:
+                lines.append(f'{body_indent}_buffer = self._scratch_buffer({size})')
+            args.insert(return_type.param_index, '_buffer')
+        if not is_static:
+            args = self._handle_expressions(owner_path) + args
+        if func.throws:
+            lines.append(f'{body_indent}_error = ctypes.c_int()')
+            args.append('ctypes.byref(_error)')
+        call = f'_{func.cname}({", ".join(args)})'
+        lines.append(f'{body_indent}_result = {call}')
+        if func.throws:
+            lines.extend(self._error_check_lines(func, body_indent))
+        elif return_type.replaced and return_type.replaced.name == 'bool':
+            lines.append(f'{body_indent}if not _result:')
+            lines.append(f'{body_indent}    raise ToxError(None, {func.cname + " failed"!r})')
+        lines.extend(after_call_lines)
+        if owner_path is not None and func.cname in self.invalidate_funcs.get(owner_path, ()):
+            lines.append(f'{body_indent}self._invalidate({", ".join(self._inner_number_classes(owner_path))})')
+        lines.extend(self._return_lines(func, owner_path, size, body_indent))
+
+        params = ', '.join((['self'] if not is_static else []) + python_params)
+        header = ([f'{indent}@staticmethod'] if is_static else []) + [f'{indent}def {method_name}({params}):']
+        return header + lines
+
+    def _inner_number_classes(self, owner_path: str) -> List[str]:
+        return [ir_class.name for class_path, ir_class in self.class_paths.items()
+                if class_path.startswith(f'{owner_path}.') and isinstance(ir_class.handle, IRNumberHandle)]
+
+    def _ctype_of_array_item(self, ir_type: IRType) -> str:
+        return PRIMITIVE_CTYPES.get(ir_type.ctype.name, 'ctypes.c_uint32')
+
+    def _return_lines(self, func: IRFunction, owner_path: Optional[str], size: Optional[str],
+                      indent: str) -> List[str]:
+        return_type = func.return_type
+        ir_type = return_type.type
+        if return_type.param_index is not None:
+            if ir_type.contains_number_handle:
+                parent = self._number_handle_parent(owner_path, ir_type)
+                # The interned objects are looked up inline, only the numbers without one make a call
+                return [f'{indent}_get = {ir_type.name}._references({parent}).get',
+                        f'{indent}_intern = {ir_type.name}._intern',
+                        f'{indent}return [_get(number, _no_object)() or _intern({parent}, number) '
+                        'for number in _buffer]']
+            # Slicing a ctypes char array copies the bytes out of it in one call, string_at() is much slower
+            result = f'_buffer[:{size}]'
+            return [f'{indent}return {result}.decode(errors="replace")' if ir_type.acts_as_string
+                    else f'{indent}return {result}']
+        if ir_type.ctype.name == 'void' and not ir_type.ctype.is_pointer:
+            return []
+        if ir_type.contains_number_handle:
+            return [f'{indent}return {ir_type.name}._intern({self._number_handle_parent(owner_path, ir_type)}, '
+                    f'_result)']
+        if ir_type.name in self.enum_names:
+            return [f'{indent}return {ir_type.name}(_result)']
+        returned_class = self._class_of_type(ir_type)
+        if returned_class and ir_type.ctype.is_pointer:
+            # Objects with a deallocation function are owned by the caller, others by the object that returned them
+            owned = isinstance(returned_class.handle, IRNativeHandle) and returned_class.handle.dealloc_func
+            owner = 'None' if owned or func.is_static or owner_path is None else 'self'
+            return [f'{indent}return {returned_class.name}._wrap(_result, {owner}) if _result else None']
+        if ir_type.ctype.is_pointer and ir_type.ctype.name == 'char':
+            return [f'{indent}return _result.decode(errors="replace") if _result is not None else None']
+        if ir_type.ctype.is_pointer and size:
+            return [f'{indent}return ctypes.string_at(_result, {size}) if _result else b\'\'']
+        return [f'{indent}return _result']
+
+    def _callback_registration_lines(self, func: IRFunction, owner_path: str, method_name: str,
+                                     callback_param: IRParam, callback_class: IRClass, indent: str) -> List[str]:
+        # The Python callable is wrapped in a C function that converts the arguments, and kept alive by the object
+        # for as long as it's registered
+        callback_func = callback_class.functions[0]
+        self._add_callback_prototype(callback_class)
+        body_indent = indent + '    '
+        native_params: List[str] = []
+        conversion_lines: List[str] = []
+        callback_args: List[str] = []
+        number_objects: Dict[str, str] = {}
+        borrowed_views: List[str] = []
+        for ir_param in callback_func.params:
+            if isinstance(ir_param, IRBufferWrapper):
+                name = _python_name(ir_param.buffer_param.name)
+                native_params.extend([name, f'{name}_size'])
+                if ir_param.buffer_param.type.acts_as_string:
+                    callback_args.append(f'ctypes.string_at({name}, {name}_size).decode(errors="replace")')
+                elif ir_param.ownership == BUFFER_BORROWED_FOR_CALLBACK:
+                    # The callback gets a view of the memory the library lends it, released when the callback
+                    # returns
+                    conversion_lines.append(f'{body_indent}    {name} = _borrowed_view({name}, {name}_size)')
+                    borrowed_views.append(name)
+                    callback_args.append(name)
+                else:
+                    callback_args.append(f'ctypes.string_at({name}, {name}_size)')
+                continue
+            name = _python_name(ir_param.name)
+            native_params.append(name)
+            ir_type = ir_param.type
+            if _is_user_data(ir_type):
+                continue
+            if ir_type.contains_number_handle:
+                class_path = self.class_path_by_name[ir_type.name]
+                parent_path = class_path.rsplit('.', 1)[0]
+                parent = number_objects.get(parent_path) or self._object_expression(owner_path, parent_path)
+                conversion_lines.append(f'{body_indent}    {name} = {ir_type.name}._intern({parent}, {name})')
+                number_objects[class_path] = name
+                callback_args.append(name)
+            elif ir_type.name in self.enum_names:
+                callback_args.append(f'{ir_type.name}({name})')
+            elif self._class_of_type(ir_type) and ir_type.ctype.is_pointer:
+                callback_args.append(self._object_expression(owner_path, self.class_path_by_name[ir_type.name])
+                                     or name)
+            elif ir_type.ctype.is_pointer and ir_type.ctype.name == 'char':
+                callback_args.append(f'{name}.decode(errors="replace") if {name} is not None else None')
+            else:
+                callback_args.append(name)
+
+        # The objects of the numbers that the library may reuse after the callback aren't returned for them anymore:
+        # the object the callback gets once it returns, or all the objects of its parent before it's called (so it
+        # gets the new ones)
+        cleanup_lines = [f'{name}.release()' for name in borrowed_views]
+        for class_path in self.invalidate_callbacks.get(callback_func.cname, []):
+            inner_classes = self._inner_number_classes(class_path)
+            if class_path in number_objects:
+                cleanup_lines.append(f'{number_objects[class_path]}._invalidate({", ".join(inner_classes)})')
+                continue
+            parent_path = class_path.rsplit('.', 1)[0]
+            parent = number_objects.get(parent_path) or self._object_expression(owner_path, parent_path)
+            if parent is None:
+                raise RuntimeError(f'Can\'t find the parent of the {class_path} objects that '
+                                   f'{callback_func.cname} invalidates')
+            conversion_lines.append(f'{body_indent}    {self.class_paths[class_path].name}._invalidate_numbers('
+                                    f'{", ".join([parent] + inner_classes)})')
+
+        lines = [f'{indent}def {method_name}(self, callback):',
+                 f'{body_indent}if callback is None:',
+                 f'{body_indent}    # A null function pointer unregisters the callback',
+                 f'{body_indent}    _callback = _{callback_class.name}Function()',
+                 f'{body_indent}else:',
+                 f'{body_indent}    def native_callback({", ".join(native_params)}):']
+        lines.extend('    ' + line for line in conversion_lines)
+        call_line = f'callback({", ".join(callback_args)})'
+        if cleanup_lines:
+            lines.extend([f'{body_indent}        try:',
+                          f'{body_indent}            {call_line}',
+                          f'{body_indent}        finally:'])
+            lines.extend(f'{body_indent}            {line}' for line in cleanup_lines)
+        else:
+            lines.append(f'{body_indent}        {call_line}')
+        lines.extend([f'{body_indent}    _callback = _{callback_class.name}Function(native_callback)',
+                      f'{body_indent}if self._callbacks is None:',
+                      f'{body_indent}    self._callbacks = {{}}',
+                      f'{body_indent}self._callbacks[{method_name!r}] = _callback',
+                      f'{body_indent}_{func.cname}({", ".join(self._handle_expressions(owner_path) + ["_callback"])})'])
+        return lines
+
+    def _add_callback_prototype(self, callback_class: IRClass):
+        # Callback types are declared before the prototypes that use them
+        name = f'_{callback_class.name}Function'
+        if any(line.startswith(f'{name} = ') for line in self.callback_type_lines):
+            return
+        callback_func = callback_class.functions[0]
+        argtypes: List[str] = []
+        for ir_param in callback_func.params:
+            if isinstance(ir_param, IRBufferWrapper):
+                argtypes.extend(['ctypes.c_void_p', self._ctype(ir_param.length_param.type)])
+            else:
+                argtypes.append(self._param_ctype(ir_param))
+        self.callback_type_lines.append(
+            f'{name} = ctypes.CFUNCTYPE({", ".join([self._ctype(callback_func.return_type.type)] + argtypes)})')
+
+    # Module
+
+    def _enum_lines(self, ir_enum: IREnum) -> List[str]:
+        lines = [f'class {ir_enum.name}(enum.IntEnum):']
+        lines.extend(f'    {_python_name(value.name)} = {value.ordinal}' for value in ir_enum.values)
+        return lines or [f'class {ir_enum.name}(enum.IntEnum):', '    pass']
+
+    def _exception_lines(self, ir_exception: IRException) -> List[str]:
+        return [f'class {ir_exception.name}Error(ToxError):', f'    codes = {ir_exception.enum_name}']
+
+    def _class_lines(self, ir_class: IRClass, class_path: str) -> List[str]:
+        handle = ir_class.handle
+        base = '_NumberObject' if isinstance(handle, IRNumberHandle) else '_NativeObject'
+        lines = [f'class {ir_class.name}({base}):', '    __slots__ = ()']
+        if isinstance(handle, IRNumberHandle):
+            lines.append('    _interned = {}')
+        if isinstance(handle, IRNativeHandle) and handle.alloc_func:
+            lines.append('')
+            lines.extend(self._constructor_lines(ir_class, class_path))
+        if isinstance(handle, IRNativeHandle) and handle.dealloc_func:
+            self._add_prototype(handle.dealloc_func, None)
+            lines.extend(['',
+                          '    def close(self):',
+                          '        if self._handle is not None and self._owner is None:',
+                          f'            _{handle.dealloc_func.cname}(self._handle)',
+                          '        self._handle = None'])
+        if isinstance(handle, IRNativeHandle) and handle.struct_layout and handle.struct_layout.is_public:
+            lines.append('')
+            lines.extend(self._struct_update_lines(ir_class))
+
+        for ir_property in ir_class.properties:
+            name = _python_name(ir_property.name)
+            if ir_property.is_static:
+                lines.append('')
+                lines.extend(self._function_lines(ir_property.getter, None, name, '    '))
+                continue
+            lines.append('')
+            lines.extend(self._function_lines(ir_property.getter, class_path, f'_get_{name}', '    '))
+            if ir_property.setter:
+                lines.append('')
+                lines.extend(self._function_lines(ir_property.setter, class_path, f'_set_{name}', '    '))
+                lines.extend(['', f'    {name} = property(_get_{name}, _set_{name})'])
+            else:
+                lines.extend(['', f'    {name} = property(_get_{name})'])
+
+        for func in ir_class.functions:
+            if ir_class.is_callback:
+                continue
+            lines.append('')
+            lines.extend(self._function_lines(func, class_path, _python_name(func.name), '    '))
+            batch_class = self.batch_classes_by_item_func.get(func.cname)
+            if batch_class:
+                lines.append('')
+                lines.extend(self._batch_method_lines(func, class_path, batch_class))
+        return lines
+
+    # Structs
+
+    def _struct_field_ctype(self, ir_type: IRType) -> str:
+        # Only the size and the alignment of a field matter, pointers of any kind are void pointers
+        return 'ctypes.c_void_p' if ir_type.ctype.is_pointer else self._ctype(ir_type)
+
+    def _struct_lines(self, ir_class: IRClass) -> List[str]:
+        layout = ir_class.handle.struct_layout
+        setters = {ir_property.name for ir_property in ir_class.properties if ir_property.setter}
+        lines = [f'class _{ir_class.name}Struct(ctypes.Structure):',
+                 f'    # struct {layout.cname} as the headers declare it',
+                 '    _fields_ = [']
+        lines.extend(f'        ({field.name!r}, {self._struct_field_ctype(field.type)}),' for field in layout.fields)
+        lines.extend(['    ]', '    # The properties that are a field of a plain value, written without their setter',
+                      '    _properties = {'])
+        lines.extend(f'        {_python_name(field.property_name)!r}: {field.name!r},' for field in layout.fields
+                     if field.property_name in setters and not field.type.ctype.is_pointer)
+        lines.append('    }')
+        return lines
+
+    def _struct_update_lines(self, ir_class: IRClass) -> List[str]:
+        # Sets many properties at once: the plain fields are written to the struct in place, without a call to the
+        # library for each, and the others (buffers) go through their setters
+        return ['    def update(self, **values):',
+                f'        _fields = _{ir_class.name}Struct.from_address(self._handle)',
+                f'        _properties = _{ir_class.name}Struct._properties',
+                '        for _name, _value in values.items():',
+                '            if _name in _properties:',
+                '                setattr(_fields, _properties[_name], _value)',
+                '            else:',
+                '                setattr(self, _name, _value)']
+
+    # Batches
+
+    def _batch_fields(self, ir_class: IRClass) -> List[Tuple[IRBatchField, Optional[str]]]:
+        # The fields that are read into arrays with their type code, byte buffers (type code None) are concatenated
+        # into a bytearray. Fields of other types are left to the objects.
+        fields: List[Tuple[IRBatchField, Optional[str]]] = []
+        for field in ir_class.batch_layout.fields:
+            ctype = field.type.ctype
+            if ctype.is_pointer:
+                if ctype.name == 'uint8_t' and field.type.get_size_func:
+                    fields.append((field, None))
+            elif field.type.name in self.enum_names:
+                fields.append((field, 'i'))
+            elif ctype.name in ARRAY_TYPECODES:
+                fields.append((field, ARRAY_TYPECODES[ctype.name]))
+        return fields
+
+    def _batch_class_lines(self, ir_class: IRClass) -> List[str]:
+        fields = self._batch_fields(ir_class)
+        slots = ['count']
+        init_lines = ['        self.count = count']
+        for field, typecode in fields:
+            name = _python_name(field.name)
+            if typecode is None:
+                slots.extend([name, f'{name}_offsets'])
+                init_lines.extend([f'        self.{name} = bytearray()',
+                                   f'        self.{name}_offsets = array.array(\'Q\', [0]) * (count + 1)'])
+            else:
+                slots.append(name)
+                init_lines.append(f'        self.{name} = array.array({typecode!r}, [0]) * count')
+        return [f'class {ir_class.name}Batch:',
+                f'    # The fields of {ir_class.name} objects, an array for each',
+                '    # The bytes of a buffer field are concatenated, the object i has [offsets[i]:offsets[i + 1]]',
+                f'    __slots__ = ({", ".join(repr(slot) for slot in slots)})',
+                '',
+                '    def __init__(self, count):'] + init_lines
+
+    def _batch_method_lines(self, item_func: IRFunction, class_path: str, batch_class: IRClass) -> List[str]:
+        # Reads every object of the collection into a batch with one call per field of an object, without making a
+        # Python object for each
+        layout = batch_class.batch_layout
+        batch_path = self.class_path_by_name[batch_class.name]
+        handles = self._handle_expressions(class_path)
+        self._add_prototype(layout.count_func, class_path)
+        lines = [f'    def {_python_name(item_func.name)}_batch(self):',
+                 f'        _count = _{layout.count_func.cname}({", ".join(handles)})',
+                 f'        _batch = {batch_class.name}Batch(_count)']
+        loop_lines = [f'            _item = _{item_func.cname}({", ".join(handles + ["_index"])})']
+        for field, typecode in self._batch_fields(batch_class):
+            name = _python_name(field.name)
+            self._add_prototype(field.getter, batch_path)
+            lines.append(f'        _{name} = _batch.{name}')
+            if typecode is None:
+                size_func = field.type.get_size_func
+                self._add_prototype(size_func, batch_path)
+                lines.append(f'        _{name}_offsets = _batch.{name}_offsets')
+                loop_lines.extend([f'            _size = _{size_func.cname}(_item)',
+                                   '            if _size:',
+                                   f'                _{name} += ctypes.string_at(_{field.getter.cname}(_item), _size)',
+                                   f'            _{name}_offsets[_index + 1] = len(_{name})'])
+            else:
+                loop_lines.append(f'            _{name}[_index] = _{field.getter.cname}(_item)')
+        lines.append('        for _index in range(_count):')
+        lines.extend(loop_lines)
+        lines.append('        return _batch')
+        return lines
+
+    def _constructor_lines(self, ir_class: IRClass, class_path: str) -> List[str]:
+        alloc_func = ir_class.handle.alloc_func
+        lines = self._function_lines(alloc_func, None, '__init__', '    ')
+        # The static function becomes a constructor that keeps the returned handle
+        lines = [line for line in lines if line.strip() != '@staticmethod']
+        lines[0] = lines[0].replace('__init__(', '__init__(self, ' if alloc_func.params else '__init__(self')
+        lines = [line for line in lines if not line.lstrip().startswith('return ')]
+        lines.append('        self._init_handle(_result)')
+        if ir_class.default_init:
+            self._add_prototype(ir_class.default_init, class_path)
+            lines.append(f'        _{ir_class.default_init.cname}(self._handle)')
+        return lines
+
+    def generate(self) -> str:
+        sections: List[List[str]] = []
+        sections.extend(self._enum_lines(ir_enum) for ir_enum in self.ir.enums)
+        sections.extend(self._exception_lines(ir_exception) for ir_exception in self.ir.exceptions)
+        for class_path, ir_class in self.class_paths.items():
+            handle = ir_class.handle
+            if isinstance(handle, IRNativeHandle) and handle.struct_layout and handle.struct_layout.is_public:
+                sections.append(self._struct_lines(ir_class))
+            if not ir_class.is_callback:
+                sections.append(self._class_lines(ir_class, class_path))
+            if ir_class.batch_layout:
+                sections.append(self._batch_class_lines(ir_class))
+        for ir_class in self.class_paths.values():
+            if ir_class.is_callback and ir_class.functions:
+                self._add_callback_prototype(ir_class)
+
+        metadata = ', '.join(f'{key} {value}' for key, value in self.ir.metadata.items())
+        lines = [f'# Generated by ctypes_binding.py from the Tox OOP API IR ({metadata}). Don\'t edit.']
+        lines.extend(BINDING_RUNTIME.rstrip('\n').split('\n'))
+        lines.append('')
+        for section in sections:
+            lines.extend(['', ''] + section)
+        lines.extend(['', ''] + self.callback_type_lines)
+        lines.extend(['', '# The result type and the argument types of every C function', '_PROTOTYPES = {'])
+        for cname, (restype, argtypes) in self.prototypes.items():
+            lines.append(f'    {cname!r}: ({restype}, [{", ".join(argtypes)}]),')
+        lines.extend(['}', '_CONSTANT_SIZE_FUNCTIONS = ['])
+        lines.extend(f'    {cname!r},' for cname in self.constant_size_functions)
+        lines.extend([']', '',
+                      'for _cname in _PROTOTYPES:',
+                      '    globals()[\'_\' + _cname] = _missing_function(_cname)',
+                      'for _cname in _CONSTANT_SIZE_FUNCTIONS:',
+                      '    globals()[\'_SIZE_\' + _cname] = None',
+                      ''])
+        return '\n'.join(lines)
+
+
+def generate_ctypes_binding(ir: LoadedIR) -> str:
+    return CtypesBindingGenerator(ir).generate()
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(
+        description='Generate a Python binding of the Tox library that calls it through ctypes from a generated IR.')
+    arg_parser.add_argument('ir', help='the IR (JSON, optionally gzip compressed)')
+    arg_parser.add_argument('-o', '--output', required=True, help='file to write the Python module to')
+    args = arg_parser.parse_args()
+
+    source = generate_ctypes_binding(load_ir(args.ir))
+    with open(f'{args.output}.tmp', 'w') as f:
+        f.write(source)
+    os.replace(f'{args.output}.tmp', args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,16 +1,178 @@
-from github import Github, Repository, PaginatedList, Tag, Commit, ContentFile
-from typing import List
+from typing import Dict, List, Optional
+import base64
+import hashlib
+import json
+import os
+import posixpath
+import subprocess
+import tarfile
+
+# Written next to the headers: where they came from and the SHA-256 of each one
+HEADERS_MANIFEST = '.headers.json'
+
+
+def git_blob_id(content: bytes) -> str:
+    # The id git gives a file with this content
+    return hashlib.sha1(b'blob %d\0' % len(content) + content).hexdigest()
+
+
+def _local_blob_id(download_dir: str, header: str) -> Optional[str]:
+    try:
+        with open(f'{download_dir}/{posixpath.basename(header)}', 'rb') as f:
+            return git_blob_id(f.read())
+    except FileNotFoundError:
+        return None
+
+
+def _read_manifest(download_dir: str) -> dict:
+    try:
+        with open(f'{download_dir}/{HEADERS_MANIFEST}') as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def _headers_match_manifest(download_dir: str, manifest: dict, headers: List[str]) -> bool:
+    for header in headers:
+        name = posixpath.basename(header)
+        try:
+            with open(f'{download_dir}/{name}', 'rb') as f:
+                if hashlib.sha256(f.read()).hexdigest() != manifest.get('headers', {}).get(name):
+                    return False
+        except FileNotFoundError:
+            return False
+    return True
+
+
+def _write_headers(download_dir: str, contents: Dict[str, bytes], headers: List[str], source: str, ref: str,
+                   source_hash: str):
+    # Only headers whose content changed are written, each one atomically
+    manifest_headers: Dict[str, str] = {}
+    for header in headers:
+        name = posixpath.basename(header)
+        path = f'{download_dir}/{name}'
+        if header in contents:
+            temp_path = f'{path}.{os.getpid()}.tmp'
+            with open(temp_path, 'wb') as f:
+                f.write(contents[header])
+            os.replace(temp_path, path)
+        with open(path, 'rb') as f:
+            manifest_headers[name] = hashlib.sha256(f.read()).hexdigest()
+
+    manifest = {'source': source, 'ref': ref, 'source_hash': source_hash, 'headers': manifest_headers}
+    with open(f'{download_dir}/{HEADERS_MANIFEST}', 'w') as f:
+        json.dump(manifest, f, indent=2)
 
 
 def download_headers(download_dir: str, tag: str, headers: List[str]):
+    # PyGithub takes a while to import, so it's only imported when downloading
+    from github import Github, Repository, ContentFile, GitRef, UnknownObjectException
     g = Github()
     repo: Repository = g.get_repo('TokTok/c-toxcore')
-    tags: PaginatedList = repo.get_tags()
-    found_tags: List[Tag] = [possible_tag for possible_tag in tags if possible_tag.name == tag]
-    if not found_tags:
+    # The tag is resolved directly instead of paging through every tag of the repository
+    try:
+        tag_ref: GitRef = repo.get_git_ref(f'tags/{tag}')
+    except UnknownObjectException:
         raise RuntimeError('Can\'t find a git tag with the specified Tox version')
-    found_commit: Commit = found_tags[0].commit
+    commit_sha = tag_ref.object.sha
+    if tag_ref.object.type == 'tag':
+        commit_sha = repo.get_git_tag(commit_sha).object.sha
+
+    # A directory listing has the blob ids of its files, so only the headers that changed are downloaded
+    blob_ids: Dict[str, str] = {}
+    for directory in sorted({posixpath.dirname(header) for header in headers}):
+        directory_files: List[ContentFile] = repo.get_contents(directory, ref=commit_sha)
+        blob_ids.update({content_file.path: content_file.sha for content_file in directory_files})
+    contents: Dict[str, bytes] = {}
+    for header in headers:
+        if header not in blob_ids:
+            raise RuntimeError(f'The header {header} isn\'t in the tag {tag}')
+        if _local_blob_id(download_dir, header) == blob_ids[header]:
+            continue
+        content = base64.b64decode(repo.get_git_blob(blob_ids[header]).content)
+        if git_blob_id(content) != blob_ids[header]:
+            raise RuntimeError(f'The downloaded header {header} doesn\'t match its hash')
+        contents[header] = content
+    _write_headers(download_dir, contents, headers, 'github', tag, commit_sha)
+
+
+def _run_git(repo_dir: str, args: List[str], stdin: Optional[bytes] = None) -> bytes:
+    try:
+        result = subprocess.run(['git', '-C', repo_dir] + args, input=stdin, stdout=subprocess.PIPE,
+                                stderr=subprocess.PIPE, check=True)
+    except subprocess.CalledProcessError as e:
+        raise RuntimeError(f'git {" ".join(args)} failed in {repo_dir}: {e.stderr.decode(errors="replace").strip()}')
+    return result.stdout
+
+
+def read_headers_from_git(download_dir: str, repo_dir: str, tag: str, headers: List[str]):
+    # Copies the headers of a tag from a local clone or mirror of c-toxcore, without network access
+    try:
+        commit = _run_git(repo_dir, ['rev-parse', '--verify', f'refs/tags/{tag}^{{commit}}']).decode().strip()
+    except RuntimeError:
+        raise RuntimeError(f'Can\'t find the git tag {tag} in {repo_dir}')
+
+    # ls-tree output: "<mode> <type> <id>\t<path>"
+    blob_ids: Dict[str, str] = {}
+    for line in _run_git(repo_dir, ['ls-tree', '-z', commit, '--'] + headers).split(b'\0'):
+        if line:
+            info, path = line.decode().split('\t', 1)
+            blob_ids[path] = info.split()[2]
+    changed_headers = []
     for header in headers:
-        tox_header: ContentFile = repo.get_contents(header, ref=found_commit.sha)
-        with open(f'{download_dir}/{tox_header.name}', 'wb') as f:
-            f.write(tox_header.decoded_content)
+        if header not in blob_ids:
+            raise RuntimeError(f'The header {header} isn\'t in the tag {tag}')
+        if _local_blob_id(download_dir, header) != blob_ids[header]:
+            changed_headers.append(header)
+
+    # All headers are read by a single git process
+    contents: Dict[str, bytes] = {}
+    if changed_headers:
+        output = _run_git(repo_dir, ['cat-file', '--batch'],
+                          ''.join(blob_ids[header] + '\n' for header in changed_headers).encode())
+        position = 0
+        for header in changed_headers:
+            # Every object is "<id> <type> <size>\n<content>\n"
+            header_end = output.index(b'\n', position)
+            size = int(output[position:header_end].split()[2])
+            content = output[header_end + 1:header_end + 1 + size]
+            position = header_end + 1 + size + 1
+            blob_id = blob_ids[header]
+            # Repositories with SHA-256 object ids aren't verified against the SHA-1 id
+            if len(blob_id) == 40 and git_blob_id(content) != blob_id:
+                raise RuntimeError(f'The header {header} read from {repo_dir} doesn\'t match its hash')
+            contents[header] = content
+    _write_headers(download_dir, contents, headers, 'git', tag, commit)
+
+
+def read_headers_from_tarball(download_dir: str, tarball: str, headers: List[str], sha256: Optional[str] = None):
+    # Extracts the headers from a c-toxcore release tarball, whose files are in a top-level directory
+    tarball_hash = hashlib.sha256()
+    with open(tarball, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            tarball_hash.update(chunk)
+    source_hash = tarball_hash.hexdigest()
+    if sha256 and source_hash != sha256.lower():
+        raise RuntimeError(f'The SHA-256 of {tarball} is {source_hash}, not {sha256}')
+
+    manifest = _read_manifest(download_dir)
+    if manifest.get('source') == 'tarball' and manifest.get('source_hash') == source_hash and \
+            _headers_match_manifest(download_dir, manifest, headers):
+        return
+
+    # The members are read in a single pass, which also works for compressed tarballs
+    contents: Dict[str, bytes] = {}
+    with tarfile.open(tarball, 'r|*') as archive:
+        for member in archive:
+            path = member.name.split('/', 1)[1] if '/' in member.name else member.name
+            if member.isfile() and path in headers and path not in contents:
+                contents[path] = archive.extractfile(member).read()
+                if len(contents) == len(headers):
+                    break
+    missing_headers = [header for header in headers if header not in contents]
+    if missing_headers:
+        raise RuntimeError(f'The headers {", ".join(missing_headers)} aren\'t in {tarball}')
+
+    changed_contents = {header: content for header, content in contents.items()
+                        if _local_blob_id(download_dir, header) != git_blob_id(content)}
+    _write_headers(download_dir, changed_contents, headers, 'tarball', os.path.basename(tarball), source_hash)
@@ -1,21 +1,58 @@
-from typing import List, Optional, Union
+from typing import Any, List, Optional, Union
+from naming import intern_name
 
 
 class IRObject:
-    def __init__(self):
-        self.object_name = self.__class__.__name__
+    __slots__ = ()
+
+    # The name of the class, shared by all of its instances instead of being stored in each one
+    object_name = 'IRObject'
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.object_name = cls.__name__
+
+    def field_values(self) -> List[Any]:
+        return [getattr(self, field) for field in self.__slots__]
+
+    def __setstate__(self, state):
+        # Names of IR loaded from a pickle (the build cache, worker processes) are interned like generated names
+        _, slots = state
+        for field, value in slots.items():
+            setattr(self, field, intern_name(value) if isinstance(value, str) else value)
+
+
+# Who owns the memory of a buffer (a parameter or a returned array) and for how long it's valid:
+# - borrowed for the call: the library only uses it during the call
+# - borrowed for the callback: the library lends it to a callback, it's only valid until the callback returns
+# - caller owned: the caller allocates it and the library writes to it, e.g. the buffer a getter fills
+# - caller owned out: an output param that stays a param, the caller allocates it and the callee fills it during the
+#   call, e.g. the ciphertext of tox_pass_encrypt()
+# - borrowed from the object: memory of the object the function is called on, valid until the object changes
+# - retained: the library keeps the pointer after the call, so the caller keeps the memory alive as long as the object
+BUFFER_BORROWED_FOR_CALL = 'borrowed_for_call'
+BUFFER_BORROWED_FOR_CALLBACK = 'borrowed_for_callback'
+BUFFER_CALLER_OWNED = 'caller_owned'
+BUFFER_CALLER_OWNED_OUT = 'caller_owned_out'
+BUFFER_BORROWED_FROM_OBJECT = 'borrowed_from_object'
+BUFFER_RETAINED = 'retained'
+BUFFER_OWNERSHIPS = (BUFFER_BORROWED_FOR_CALL, BUFFER_BORROWED_FOR_CALLBACK, BUFFER_CALLER_OWNED,
+                     BUFFER_CALLER_OWNED_OUT, BUFFER_BORROWED_FROM_OBJECT, BUFFER_RETAINED)
 
 
 class CType(IRObject):
+    __slots__ = ('name', 'is_pointer')
+
     def __init__(self, name: str, is_pointer: bool):
-        super().__init__()
         self.name = name
         self.is_pointer = is_pointer
 
 
 class IRType(IRObject):
+    __slots__ = ('name', 'mutable', 'is_array', 'acts_as_string', 'contains_number_handle', 'ctype', 'get_size_func',
+                 'set_size_func', 'constant_size')
+
     def __init__(self, name: str, mutable: bool, is_array: bool, ctype: CType):
-        super().__init__()
         self.name = name
         self.mutable = mutable
         self.is_array = is_array
@@ -24,34 +61,44 @@ class IRType(IRObject):
         self.ctype = ctype
         self.get_size_func: Optional[IRFunction] = None
         self.set_size_func: Optional[IRFunction] = None
+        # The size of a fixed size buffer when get_size_func only returns a constant of the headers
+        self.constant_size: Optional[int] = None
 
 
 class IRParam(IRObject):
+    __slots__ = ('name', 'type', 'replaced_type', 'ownership')
+
     def __init__(self, name: str, param_type: IRType):
-        super().__init__()
         self.name = name
         self.type = param_type
         self.replaced_type: Optional[IRType] = None
+        # One of BUFFER_OWNERSHIPS when the param is a buffer, its const-ness is the mutability of its type
+        self.ownership: Optional[str] = None
 
 
 class IRBufferWrapper(IRObject):
+    __slots__ = ('buffer_param', 'length_param', 'ownership')
+
     def __init__(self, buffer_param: IRParam, length_param: IRParam):
-        super().__init__()
         self.buffer_param = buffer_param
         self.length_param = length_param
+        self.ownership: Optional[str] = None
 
 
 class IRReturnType(IRObject):
+    __slots__ = ('type', 'replaced', 'param_index', 'ownership')
+
     def __init__(self, return_type: IRType):
-        super().__init__()
         self.type = return_type
         self.replaced: Optional[IRType] = None
         self.param_index: Optional[int] = None
+        self.ownership: Optional[str] = None
 
 
 class IRFunction(IRObject):
+    __slots__ = ('name', 'cname', 'return_type', 'throws', 'is_static', 'params')
+
     def __init__(self, name: str, cname: str, return_type: IRReturnType, params: List[Union[IRParam, IRBufferWrapper]]):
-        super().__init__()
         self.name = name
         self.cname = cname
         self.return_type = return_type
@@ -61,53 +108,119 @@ class IRFunction(IRObject):
 
 
 class IRProperty(IRObject):
+    __slots__ = ('name', 'is_static', 'getter', 'setter')
+
     def __init__(self, name: str):
-        super().__init__()
         self.name = name
         self.is_static = False
         self.getter: Optional[IRFunction] = None
         self.setter: Optional[IRFunction] = None
 
 
+class IRBatchField(IRObject):
+    __slots__ = ('name', 'type', 'getter')
+
+    def __init__(self, name: str, field_type: IRType, getter: IRFunction):
+        self.name = name
+        self.type = field_type
+        self.getter = getter
+
+
+# The objects of a class that are read by index from a collection (e.g. the events of one tox_events_iterate()) as a
+# struct of arrays: the number of objects, the object at an index and one array per field
+class IRBatchLayout(IRObject):
+    __slots__ = ('count_func', 'item_func', 'fields')
+
+    def __init__(self, count_func: IRFunction, item_func: IRFunction, fields: List[IRBatchField]):
+        self.count_func = count_func
+        self.item_func = item_func
+        self.fields = fields
+
+
 class IREnumValue(IRObject):
+    __slots__ = ('name', 'cname', 'ordinal')
+
     def __init__(self, name: str, cname: str, ordinal: int):
-        super().__init__()
         self.name = name
         self.cname = cname
         self.ordinal = ordinal
 
 
 class IREnum(IRObject):
+    __slots__ = ('name', 'cname', 'values')
+
     def __init__(self, name: str, cname: str, values: List[IREnumValue]):
-        super().__init__()
         self.name = name
         self.cname = cname
         self.values = values
 
 
 class IRException(IRObject):
+    __slots__ = ('name', 'enum_name')
+
     def __init__(self, name: str, enum_name: str):
-        super().__init__()
         self.name = name
         self.enum_name = enum_name
 
 
+class IRStructField(IRObject):
+    __slots__ = ('name', 'type', 'property_name')
+
+    def __init__(self, name: str, field_type: IRType, property_name: Optional[str]):
+        self.name = name
+        self.type = field_type
+        # The property whose accessors read and write the field, None when the field has no accessors
+        self.property_name = property_name
+
+
+# The fields of the struct behind a native handle in the order of its declaration. A public struct is declared with
+# its fields in the headers, so a binding can fill it directly instead of calling the setter of every property.
+class IRStructLayout(IRObject):
+    __slots__ = ('cname', 'is_public', 'fields')
+
+    def __init__(self, cname: str, is_public: bool, fields: List[IRStructField]):
+        self.cname = cname
+        self.is_public = is_public
+        self.fields = fields
+
+
 class IRNativeHandle(IRObject):
+    __slots__ = ('alloc_func', 'dealloc_func', 'struct_layout')
+
     def __init__(self):
-        super().__init__()
         self.alloc_func: Optional[IRFunction] = None
         self.dealloc_func: Optional[IRFunction] = None
+        self.struct_layout: Optional[IRStructLayout] = None
 
 
+# A number that identifies an object within the objects of its owner chain (e.g. a file of a friend of a Tox instance)
+# and the functions that make the number valid or not, so bindings can keep one object per number
 class IRNumberHandle(IRObject):
+    __slots__ = ('type', 'owner_chain', 'key_width', 'create_funcs', 'enumerate_funcs', 'count_funcs',
+                 'invalidate_funcs', 'invalidate_callbacks')
+
     def __init__(self, ir_type: IRType):
-        super().__init__()
         self.type = ir_type
+        # The names of the outer classes, outermost first
+        self.owner_chain: List[str] = []
+        # The width of the number in bits
+        self.key_width: Optional[int] = None
+        # Functions that return one number, an array of them or the count of numbers from 0, and those after which
+        # the number no longer identifies the object
+        self.create_funcs: List[IRFunction] = []
+        self.enumerate_funcs: List[IRFunction] = []
+        self.count_funcs: List[IRFunction] = []
+        self.invalidate_funcs: List[IRFunction] = []
+        # The functions of the callbacks after which the library may reuse the numbers: the number the callback gets,
+        # or every number of the parent it gets when it has none (the peers of a conference whose peer list changed)
+        self.invalidate_callbacks: List[IRFunction] = []
 
 
 class IRClass(IRObject):
+    __slots__ = ('name', 'is_callback', 'handle', 'default_init', 'properties', 'functions', 'inner_classes',
+                 'batch_layout')
+
     def __init__(self, name: str):
-        super().__init__()
         self.name = name
         self.is_callback = False
         self.handle: Union[IRNativeHandle, IRNumberHandle, None] = None
@@ -115,3 +228,4 @@ class IRClass(IRObject):
         self.properties: List[IRProperty] = []
         self.functions: List[IRFunction] = []
         self.inner_classes: List[IRClass] = []
+        self.batch_layout: Optional[IRBatchLayout] = None
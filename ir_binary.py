@@ -0,0 +1,293 @@
+from typing import Any, BinaryIO, Dict, List, Optional, Tuple
+from ir import *
+from ir_serializer import IR_SCHEMA
+import mmap
+import struct
+
+BINARY_IR_MAGIC = b'TOXIRBIN'
+BINARY_IR_FORMAT_VERSION = 1
+
+# magic, format version, node record size, then the offsets of the string table, the type table, the node records,
+# the lists, the root and the index, and the number of node records
+HEADER_STRUCT = struct.Struct('<8sHH6II')
+U32_STRUCT = struct.Struct('<I')
+# Every value is a tag and a 32 bit payload: the value itself for ints, otherwise an index or an offset
+VALUE_STRUCT = struct.Struct('<Bi')
+INDEX_ENTRY_STRUCT = struct.Struct('<BII')
+
+TAG_NULL = 0
+TAG_FALSE = 1
+TAG_TRUE = 2
+TAG_INT = 3
+TAG_STRING = 4
+TAG_NODE = 5
+TAG_LIST = 6
+
+INDEX_KIND_CLASS = 0
+INDEX_KIND_ENUM = 1
+
+IR_TYPES_BY_NAME: Dict[str, type] = {ir_type.__name__: ir_type for ir_type in IR_SCHEMA}
+
+
+def get_class_paths(ir_classes: List[IRClass], prefix: str = '') -> List[Tuple[str, IRClass]]:
+    # Inner classes are identified by the names of their outer classes and their own name, e.g. 'Tox.Friend'
+    class_paths: List[Tuple[str, IRClass]] = []
+    for ir_class in ir_classes:
+        class_path = prefix + ir_class.name
+        class_paths.append((class_path, ir_class))
+        class_paths.extend(get_class_paths(ir_class.inner_classes, class_path + '.'))
+    return class_paths
+
+
+# Writes the IR in the binary format:
+#  - A string table that holds every string once.
+#  - A type table with the name and the fields of every IR object type, in the order of the values in the records.
+#  - A fixed size record for every IR object: its type followed by its field values. An object that is referenced
+#    from many places is written once, so the reader restores the sharing.
+#  - The lists, each a count followed by the values.
+#  - The root: the metadata and the enums, exceptions and classes lists.
+#  - An index of the record of every class (by its path) and enum (by its name).
+class BinaryIRWriter:
+    def __init__(self):
+        self._strings: Dict[str, int] = {}
+        self._type_codes: Dict[type, int] = {ir_type: code for code, ir_type in enumerate(IR_SCHEMA)}
+        self._fields_count = max(len(fields) for fields in IR_SCHEMA.values())
+        self._record_struct = struct.Struct('<B' + 'Bi' * self._fields_count)
+        self._records: List[Optional[bytes]] = []
+        self._node_indexes: Dict[int, int] = {}
+        self._lists = bytearray()
+
+    def _string(self, value: str) -> int:
+        string_index = self._strings.get(value)
+        if string_index is None:
+            string_index = len(self._strings)
+            self._strings[value] = string_index
+        return string_index
+
+    def _node(self, obj: IRObject) -> int:
+        node_index = self._node_indexes.get(id(obj))
+        if node_index is not None:
+            return node_index
+
+        node_index = len(self._records)
+        self._node_indexes[id(obj)] = node_index
+        self._records.append(None)
+        values: List[int] = []
+        for field in IR_SCHEMA[type(obj)]:
+            values.extend(self._value(getattr(obj, field)))
+        values.extend([TAG_NULL, 0] * (self._fields_count - len(IR_SCHEMA[type(obj)])))
+        self._records[node_index] = self._record_struct.pack(self._type_codes[type(obj)], *values)
+        return node_index
+
+    def _list(self, values: list) -> int:
+        encoded_values = [self._value(value) for value in values]
+        offset = len(self._lists)
+        self._lists += U32_STRUCT.pack(len(encoded_values))
+        for tag, payload in encoded_values:
+            self._lists += VALUE_STRUCT.pack(tag, payload)
+        return offset
+
+    def _value(self, value: Any) -> Tuple[int, int]:
+        if value is None:
+            return TAG_NULL, 0
+        elif value is True:
+            return TAG_TRUE, 0
+        elif value is False:
+            return TAG_FALSE, 0
+        elif isinstance(value, str):
+            return TAG_STRING, self._string(value)
+        elif isinstance(value, int):
+            if not -2 ** 31 <= value < 2 ** 31:
+                raise RuntimeError(f'The int {value} doesn\'t fit in the binary IR format')
+            return TAG_INT, value
+        elif isinstance(value, list):
+            return TAG_LIST, self._list(value)
+        elif isinstance(value, IRObject):
+            return TAG_NODE, self._node(value)
+        else:
+            raise RuntimeError(f'Can\'t serialize a value of type {type(value).__name__}')
+
+    def write(self, stream: BinaryIO, metadata: Dict[str, str], enums: List[IREnum], exceptions: List[IRException],
+              classes: List[IRClass]):
+        root = bytearray(U32_STRUCT.pack(len(metadata)))
+        for key, value in metadata.items():
+            root += U32_STRUCT.pack(self._string(key)) + VALUE_STRUCT.pack(*self._value(value))
+        for section in (enums, exceptions, classes):
+            root += VALUE_STRUCT.pack(*self._value(section))
+
+        index_entries = [(INDEX_KIND_CLASS, self._string(class_path), self._node(ir_class))
+                         for class_path, ir_class in get_class_paths(classes)]
+        index_entries.extend((INDEX_KIND_ENUM, self._string(ir_enum.name), self._node(ir_enum)) for ir_enum in enums)
+        index = bytearray(U32_STRUCT.pack(len(index_entries)))
+        for entry in index_entries:
+            index += INDEX_ENTRY_STRUCT.pack(*entry)
+
+        types = bytearray(U32_STRUCT.pack(len(IR_SCHEMA)))
+        for ir_type, fields in IR_SCHEMA.items():
+            types += U32_STRUCT.pack(self._string(ir_type.__name__)) + U32_STRUCT.pack(len(fields))
+            for field in fields:
+                types += U32_STRUCT.pack(self._string(field))
+
+        encoded_strings = [string.encode('utf-8') for string in self._strings]
+        strings = bytearray(U32_STRUCT.pack(len(encoded_strings)))
+        string_offset = 0
+        for encoded_string in encoded_strings:
+            strings += U32_STRUCT.pack(string_offset)
+            string_offset += len(encoded_string)
+        strings += U32_STRUCT.pack(string_offset)
+        strings += b''.join(encoded_strings)
+
+        sections = [strings, types, b''.join(self._records), self._lists, root, index]
+        offsets: List[int] = []
+        offset = HEADER_STRUCT.size
+        for section in sections:
+            offsets.append(offset)
+            offset += len(section)
+        stream.write(HEADER_STRUCT.pack(BINARY_IR_MAGIC, BINARY_IR_FORMAT_VERSION, self._record_struct.size,
+                                        *offsets, len(self._records)))
+        for section in sections:
+            stream.write(section)
+
+
+def write_ir_binary(stream: BinaryIO, metadata: Dict[str, str], enums: List[IREnum], exceptions: List[IRException],
+                    classes: List[IRClass]):
+    BinaryIRWriter().write(stream, metadata, enums, exceptions, classes)
+
+
+# Reads a binary IR file through a memory map. Only the header, the type table and the index are read when the file is
+# opened. IR objects are created when they are first reached and then reused, so an object that is shared in the file
+# is the same object wherever it's reached.
+class BinaryIRReader:
+    def __init__(self, path: str):
+        self._file = open(path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, version, self._record_size, self._strings_offset, types_offset, self._nodes_offset,
+         self._lists_offset, self._root_offset, index_offset, self._nodes_count) = HEADER_STRUCT.unpack_from(self._map)
+        if magic != BINARY_IR_MAGIC:
+            raise RuntimeError(f'{path} is not a binary IR file')
+        if version != BINARY_IR_FORMAT_VERSION:
+            raise RuntimeError(f'{path} has version {version} of the binary IR format, expected '
+                               f'{BINARY_IR_FORMAT_VERSION}')
+
+        self._record_struct = struct.Struct('<B' + 'Bi' * ((self._record_size - 1) // VALUE_STRUCT.size))
+        self._strings_count = self._u32(self._strings_offset)
+        self._strings_data_offset = self._strings_offset + 4 * (self._strings_count + 2)
+        self._strings: Dict[int, str] = {}
+        self._nodes: Dict[int, IRObject] = {}
+
+        self._types: List[Tuple[type, Tuple[str, ...]]] = []
+        offset = types_offset + 4
+        for _ in range(self._u32(types_offset)):
+            type_name = self._string(self._u32(offset))
+            fields_count = self._u32(offset + 4)
+            fields = tuple(self._string(self._u32(offset + 8 + 4 * i)) for i in range(fields_count))
+            offset += 8 + 4 * fields_count
+            ir_type = IR_TYPES_BY_NAME.get(type_name)
+            if ir_type is None or IR_SCHEMA[ir_type] != fields:
+                raise RuntimeError(f'The {type_name} objects in {path} don\'t match the IR objects of this version')
+            self._types.append((ir_type, fields))
+
+        self._class_nodes: Dict[str, int] = {}
+        self._enum_nodes: Dict[str, int] = {}
+        for i in range(self._u32(index_offset)):
+            kind, name_index, node_index = INDEX_ENTRY_STRUCT.unpack_from(self._map,
+                                                                          index_offset + 4 + i * INDEX_ENTRY_STRUCT.size)
+            nodes = self._class_nodes if kind == INDEX_KIND_CLASS else self._enum_nodes
+            nodes[self._string(name_index)] = node_index
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+    def __enter__(self) -> 'BinaryIRReader':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _u32(self, offset: int) -> int:
+        return U32_STRUCT.unpack_from(self._map, offset)[0]
+
+    def _string(self, string_index: int) -> str:
+        string = self._strings.get(string_index)
+        if string is None:
+            start, end = struct.unpack_from('<II', self._map, self._strings_offset + 4 + 4 * string_index)
+            string = self._map[self._strings_data_offset + start:self._strings_data_offset + end].decode('utf-8')
+            self._strings[string_index] = string
+        return string
+
+    def _value(self, tag: int, payload: int) -> Any:
+        if tag == TAG_NULL:
+            return None
+        elif tag == TAG_FALSE:
+            return False
+        elif tag == TAG_TRUE:
+            return True
+        elif tag == TAG_INT:
+            return payload
+        elif tag == TAG_STRING:
+            return self._string(payload)
+        elif tag == TAG_NODE:
+            return self._node(payload)
+        elif tag == TAG_LIST:
+            return self._list(payload)
+        raise RuntimeError(f'Unknown value tag {tag}')
+
+    def _list(self, list_offset: int) -> list:
+        offset = self._lists_offset + list_offset + 4
+        end = offset + self._u32(offset - 4) * VALUE_STRUCT.size
+        return [self._value(tag, payload) for tag, payload in VALUE_STRUCT.iter_unpack(self._map[offset:end])]
+
+    def _node(self, node_index: int) -> IRObject:
+        obj = self._nodes.get(node_index)
+        if obj is not None:
+            return obj
+
+        record = self._record_struct.unpack_from(self._map, self._nodes_offset + node_index * self._record_size)
+        ir_type, fields = self._types[record[0]]
+        obj = ir_type.__new__(ir_type)
+        self._nodes[node_index] = obj
+        for i, field in enumerate(fields):
+            setattr(obj, field, self._value(record[1 + 2 * i], record[2 + 2 * i]))
+        return obj
+
+    def _root_value(self, section_index: int) -> Any:
+        metadata_count = self._u32(self._root_offset)
+        offset = self._root_offset + 4 + metadata_count * (4 + VALUE_STRUCT.size) + section_index * VALUE_STRUCT.size
+        return self._value(*VALUE_STRUCT.unpack_from(self._map, offset))
+
+    @property
+    def metadata(self) -> Dict[str, Any]:
+        metadata: Dict[str, Any] = {}
+        offset = self._root_offset + 4
+        for _ in range(self._u32(self._root_offset)):
+            key = self._string(self._u32(offset))
+            metadata[key] = self._value(*VALUE_STRUCT.unpack_from(self._map, offset + 4))
+            offset += 4 + VALUE_STRUCT.size
+        return metadata
+
+    @property
+    def enums(self) -> List[IREnum]:
+        return self._root_value(0)
+
+    @property
+    def exceptions(self) -> List[IRException]:
+        return self._root_value(1)
+
+    @property
+    def classes(self) -> List[IRClass]:
+        return self._root_value(2)
+
+    def class_paths(self) -> List[str]:
+        return list(self._class_nodes)
+
+    def enum_names(self) -> List[str]:
+        return list(self._enum_nodes)
+
+    def get_class(self, class_path: str) -> Optional[IRClass]:
+        node_index = self._class_nodes.get(class_path)
+        return self._node(node_index) if node_index is not None else None
+
+    def get_enum(self, enum_name: str) -> Optional[IREnum]:
+        node_index = self._enum_nodes.get(enum_name)
+        return self._node(node_index) if node_index is not None else None
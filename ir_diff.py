@@ -0,0 +1,252 @@
+from typing import Any, Callable, Dict, List, Optional, Set
+from ir import *
+from ir_binary import get_class_paths
+from ir_index import build_ir_index
+from ir_loader import LoadedIR, ir_from_json, load_ir
+from ir_serializer import IR_SCHEMA, open_ir_output, write_ir_json
+import argparse
+import json
+
+IR_DELTA_VERSION = 1
+
+CLASS_PATCH_OBJECT_NAME = 'IRClassPatch'
+
+# The fields of a class that a patch replaces as a whole when they change
+CLASS_PATCH_FIELDS = ('is_callback', 'handle', 'default_init', 'batch_layout')
+# The lists of a class that a patch rebuilds entry by entry and the field that is the key of their entries
+CLASS_PATCH_LISTS = {'properties': 'name', 'functions': 'cname', 'inner_classes': 'name'}
+
+SUMMARY_KINDS = ('classes', 'functions', 'properties', 'enums', 'exceptions')
+
+
+# A delta lists the enums, exceptions and classes of the new IR in order. An entry that is the same in the old IR is
+# only its key (the C name of enums and functions, the name of exceptions, properties and classes), a new or changed
+# entry is written in full, and a changed class is a patch of its fields and lists with entries of the same kind.
+# The summary lists the keys (class paths for classes and properties) that were added, removed or changed.
+
+
+def ir_to_json(value: Any, converted: Optional[Dict[int, Any]] = None) -> Any:
+    # The JSON value of IR objects, the same as the output without --deduplicate
+    if converted is None:
+        converted = {}
+    if isinstance(value, list):
+        return [ir_to_json(item, converted) for item in value]
+    if not isinstance(value, IRObject):
+        return value
+    json_value = converted.get(id(value))
+    if json_value is None:
+        json_value = {'object_name': value.object_name}
+        for field in IR_SCHEMA[type(value)]:
+            json_value[field] = ir_to_json(getattr(value, field), converted)
+        converted[id(value)] = json_value
+    return json_value
+
+
+def _entry_keys(items: List[IRObject], key_field: str) -> List[str]:
+    # Keys are unique in a list, a repeated one gets the number of its occurrence
+    keys: List[str] = []
+    counts: Dict[str, int] = {}
+    for item in items:
+        key = getattr(item, key_field)
+        counts[key] = counts.get(key, 0) + 1
+        keys.append(key if counts[key] == 1 else f'{key}#{counts[key]}')
+    return keys
+
+
+class _IRDiffer:
+    def __init__(self):
+        self._converted: Dict[int, Any] = {}
+        self.summary: Dict[str, Dict[str, List[str]]] = {
+            kind: {'added': [], 'removed': [], 'changed': []} for kind in SUMMARY_KINDS
+        }
+
+    def json_of(self, value: Any) -> Any:
+        return ir_to_json(value, self._converted)
+
+    def diff_list(self, old_items: List[Any], new_items: List[Any], key_field: str,
+                  patch: Optional[Callable[[Any, Any, str], Optional[dict]]] = None,
+                  summary_kind: Optional[str] = None, prefix: str = '') -> Optional[List[Any]]:
+        # The entries of the new list, or None when the lists are the same
+        old_by_key = dict(zip(_entry_keys(old_items, key_field), old_items))
+        new_keys = _entry_keys(new_items, key_field)
+        entries: List[Any] = []
+        changed = list(old_by_key) != new_keys
+        for key, new_item in zip(new_keys, new_items):
+            old_item = old_by_key.get(key)
+            if old_item is None:
+                entries.append(self.json_of(new_item))
+                changed = True
+                if summary_kind:
+                    self.summary[summary_kind]['added'].append(prefix + key)
+            elif old_item is new_item or self.json_of(old_item) == self.json_of(new_item):
+                entries.append(key)
+            else:
+                entries.append(patch(old_item, new_item, prefix + key) if patch else self.json_of(new_item))
+                changed = True
+                if summary_kind:
+                    self.summary[summary_kind]['changed'].append(prefix + key)
+        if summary_kind:
+            new_key_set = set(new_keys)
+            self.summary[summary_kind]['removed'].extend(prefix + key for key in old_by_key if key not in new_key_set)
+        return entries if changed else None
+
+    def diff_class(self, old_class: IRClass, new_class: IRClass, class_path: str) -> dict:
+        class_patch: Dict[str, Any] = {'object_name': CLASS_PATCH_OBJECT_NAME, 'name': new_class.name}
+        for field in CLASS_PATCH_FIELDS:
+            new_value = self.json_of(getattr(new_class, field))
+            if self.json_of(getattr(old_class, field)) != new_value:
+                class_patch[field] = new_value
+        prefix = class_path + '.'
+        for field, key_field in CLASS_PATCH_LISTS.items():
+            # Changed functions and classes are summarized by diff_functions() and diff_classes()
+            entries = self.diff_list(getattr(old_class, field), getattr(new_class, field), key_field,
+                                     self.diff_class if field == 'inner_classes' else None,
+                                     'properties' if field == 'properties' else None, prefix)
+            if entries is not None:
+                class_patch[field] = entries
+        return class_patch
+
+    def diff_functions(self, old_ir: LoadedIR, new_ir: LoadedIR):
+        # Functions are compared by C name wherever they are in the classes
+        summary = self.summary['functions']
+        for cname, new_function in new_ir.functions_by_cname.items():
+            old_function = old_ir.functions_by_cname.get(cname)
+            if old_function is None:
+                summary['added'].append(cname)
+            elif self.json_of(old_function) != self.json_of(new_function):
+                summary['changed'].append(cname)
+        summary['removed'].extend(cname for cname in old_ir.functions_by_cname
+                                  if cname not in new_ir.functions_by_cname)
+
+    def diff_classes(self, old_ir: LoadedIR, new_ir: LoadedIR):
+        # Every changed class path is listed, also the outer classes of a changed inner class
+        summary = self.summary['classes']
+        old_paths = dict(get_class_paths(old_ir.classes))
+        new_paths = dict(get_class_paths(new_ir.classes))
+        for class_path, new_class in new_paths.items():
+            old_class = old_paths.get(class_path)
+            if old_class is None:
+                summary['added'].append(class_path)
+            elif self.json_of(old_class) != self.json_of(new_class):
+                summary['changed'].append(class_path)
+        summary['removed'].extend(class_path for class_path in old_paths if class_path not in new_paths)
+
+
+def diff_ir(old_ir: LoadedIR, new_ir: LoadedIR) -> Dict[str, Any]:
+    differ = _IRDiffer()
+    enums = differ.diff_list(old_ir.enums, new_ir.enums, 'cname', summary_kind='enums')
+    exceptions = differ.diff_list(old_ir.exceptions, new_ir.exceptions, 'name', summary_kind='exceptions')
+    classes = differ.diff_list(old_ir.classes, new_ir.classes, 'name', differ.diff_class)
+    differ.diff_functions(old_ir, new_ir)
+    differ.diff_classes(old_ir, new_ir)
+    return {
+        'ir_delta_version': IR_DELTA_VERSION,
+        'from': old_ir.metadata,
+        'to': new_ir.metadata,
+        'summary': differ.summary,
+        # A list that is the same in both IRs is omitted
+        'enums': enums,
+        'exceptions': exceptions,
+        'classes': classes,
+    }
+
+
+def is_delta_empty(delta: Dict[str, Any]) -> bool:
+    return all(not changes for kind in SUMMARY_KINDS for changes in delta['summary'][kind].values())
+
+
+class _IRPatcher:
+    def __init__(self, old_ir: LoadedIR, delta: Dict[str, Any]):
+        summary = delta['summary']['functions']
+        replaced: Set[str] = set(summary['added']) | set(summary['changed'])
+        # Functions that didn't change stay the objects of the old IR, so they are shared with the unchanged classes
+        self._functions: Dict[str, IRFunction] = {
+            cname: func for cname, func in old_ir.functions_by_cname.items() if cname not in replaced
+        }
+        self._objects: Dict[int, IRObject] = {}
+
+    def patch_list(self, old_items: List[Any], entries: Optional[List[Any]], key_field: str) -> List[Any]:
+        if entries is None:
+            return list(old_items)
+        old_by_key = dict(zip(_entry_keys(old_items, key_field), old_items))
+        items: List[Any] = []
+        for entry in entries:
+            if isinstance(entry, str):
+                old_item = old_by_key.get(entry)
+                if old_item is None:
+                    raise RuntimeError(f'The delta refers to "{entry}", which isn\'t in the old IR')
+                items.append(old_item)
+            elif entry.get('object_name') == CLASS_PATCH_OBJECT_NAME:
+                old_class = old_by_key.get(entry['name'])
+                if old_class is None:
+                    raise RuntimeError(f'The delta patches the class "{entry["name"]}", which isn\'t in the old IR')
+                items.append(self.patch_class(old_class, entry))
+            else:
+                items.append(ir_from_json(entry, self._objects, self._functions))
+        return items
+
+    def patch_class(self, old_class: IRClass, class_patch: Dict[str, Any]) -> IRClass:
+        # The old class is left as it is
+        ir_class = IRClass(old_class.name)
+        for field in CLASS_PATCH_FIELDS:
+            if field in class_patch:
+                setattr(ir_class, field, ir_from_json(class_patch[field], self._objects, self._functions))
+            else:
+                setattr(ir_class, field, getattr(old_class, field))
+        for field, key_field in CLASS_PATCH_LISTS.items():
+            setattr(ir_class, field, self.patch_list(getattr(old_class, field), class_patch.get(field), key_field))
+        return ir_class
+
+
+def apply_ir_delta(old_ir: LoadedIR, delta: Dict[str, Any]) -> LoadedIR:
+    # Builds the new IR from the old one and a delta of diff_ir(). Objects that didn't change are shared with old_ir.
+    if delta.get('ir_delta_version') != IR_DELTA_VERSION:
+        raise RuntimeError(f'Unsupported IR delta version {delta.get("ir_delta_version")}')
+    if old_ir.metadata != delta['from']:
+        raise RuntimeError(f'The delta is from the IR {delta["from"]}, not {old_ir.metadata}')
+    patcher = _IRPatcher(old_ir, delta)
+    enums: List[IREnum] = patcher.patch_list(old_ir.enums, delta['enums'], 'cname')
+    exceptions: List[IRException] = patcher.patch_list(old_ir.exceptions, delta['exceptions'], 'name')
+    classes: List[IRClass] = patcher.patch_list(old_ir.classes, delta['classes'], 'name')
+    return LoadedIR(dict(delta['to']), enums, exceptions, classes, build_ir_index(enums, classes))
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(
+        description='Compare two generated IRs and write the delta between them, or apply a delta to the older IR to '
+                    'get the newer one.')
+    subparsers = arg_parser.add_subparsers(dest='command', required=True)
+    diff_parser = subparsers.add_parser('diff', help='write the delta from an old IR to a new IR')
+    diff_parser.add_argument('old', help='the old IR (JSON, optionally gzip compressed)')
+    diff_parser.add_argument('new', help='the new IR (JSON, optionally gzip compressed)')
+    diff_parser.add_argument('-o', '--output', help='file to write the delta to (default: print only the summary)')
+    apply_parser = subparsers.add_parser('apply', help='write the new IR from the old IR and a delta')
+    apply_parser.add_argument('old', help='the old IR (JSON, optionally gzip compressed)')
+    apply_parser.add_argument('delta', help='the delta written by the diff command')
+    apply_parser.add_argument('-o', '--output', required=True,
+                              help='file to write the new IR to (gzip compressed if it ends with .gz)')
+    apply_parser.add_argument('--deduplicate', action='store_true',
+                              help='write shared objects once, like the --deduplicate option of main.py')
+    apply_parser.add_argument('--string-table', action='store_true',
+                              help='write names once, like the --string-table option of main.py')
+    args = arg_parser.parse_args()
+
+    if args.command == 'diff':
+        delta = diff_ir(load_ir(args.old), load_ir(args.new))
+        if args.output:
+            with open(args.output, 'w', encoding='ascii') as f:
+                json.dump(delta, f)
+        for kind in SUMMARY_KINDS:
+            counts = ', '.join(f'{len(keys)} {change}' for change, keys in delta['summary'][kind].items())
+            print(f'{kind}: {counts}')
+    else:
+        with open(args.delta, encoding='ascii') as f:
+            delta = json.load(f)
+        new_ir = apply_ir_delta(load_ir(args.old), delta)
+        with open_ir_output(args.output, compress=args.output.endswith('.gz')) as f:
+            write_ir_json(f, new_ir.metadata, new_ir.enums, new_ir.exceptions, new_ir.classes,
+                          deduplicate=args.deduplicate, index=new_ir.index, string_table=args.string_table)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,41 @@
+from typing import Any, Dict, List, Optional, Tuple
+from ir import *
+
+
+def _class_functions(ir_class: IRClass) -> List[Tuple[IRFunction, Optional[IRProperty]]]:
+    functions: List[Tuple[IRFunction, Optional[IRProperty]]] = []
+    if isinstance(ir_class.handle, IRNativeHandle):
+        functions.extend((func, None) for func in (ir_class.handle.alloc_func, ir_class.handle.dealloc_func) if func)
+    if ir_class.default_init:
+        functions.append((ir_class.default_init, None))
+    for ir_property in ir_class.properties:
+        functions.extend((accessor, ir_property) for accessor in (ir_property.getter, ir_property.setter) if accessor)
+    functions.extend((func, None) for func in ir_class.functions)
+    return functions
+
+
+def _add_classes_to_index(ir_classes: List[IRClass], prefix: str, functions_index: Dict[str, dict]):
+    for ir_class in ir_classes:
+        class_path = prefix + ir_class.name
+        for func, ir_property in _class_functions(ir_class):
+            # Size functions are also referenced from types in other classes, the class that has them comes first
+            functions_index.setdefault(func.cname, {
+                'class': class_path,
+                'property': ir_property.name if ir_property else None,
+                'name': func.name,
+            })
+        _add_classes_to_index(ir_class.inner_classes, class_path + '.', functions_index)
+
+
+# Builds the 'index' section of the output: where every C function and every C enum value ended up in the IR
+def build_ir_index(enums: List[IREnum], classes: List[IRClass]) -> Dict[str, Dict[str, Any]]:
+    functions_index: Dict[str, dict] = {}
+    _add_classes_to_index(classes, '', functions_index)
+    enum_values_index: Dict[str, dict] = {}
+    for ir_enum in enums:
+        for enum_value in ir_enum.values:
+            enum_values_index.setdefault(enum_value.cname, {'enum': ir_enum.name, 'name': enum_value.name})
+    return {
+        'functions': functions_index,
+        'enum_values': enum_values_index,
+    }
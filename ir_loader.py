@@ -0,0 +1,138 @@
+from typing import Any, Dict, List, Optional, Tuple
+from ir import *
+from ir_binary import IR_TYPES_BY_NAME, get_class_paths
+from ir_index import build_ir_index
+from ir_refs import resolve_references
+from ir_serializer import IR_SCHEMA
+from ir_strings import resolve_string_table
+import gzip
+import json
+
+
+# The IR loaded as ir.py objects together with lookup indexes. The owners of C symbols come from the 'index' section the
+# generator wrote, the other indexes are built once when loading.
+class LoadedIR:
+    def __init__(self, metadata: Dict[str, Any], enums: List[IREnum], exceptions: List[IRException],
+                 classes: List[IRClass], index: Dict[str, Dict[str, Any]]):
+        self.metadata = metadata
+        self.enums = enums
+        self.exceptions = exceptions
+        self.classes = classes
+        self.index = index
+
+        self.classes_by_path: Dict[str, IRClass] = dict(get_class_paths(classes))
+        self.enums_by_name: Dict[str, IREnum] = {ir_enum.name: ir_enum for ir_enum in enums}
+        self.enum_values_by_ordinal: Dict[str, Dict[int, IREnumValue]] = {
+            ir_enum.name: {enum_value.ordinal: enum_value for enum_value in reversed(ir_enum.values)}
+            for ir_enum in enums
+        }
+        self.exceptions_by_enum_name: Dict[str, IRException] = {}
+        for ir_exception in reversed(exceptions):
+            self.exceptions_by_enum_name[ir_exception.enum_name] = ir_exception
+        self.functions_by_cname: Dict[str, IRFunction] = {}
+        for cname, entry in index['functions'].items():
+            func = self._find_function(cname, entry)
+            if func:
+                self.functions_by_cname[cname] = func
+
+    def _find_function(self, cname: str, entry: Dict[str, Any]) -> Optional[IRFunction]:
+        ir_class = self.classes_by_path[entry['class']]
+        candidates: List[Optional[IRFunction]] = list(ir_class.functions)
+        candidates.append(ir_class.default_init)
+        if isinstance(ir_class.handle, IRNativeHandle):
+            candidates.extend([ir_class.handle.alloc_func, ir_class.handle.dealloc_func])
+        for ir_property in ir_class.properties:
+            candidates.extend([ir_property.getter, ir_property.setter])
+        return next((func for func in candidates if func and func.cname == cname), None)
+
+    def get_class(self, class_path: str) -> Optional[IRClass]:
+        return self.classes_by_path.get(class_path)
+
+    def get_function(self, cname: str) -> Optional[IRFunction]:
+        return self.functions_by_cname.get(cname)
+
+    def owner_of(self, cname: str) -> Tuple[Optional[IRClass], Optional[IRProperty]]:
+        # The class (or inner class) and the property (if it's an accessor) that a C function is in
+        entry = self.index['functions'].get(cname)
+        if not entry:
+            return None, None
+        ir_class = self.classes_by_path[entry['class']]
+        if entry['property'] is None:
+            return ir_class, None
+        func = self.functions_by_cname.get(cname)
+        ir_property = next((ir_property for ir_property in ir_class.properties if ir_property.name == entry['property']
+                            and func in (ir_property.getter, ir_property.setter)), None)
+        return ir_class, ir_property
+
+    def get_enum_value(self, enum_name: str, ordinal: int) -> Optional[IREnumValue]:
+        return self.enum_values_by_ordinal.get(enum_name, {}).get(ordinal)
+
+    def get_enum_value_by_cname(self, cname: str) -> Optional[IREnumValue]:
+        entry = self.index['enum_values'].get(cname)
+        if not entry:
+            return None
+        ir_enum = self.enums_by_name[entry['enum']]
+        return next((enum_value for enum_value in ir_enum.values if enum_value.cname == cname), None)
+
+    def get_exception_by_enum_name(self, enum_name: str) -> Optional[IRException]:
+        return self.exceptions_by_enum_name.get(enum_name)
+
+
+# Converts JSON values of the IR to ir.py objects. A dict that is met again becomes the same object, and a function whose
+# C name is in functions becomes that function.
+def ir_from_json(value: Any, objects: Dict[int, IRObject], functions: Dict[str, IRFunction]) -> Any:
+    if isinstance(value, list):
+        return [ir_from_json(item, objects, functions) for item in value]
+    if not isinstance(value, dict):
+        return value
+
+    obj = objects.get(id(value))
+    if obj is not None:
+        return obj
+    ir_type = IR_TYPES_BY_NAME.get(value.get('object_name'))
+    if ir_type is None:
+        raise RuntimeError(f'Unknown IR object "{value.get("object_name")}"')
+    if ir_type is IRFunction and value['cname'] in functions:
+        # Every C function is a single object in the generator, also where the output repeats it in full
+        obj = functions[value['cname']]
+        objects[id(value)] = obj
+        return obj
+
+    obj = ir_type.__new__(ir_type)
+    objects[id(value)] = obj
+    if ir_type is IRFunction:
+        functions[value['cname']] = obj
+    for field in IR_SCHEMA[ir_type]:
+        # Fields added after the IR was written (e.g. constant_size) are null
+        setattr(obj, field, ir_from_json(value.get(field), objects, functions))
+    return obj
+
+
+def ir_from_document(document: dict) -> LoadedIR:
+    # Loads a JSON IR document as json.load() returned it. The document is changed in place.
+    resolve_string_table(document)
+    resolve_references(document)
+
+    objects: Dict[int, IRObject] = {}
+    functions: Dict[str, IRFunction] = {}
+    enums: List[IREnum] = ir_from_json(document['enums'], objects, functions)
+    exceptions: List[IRException] = ir_from_json(document['exceptions'], objects, functions)
+    classes: List[IRClass] = ir_from_json(document['classes'], objects, functions)
+    metadata = {key: value for key, value in document.items()
+                if key not in ('shared', 'enums', 'exceptions', 'classes', 'index')}
+    # An IR written before the index existed gets the same index built on loading
+    index = document.get('index') or build_ir_index(enums, classes)
+    return LoadedIR(metadata, enums, exceptions, classes, index)
+
+
+def load_ir(path: str) -> LoadedIR:
+    # Loads a JSON IR (gzip compressed if the path ends with '.gz'). Objects that are shared in an IR generated with
+    # --deduplicate are shared after loading too, and functions are shared in any case. The names of an IR generated
+    # with --string-table are loaded as strings.
+    if path.endswith('.gz'):
+        with gzip.open(path, 'rt', encoding='ascii') as f:
+            document = json.load(f)
+    else:
+        with open(path, encoding='ascii') as f:
+            document = json.load(f)
+    return ir_from_document(document)
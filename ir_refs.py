@@ -0,0 +1,96 @@
+from typing import Any, Dict, List
+from ir import IRObject, IRFunction
+import hashlib
+import json
+
+REFERENCE_OBJECT_NAME = 'IRReference'
+
+# The number of hex digits of the content hash in the ids of shared objects that aren't functions
+CONTENT_ID_LENGTH = 8
+
+
+def _content_key(obj: Any, keys: Dict[int, Any]) -> Any:
+    # What the object holds, with the functions it refers to as their C names, so the key of an object only changes
+    # when the object does
+    if isinstance(obj, list):
+        return [_content_key(item, keys) for item in obj]
+    if isinstance(obj, IRFunction):
+        return obj.cname
+    if not isinstance(obj, IRObject):
+        return obj
+    key = keys.get(id(obj))
+    if key is None:
+        key = [obj.object_name] + [_content_key(value, keys) for value in obj.field_values()]
+        keys[id(obj)] = key
+    return key
+
+
+def content_id(obj: IRObject, keys: Dict[int, Any]) -> str:
+    text = json.dumps(_content_key(obj, keys), separators=(',', ':'))
+    return f'{obj.object_name}#{hashlib.sha256(text.encode()).hexdigest()[:CONTENT_ID_LENGTH]}'
+
+
+def find_shared_objects(roots: List[Any]) -> Dict[str, IRObject]:
+    # Finds the IR objects that are referenced from more than one place and gives each one a stable id.
+    # Functions are identified by their C name, other objects by their type and a hash of their content, so adding
+    # or removing an object doesn't change the ids of the others. Equal objects that aren't the same object get a
+    # counter after their id, in the order they are first met.
+    first_seen: List[IRObject] = []
+    seen_count: Dict[int, int] = {}
+    stack: List[Any] = list(reversed(roots))
+    while stack:
+        obj = stack.pop()
+        if isinstance(obj, list):
+            stack.extend(reversed(obj))
+        elif isinstance(obj, IRObject):
+            count = seen_count.get(id(obj), 0)
+            seen_count[id(obj)] = count + 1
+            if count == 0:
+                first_seen.append(obj)
+                stack.extend(reversed(obj.field_values()))
+
+    shared_objects: Dict[str, IRObject] = {}
+    id_counters: Dict[str, int] = {}
+    keys: Dict[int, Any] = {}
+    for obj in first_seen:
+        if seen_count[id(obj)] < 2:
+            continue
+        ref_id = obj.cname if isinstance(obj, IRFunction) else content_id(obj, keys)
+        unique_ref_id = ref_id
+        while unique_ref_id in shared_objects:
+            id_counters[ref_id] = id_counters.get(ref_id, 1) + 1
+            unique_ref_id = f'{ref_id}#{id_counters[ref_id]}'
+        shared_objects[unique_ref_id] = obj
+
+    return shared_objects
+
+
+def reference_to(ref_id: str) -> dict:
+    return {'object_name': REFERENCE_OBJECT_NAME, 'ref': ref_id}
+
+
+def is_reference(value: Any) -> bool:
+    return isinstance(value, dict) and value.get('object_name') == REFERENCE_OBJECT_NAME
+
+
+def resolve_references(document: dict) -> dict:
+    # Replaces in place every reference in a loaded JSON IR with the shared object it points to, so objects that were
+    # shared in the generator are shared (the same dict) in the loaded document too
+    shared: Dict[str, dict] = document.get('shared', {})
+    visited = set()
+    stack: List[Any] = [document]
+    while stack:
+        container = stack.pop()
+        if id(container) in visited:
+            continue
+        visited.add(id(container))
+        items = container.items() if isinstance(container, dict) else enumerate(container)
+        for key, item in list(items):
+            if is_reference(item):
+                if item['ref'] not in shared:
+                    raise RuntimeError(f'Unknown reference "{item["ref"]}"')
+                container[key] = shared[item['ref']]
+            elif isinstance(item, (dict, list)):
+                stack.append(item)
+
+    return document
@@ -0,0 +1,245 @@
+from typing import Dict, List, Optional, Tuple
+from ir import *
+from naming import intern_name
+
+
+def get_all_ir_classes(ir_classes: List[IRClass]) -> List[IRClass]:
+    all_ir_classes: List[IRClass] = [ir_class for ir_class in ir_classes]
+    for ir_class in ir_classes:
+        all_ir_classes.extend(get_all_ir_classes(ir_class.inner_classes))
+
+    return all_ir_classes
+
+
+def is_size_func_name(func_name: str) -> bool:
+    return func_name.endswith('_size') or func_name.endswith('_length')
+
+
+# Owns the generated IR and keeps lookup indexes in sync with it. Every structural change of the classes (creating a
+# class, adding, removing, moving or renaming a function or a property) must go through the registry.
+class IRRegistry:
+    def __init__(self):
+        self.enums: List[IREnum] = []
+        self.exceptions: List[IRException] = []
+        self.classes: List[IRClass] = []
+
+        # Flattened view of the class tree, rebuilt only after a class is added
+        self._all_classes: Optional[List[IRClass]] = None
+        self._classes_by_name: Dict[Tuple[Optional[int], str], IRClass] = {}
+        self._parents: Dict[int, Optional[IRClass]] = {}
+        self._exceptions_by_enum_name: Dict[str, IRException] = {}
+        self._functions_by_cname: Dict[str, IRFunction] = {}
+        self._function_owners: Dict[int, IRClass] = {}
+        self._functions_by_name: Dict[int, Dict[str, List[IRFunction]]] = {}
+        self._properties_by_name: Dict[int, Dict[str, List[IRProperty]]] = {}
+        # Size functions candidates of each class in the order they appear in the class, built lazily
+        self._size_funcs: Dict[int, List[IRFunction]] = {}
+        self._static_size_funcs: Dict[int, List[Tuple[str, IRFunction]]] = {}
+        self._size_func_lookups: Dict[Tuple[str, int], Optional[IRFunction]] = {}
+
+    # Adds IR that was generated separately (in another process or loaded from the build cache) and indexes it
+    def merge(self, enums: List[IREnum], exceptions: List[IRException], classes: List[IRClass]):
+        for ir_class in classes:
+            if self.get_class(ir_class.name):
+                raise RuntimeError(f'The class {ir_class.name} is generated from more than one header')
+        self.enums.extend(enums)
+        self.add_exceptions(exceptions)
+        self._merge_classes(classes, None)
+        self._all_classes = None
+
+    def _merge_classes(self, ir_classes: List[IRClass], parent: Optional[IRClass]):
+        for ir_class in ir_classes:
+            self._classes_by_name[(id(parent) if parent else None, ir_class.name)] = ir_class
+            self._parents[id(ir_class)] = parent
+            self._functions_by_name[id(ir_class)] = {}
+            self._properties_by_name[id(ir_class)] = {}
+            (self.classes if parent is None else parent.inner_classes).append(ir_class)
+
+            functions, properties = ir_class.functions, ir_class.properties
+            ir_class.functions, ir_class.properties = [], []
+            if isinstance(ir_class.handle, IRNativeHandle):
+                for func in (ir_class.handle.alloc_func, ir_class.handle.dealloc_func):
+                    if func:
+                        self.set_function_owner(ir_class, func)
+            if ir_class.default_init:
+                self.set_function_owner(ir_class, ir_class.default_init)
+            self.add_functions(ir_class, functions)
+            for ir_property in properties:
+                self.add_property(ir_class, ir_property)
+
+            inner_classes = ir_class.inner_classes
+            ir_class.inner_classes = []
+            self._merge_classes(inner_classes, ir_class)
+
+    # Classes
+
+    def all_classes(self) -> List[IRClass]:
+        if self._all_classes is None:
+            self._all_classes = get_all_ir_classes(self.classes)
+        return self._all_classes
+
+    def get_class(self, ir_class_name: str, parent: Optional[IRClass] = None) -> Optional[IRClass]:
+        return self._classes_by_name.get((id(parent) if parent else None, ir_class_name))
+
+    def require_class(self, ir_class_name: str, parent: Optional[IRClass] = None) -> IRClass:
+        ir_class = self.get_class(ir_class_name, parent)
+        if ir_class:
+            return ir_class
+
+        ir_class = IRClass(intern_name(ir_class_name))
+        self._classes_by_name[(id(parent) if parent else None, ir_class_name)] = ir_class
+        self._parents[id(ir_class)] = parent
+        self._functions_by_name[id(ir_class)] = {}
+        self._properties_by_name[id(ir_class)] = {}
+        if parent:
+            parent.inner_classes.append(ir_class)
+        else:
+            self.classes.append(ir_class)
+        self._all_classes = None
+        return ir_class
+
+    def parent_of(self, ir_class: IRClass) -> Optional[IRClass]:
+        return self._parents.get(id(ir_class))
+
+    # Exceptions
+
+    def add_exceptions(self, ir_exceptions: List[IRException]):
+        for ir_exception in ir_exceptions:
+            self.exceptions.append(ir_exception)
+            self._exceptions_by_enum_name.setdefault(ir_exception.enum_name, ir_exception)
+
+    def get_exception_by_enum_name(self, enum_name: str) -> Optional[IRException]:
+        return self._exceptions_by_enum_name.get(enum_name)
+
+    # Functions
+
+    def get_function_by_cname(self, cname: str) -> Optional[IRFunction]:
+        return self._functions_by_cname.get(cname)
+
+    def owner_of(self, func: IRFunction) -> Optional[IRClass]:
+        return self._function_owners.get(id(func))
+
+    def get_function_by_name(self, ir_class: IRClass, func_name: str) -> Optional[IRFunction]:
+        functions = self._functions_by_name[id(ir_class)].get(func_name)
+        return functions[0] if functions else None
+
+    def get_functions_by_name(self, ir_class: IRClass, func_name: str) -> List[IRFunction]:
+        return list(self._functions_by_name[id(ir_class)].get(func_name, []))
+
+    def has_function(self, ir_class: IRClass, func: IRFunction) -> bool:
+        return func in self._functions_by_name[id(ir_class)].get(func.name, [])
+
+    def add_function(self, ir_class: IRClass, func: IRFunction):
+        ir_class.functions.append(func)
+        self._functions_by_name[id(ir_class)].setdefault(func.name, []).append(func)
+        self.set_function_owner(ir_class, func)
+        self._invalidate_size_funcs(ir_class, func.name)
+
+    def add_functions(self, ir_class: IRClass, functions: List[IRFunction]):
+        for func in functions:
+            self.add_function(ir_class, func)
+
+    def remove_function(self, ir_class: IRClass, func: IRFunction):
+        ir_class.functions.remove(func)
+        self._functions_by_name[id(ir_class)][func.name].remove(func)
+        if self._function_owners.get(id(func)) is ir_class:
+            self._unset_function_owner(func)
+        self._invalidate_size_funcs(ir_class, func.name)
+
+    def move_function(self, func: IRFunction, source: IRClass, destination: IRClass):
+        self.remove_function(source, func)
+        self.add_function(destination, func)
+
+    def rename_function(self, ir_class: IRClass, func: IRFunction, new_name: str):
+        new_name = intern_name(new_name)
+        functions_by_name = self._functions_by_name[id(ir_class)]
+        if func in functions_by_name.get(func.name, []):
+            functions_by_name[func.name].remove(func)
+            functions_by_name.setdefault(new_name, []).append(func)
+        self._invalidate_size_funcs(ir_class, func.name)
+        func.name = new_name
+        self._invalidate_size_funcs(ir_class, func.name)
+
+    def set_function_owner(self, ir_class: IRClass, func: IRFunction):
+        # Functions that are not in the functions list of a class (handle functions, default init, property accessors)
+        # are still owned by it
+        self._function_owners[id(func)] = ir_class
+        self._functions_by_cname[func.cname] = func
+
+    def _unset_function_owner(self, func: IRFunction):
+        del self._function_owners[id(func)]
+        if self._functions_by_cname.get(func.cname) is func:
+            del self._functions_by_cname[func.cname]
+
+    # Properties
+
+    def get_properties_by_name(self, ir_class: IRClass, property_name: str) -> List[IRProperty]:
+        return list(self._properties_by_name[id(ir_class)].get(property_name, []))
+
+    def add_property(self, ir_class: IRClass, ir_property: IRProperty):
+        ir_property.name = intern_name(ir_property.name)
+        ir_class.properties.append(ir_property)
+        self._properties_by_name[id(ir_class)].setdefault(ir_property.name, []).append(ir_property)
+        for accessor in (ir_property.getter, ir_property.setter):
+            if accessor:
+                self.set_function_owner(ir_class, accessor)
+        self._invalidate_size_funcs(ir_class, ir_property.name)
+
+    def rename_property(self, ir_class: IRClass, ir_property: IRProperty, new_name: str):
+        new_name = intern_name(new_name)
+        properties_by_name = self._properties_by_name[id(ir_class)]
+        properties_by_name[ir_property.name].remove(ir_property)
+        properties_by_name.setdefault(new_name, []).append(ir_property)
+        self._invalidate_size_funcs(ir_class, ir_property.name)
+        ir_property.name = new_name
+        self._invalidate_size_funcs(ir_class, ir_property.name)
+
+    # Size functions
+
+    def search_size_func(self, keyword: str, ir_class: IRClass) -> Optional[IRFunction]:
+        lookup_key = (keyword, id(ir_class))
+        if lookup_key in self._size_func_lookups:
+            return self._size_func_lookups[lookup_key]
+
+        size_func = self._search_size_func(keyword, ir_class)
+        self._size_func_lookups[lookup_key] = size_func
+        return size_func
+
+    def _search_size_func(self, keyword: str, ir_class: IRClass) -> Optional[IRFunction]:
+        # Search for size functions in the same class
+        for func in self._get_size_funcs(ir_class):
+            if keyword in func.name:
+                return func
+
+        # Search for static size functions and properties in other classes
+        for clazz in self.all_classes():
+            for name, func in self._get_static_size_funcs(clazz):
+                if keyword in name:
+                    return func
+
+        return None
+
+    def _get_size_funcs(self, ir_class: IRClass) -> List[IRFunction]:
+        size_funcs = self._size_funcs.get(id(ir_class))
+        if size_funcs is None:
+            size_funcs = [func for func in ir_class.functions if is_size_func_name(func.name)]
+            self._size_funcs[id(ir_class)] = size_funcs
+        return size_funcs
+
+    def _get_static_size_funcs(self, ir_class: IRClass) -> List[Tuple[str, IRFunction]]:
+        static_size_funcs = self._static_size_funcs.get(id(ir_class))
+        if static_size_funcs is None:
+            static_size_funcs = [
+                (func.name, func) for func in self._get_size_funcs(ir_class) if func.is_static
+            ] + [
+                (ir_property.name, ir_property.getter) for ir_property in ir_class.properties
+                if ir_property.is_static and is_size_func_name(ir_property.name)
+            ]
+            self._static_size_funcs[id(ir_class)] = static_size_funcs
+        return static_size_funcs
+
+    def _invalidate_size_funcs(self, ir_class: IRClass, name: str):
+        if is_size_func_name(name):
+            self._size_func_lookups.clear()
+            self._size_funcs.pop(id(ir_class), None)
+            self._static_size_funcs.pop(id(ir_class), None)
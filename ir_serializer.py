@@ -0,0 +1,159 @@
+from json.encoder import encode_basestring_ascii
+from typing import Any, Dict, List, Optional, TextIO, Tuple
+from ir import *
+from ir_refs import REFERENCE_OBJECT_NAME, find_shared_objects
+from ir_strings import STRING_FIELDS, STRINGS_SECTION, build_string_table
+import gzip
+
+# The fields of every IR object in the order they are written (after 'object_name')
+IR_SCHEMA: Dict[type, Tuple[str, ...]] = {
+    ir_class: ir_class.__slots__ for ir_class in (
+        CType, IRType, IRParam, IRBufferWrapper, IRReturnType, IRFunction, IRProperty, IREnumValue, IREnum,
+        IRException, IRStructField, IRStructLayout, IRNativeHandle, IRNumberHandle, IRBatchField, IRBatchLayout,
+        IRClass,
+    )
+}
+
+FLUSH_SIZE = 64 * 1024
+
+SHARED_SECTION = 'shared'
+
+
+def open_ir_output(path: str, compress: bool = False) -> TextIO:
+    if compress:
+        return gzip.open(path, 'wt', encoding='ascii')
+    return open(path, 'w', encoding='ascii')
+
+
+# Writes the IR as JSON directly to a stream, producing the same text as json.dumps() of the equivalent dicts. With
+# string indexes, the names of the IR objects are written as their index in the string table.
+class IRJsonWriter:
+    def __init__(self, stream: TextIO, references: Optional[Dict[int, str]] = None,
+                 string_indexes: Optional[Dict[str, int]] = None):
+        self._stream = stream
+        self._references = references or {}
+        self._string_indexes = string_indexes
+        self._chunks: List[str] = []
+        self._size = 0
+        # Keys of every field are written the same way many times
+        self._field_prefixes: Dict[type, List[Tuple[str, str, bool]]] = {
+            ir_type: [(field, f', {encode_basestring_ascii(field)}: ', string_indexes is not None and
+                       field in STRING_FIELDS) for field in fields]
+            for ir_type, fields in IR_SCHEMA.items()
+        }
+
+    def _write(self, text: str):
+        self._chunks.append(text)
+        self._size += len(text)
+        if self._size >= FLUSH_SIZE:
+            self.flush()
+
+    def flush(self):
+        self._stream.write(''.join(self._chunks))
+        self._chunks.clear()
+        self._size = 0
+
+    def write_value(self, value: Any):
+        if value is None:
+            self._write('null')
+        elif value is True:
+            self._write('true')
+        elif value is False:
+            self._write('false')
+        elif isinstance(value, str):
+            self._write(encode_basestring_ascii(value))
+        elif isinstance(value, int):
+            self._write(int.__repr__(value))
+        elif isinstance(value, list):
+            self.write_list(value)
+        elif isinstance(value, dict):
+            self.write_dict(value)
+        elif isinstance(value, IRObject):
+            self.write_object(value)
+        else:
+            raise RuntimeError(f'Can\'t serialize a value of type {type(value).__name__}')
+
+    def write_list(self, values: list):
+        self._write('[')
+        for index, value in enumerate(values):
+            if index:
+                self._write(', ')
+            self.write_value(value)
+        self._write(']')
+
+    def write_dict(self, values: Dict[str, Any]):
+        self._write('{')
+        for index, (key, value) in enumerate(values.items()):
+            if index:
+                self._write(', ')
+            self._write(encode_basestring_ascii(key) + ': ')
+            self.write_value(value)
+        self._write('}')
+
+    def write_object(self, obj: IRObject, inline: bool = False):
+        if not inline and id(obj) in self._references:
+            self._write(f'{{"object_name": "{REFERENCE_OBJECT_NAME}", '
+                        f'"ref": {encode_basestring_ascii(self._references[id(obj)])}}}')
+            return
+
+        if self._string_indexes is None:
+            self._write('{"object_name": ' + encode_basestring_ascii(obj.object_name))
+        else:
+            self._write('{"object_name": ' + int.__repr__(self._string_indexes[obj.object_name]))
+        for field, prefix, is_string_field in self._field_prefixes[type(obj)]:
+            self._write(prefix)
+            value = getattr(obj, field)
+            if is_string_field and isinstance(value, str):
+                self._write(int.__repr__(self._string_indexes[value]))
+            else:
+                self.write_value(value)
+        self._write('}')
+
+    def write_shared_objects(self, shared_objects: Dict[str, IRObject]):
+        self._write('{')
+        for index, (ref_id, obj) in enumerate(shared_objects.items()):
+            if index:
+                self._write(', ')
+            self._write(encode_basestring_ascii(ref_id) + ': ')
+            self.write_object(obj, inline=True)
+        self._write('}')
+
+    def write_root(self, sections: List[Tuple[str, Any]]):
+        self._write('{')
+        for index, (key, value) in enumerate(sections):
+            if index:
+                self._write(', ')
+            self._write(encode_basestring_ascii(key) + ': ')
+            if key == SHARED_SECTION:
+                self.write_shared_objects(value)
+            else:
+                self.write_value(value)
+        self._write('}')
+        self.flush()
+
+
+def write_ir_json(
+        stream: TextIO,
+        metadata: Dict[str, str],
+        enums: List[IREnum],
+        exceptions: List[IRException],
+        classes: List[IRClass],
+        deduplicate: bool = False,
+        index: Optional[Dict[str, Any]] = None,
+        string_table: bool = False
+):
+    sections: List[Tuple[str, Any]] = list(metadata.items())
+    string_indexes: Optional[Dict[str, int]] = None
+    if string_table:
+        string_indexes = build_string_table([enums, exceptions, classes])
+        sections.append((STRINGS_SECTION, list(string_indexes)))
+    references: Dict[int, str] = {}
+    if deduplicate:
+        shared_objects = find_shared_objects([enums, exceptions, classes])
+        references = {id(obj): ref_id for ref_id, obj in shared_objects.items()}
+        sections.append((SHARED_SECTION, shared_objects))
+    sections.extend([('enums', enums), ('exceptions', exceptions), ('classes', classes)])
+    if index is not None:
+        sections.append(('index', index))
+
+    IRJsonWriter(stream, references, string_indexes).write_root(sections)
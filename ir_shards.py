@@ -0,0 +1,151 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+from ir import *
+from ir_binary import get_class_paths
+from ir_index import build_ir_index
+from ir_loader import LoadedIR, ir_from_document
+from ir_serializer import write_ir_json
+import gzip
+import hashlib
+import io
+import json
+import os
+
+SHARDS_MANIFEST = 'manifest.json'
+CLASSES_SHARDS_DIR = 'classes'
+
+
+# The IR split in shards: one for the enums, one for the exceptions and one for every top-level class with its inner
+# classes. Every shard is a complete IR document (load_ir() reads it) and the manifest lists them with the SHA-256 of
+# their JSON text, so a consumer loads only the shards it needs and skips the ones that haven't changed.
+#
+# The shards are self-contained copies: an object that classes of different shards share (the size function of
+# another class, the native handle type) is written in full in every shard that refers to it. Loaded together, the
+# shards are equal by value to the full IR, but each of them has its own copy of such an object.
+#
+# manifest.json: {"ir_version": ..., "tox_version": ..., "shards": {
+#     "enums": {"file": "enums.json", "sha256": ..., "size": ...},
+#     "exceptions": {...},
+#     "classes": {"Tox": {"file": "classes/Tox.json", "sha256": ..., "size": ..., "class_paths": ["Tox", ...]}, ...}}}
+
+def _read_manifest(directory: str) -> Dict[str, Any]:
+    try:
+        with open(f'{directory}/{SHARDS_MANIFEST}', encoding='ascii') as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def _manifest_entries(manifest: Dict[str, Any]) -> List[Dict[str, Any]]:
+    shards = manifest.get('shards', {})
+    entries = [shards[kind] for kind in ('enums', 'exceptions') if kind in shards]
+    entries.extend(shards.get('classes', {}).values())
+    return entries
+
+
+def _write_shard(directory: str, file: str, metadata: Dict[str, str], enums: List[IREnum],
+                 exceptions: List[IRException], classes: List[IRClass], deduplicate: bool, string_table: bool,
+                 previous_entry: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    text = io.StringIO()
+    write_ir_json(text, metadata, enums, exceptions, classes, deduplicate=deduplicate,
+                  index=build_ir_index(enums, classes), string_table=string_table)
+    data = text.getvalue().encode('ascii')
+    entry = {'file': file, 'sha256': hashlib.sha256(data).hexdigest(), 'size': len(data)}
+
+    # An unchanged shard isn't written again, so its modification time stays that of the last change
+    path = f'{directory}/{file}'
+    if previous_entry and previous_entry.get('file') == file and previous_entry.get('sha256') == entry['sha256'] \
+            and os.path.exists(path):
+        return entry
+    if file.endswith('.gz'):
+        # Without a modification time in the gzip header the same shard is always the same file
+        data = gzip.compress(data, mtime=0)
+    temp_path = f'{path}.{os.getpid()}.tmp'
+    with open(temp_path, 'wb') as f:
+        f.write(data)
+    os.replace(temp_path, path)
+    return entry
+
+
+def write_ir_shards(directory: str, metadata: Dict[str, str], enums: List[IREnum], exceptions: List[IRException],
+                    classes: List[IRClass], deduplicate: bool = False, string_table: bool = False,
+                    compress: bool = False, jobs: int = 1) -> Dict[str, Any]:
+    # The shards are serialized and written by a pool of threads: serializing holds the GIL, but compressing and
+    # writing the files don't. Every shard replaces the old one atomically, and the manifest is replaced last, so it
+    # only lists shards that are complete.
+    os.makedirs(f'{directory}/{CLASSES_SHARDS_DIR}', exist_ok=True)
+    previous_manifest = _read_manifest(directory)
+    previous_shards = previous_manifest.get('shards', {})
+    extension = '.json' + ('.gz' if compress else '')
+    shard_args: List[Tuple[str, List[IREnum], List[IRException], List[IRClass], Optional[Dict[str, Any]]]] = [
+        (f'enums{extension}', enums, [], [], previous_shards.get('enums')),
+        (f'exceptions{extension}', [], exceptions, [], previous_shards.get('exceptions')),
+    ]
+    for ir_class in classes:
+        shard_args.append((f'{CLASSES_SHARDS_DIR}/{ir_class.name}{extension}', [], [], [ir_class],
+                           previous_shards.get('classes', {}).get(ir_class.name)))
+
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+        entries = list(executor.map(
+            lambda args: _write_shard(directory, args[0], metadata, args[1], args[2], args[3], deduplicate,
+                                      string_table, args[4]),
+            shard_args,
+        ))
+
+    class_entries: Dict[str, Dict[str, Any]] = {}
+    for ir_class, entry in zip(classes, entries[2:]):
+        entry['class_paths'] = [class_path for class_path, _ in get_class_paths([ir_class])]
+        class_entries[ir_class.name] = entry
+    manifest = dict(metadata)
+    manifest['shards'] = {'enums': entries[0], 'exceptions': entries[1], 'classes': class_entries}
+    temp_path = f'{directory}/{SHARDS_MANIFEST}.{os.getpid()}.tmp'
+    with open(temp_path, 'w', encoding='ascii') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(temp_path, f'{directory}/{SHARDS_MANIFEST}')
+
+    # Shards of classes that were removed (or written with the other compression) are deleted
+    files = {entry['file'] for entry in _manifest_entries(manifest)}
+    for entry in _manifest_entries(previous_manifest):
+        if entry.get('file') not in files and os.path.exists(f'{directory}/{entry.get("file")}'):
+            os.remove(f'{directory}/{entry["file"]}')
+    return manifest
+
+
+def load_shard(directory: str, entry: Dict[str, Any]) -> LoadedIR:
+    # Loads a shard listed in the manifest, checking that it's the shard the manifest lists
+    with open(f'{directory}/{entry["file"]}', 'rb') as f:
+        data = f.read()
+    if entry['file'].endswith('.gz'):
+        try:
+            data = gzip.decompress(data)
+        except (OSError, EOFError):
+            raise RuntimeError(f'The shard {entry["file"]} isn\'t a valid gzip file')
+    if hashlib.sha256(data).hexdigest() != entry['sha256']:
+        raise RuntimeError(f'The shard {entry["file"]} doesn\'t match the SHA-256 in the manifest')
+    return ir_from_document(json.loads(data))
+
+
+def load_ir_shards(directory: str, class_names: Optional[List[str]] = None) -> LoadedIR:
+    # Loads the enums, the exceptions and the shards of the given top-level classes (all of them by default) as one
+    # IR, equal by value to load_ir() of the full output restricted to those classes (objects shared between shards
+    # are copies)
+    manifest = _read_manifest(directory)
+    if 'shards' not in manifest:
+        raise RuntimeError(f'There is no shards manifest in {directory}')
+    shards = manifest['shards']
+    if class_names is None:
+        class_names = list(shards['classes'])
+    unknown_classes = [class_name for class_name in class_names if class_name not in shards['classes']]
+    if unknown_classes:
+        raise RuntimeError(f'There are no shards of the classes {", ".join(unknown_classes)} in {directory}')
+
+    loaded_shards = [load_shard(directory, shards['enums']), load_shard(directory, shards['exceptions'])]
+    loaded_shards.extend(load_shard(directory, shards['classes'][class_name]) for class_name in class_names)
+    index: Dict[str, Dict[str, Any]] = {'functions': {}, 'enum_values': {}}
+    for loaded_shard in loaded_shards:
+        for section, entries in loaded_shard.index.items():
+            for key, entry in entries.items():
+                index.setdefault(section, {}).setdefault(key, entry)
+    metadata = {key: value for key, value in manifest.items() if key != 'shards'}
+    return LoadedIR(metadata, loaded_shards[0].enums, loaded_shards[1].exceptions,
+                    [ir_class for loaded_shard in loaded_shards[2:] for ir_class in loaded_shard.classes], index)
@@ -0,0 +1,54 @@
+from typing import Any, Dict, List
+from ir import IRObject
+import sys
+
+STRINGS_SECTION = 'strings'
+
+# The fields of the IR objects that hold names. With a string table these fields and 'object_name' are written as
+# indexes in the 'strings' section of the root instead of the strings themselves.
+STRING_FIELDS = frozenset(('name', 'cname', 'throws', 'enum_name'))
+
+
+def build_string_table(roots: List[Any]) -> Dict[str, int]:
+    # The index of every name in the IR. Names used by more objects come first so they get shorter indexes, names used
+    # equally often keep the order they are first met in.
+    counts: Dict[str, int] = {}
+    seen = set()
+    stack: List[Any] = list(reversed(roots))
+    while stack:
+        obj = stack.pop()
+        if isinstance(obj, list):
+            stack.extend(reversed(obj))
+        elif isinstance(obj, IRObject) and id(obj) not in seen:
+            seen.add(id(obj))
+            counts[obj.object_name] = counts.get(obj.object_name, 0) + 1
+            values = obj.field_values()
+            for field, value in zip(obj.__slots__, values):
+                if field in STRING_FIELDS and isinstance(value, str):
+                    counts[value] = counts.get(value, 0) + 1
+            stack.extend(reversed([value for value in values if not isinstance(value, str)]))
+
+    strings = sorted(counts, key=lambda string: -counts[string])
+    return {string: index for index, string in enumerate(strings)}
+
+
+def resolve_string_table(document: dict) -> dict:
+    # Replaces in place the indexes of a JSON IR written with a string table by the (interned) strings, so the document
+    # is the same as one written without it
+    if STRINGS_SECTION not in document:
+        return document
+    strings: List[str] = [sys.intern(string) for string in document.pop(STRINGS_SECTION)]
+    stack: List[Any] = [value for key, value in document.items() if key != 'index']
+    while stack:
+        value = stack.pop()
+        if isinstance(value, list):
+            stack.extend(value)
+        elif isinstance(value, dict):
+            if isinstance(value.get('object_name'), int):
+                value['object_name'] = strings[value['object_name']]
+                for field in STRING_FIELDS:
+                    if isinstance(value.get(field), int):
+                        value[field] = strings[value[field]]
+            stack.extend(value.values())
+
+    return document
@@ -1,112 +1,122 @@
 from pyclibrary import CParser
 from parsing_to_ir import *
-from download_headers import download_headers
-from typing import List, Union
+from ir_registry import IRRegistry
+from build_cache import BuildCache, CACHE_DIR, DEFAULT_CACHE_SIZE_LIMIT, IRFragment, dump_ir, hash_generator_sources, \
+    load_ir
+from ir_serializer import open_ir_output, write_ir_json
+from ir_binary import write_ir_binary
+from ir_index import build_ir_index
+from ir_loader import load_ir as load_ir_json
+from ir_shards import write_ir_shards
+from parse_cache import DEFAULT_PARSE_CACHE_SIZE_LIMIT, DeclarationParser, ParseCache, default_parse_cache_dir
+from rules import RULES_FILE, GeneratorRules, load_rules
+from pass_manager import PassManager
+from profiling import PassProfiler
+from download_headers import download_headers, read_headers_from_git, read_headers_from_tarball
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Deque, Dict, List, Set, Tuple, Union
 import argparse
-import json
-import re
 import os
+import sys
+import time
 
-IR_VERSION = '0.1.0'
+IR_VERSION = '0.10.0'
 TOX_VERSION = '0.2.18'
 
 HEADERS_DIR = 'tox_headers'
 OUTPUT_DIR = 'output'
 OUTPUT_FILENAME = 'tox_oop_api_ir'
+BINARY_OUTPUT_EXTENSION = '.irb'
 
 NATIVE_ALLOCATE_FUNC_NAME = 'allocate_native'
 NATIVE_DEALLOCATE_FUNC_NAME = 'deallocate_native'
 
+# Functions returning a struct with these in their name allocate it: the first one is the allocation function of the
+# class, the others are static functions of the class (tox_pass_key_derive_with_salt())
+STRUCT_ALLOC_FUNC_KEYWORDS = ('new', 'derive')
+
 GETTER_SEARCH_KEYWORD = 'get_'
 SETTER_SEARCH_KEYWORD = 'set_'
 
-NATIVE_HANDLE_TYPE = IRType('ulong', True, False, CType('uint64_t', False))
+# Functions of a number handle class after which the number no longer identifies its object (the callbacks after which
+# it doesn't are the number_handle_invalidate_callbacks rule)
+NUMBER_HANDLE_INVALIDATE_FUNC_NAMES = ('delete',)
+NUMBER_HANDLE_KEY_WIDTHS = {'uint8_t': 8, 'uint16_t': 16, 'uint32_t': 32, 'uint64_t': 64}
 
+NATIVE_HANDLE_TYPE = IRType('ulong', True, False, CType('uint64_t', False))
 
-# https://stackoverflow.com/a/1118038
-def todict(obj, classkey=None):
-    if isinstance(obj, dict):
-        data = {}
-        for (k, v) in obj.items():
-            data[k] = todict(v, classkey)
-        return data
-    elif hasattr(obj, "_ast"):
-        return todict(obj._ast())
-    elif hasattr(obj, "__iter__") and not isinstance(obj, str):
-        return [todict(v, classkey) for v in obj]
-    elif hasattr(obj, "__dict__"):
-        data = dict([(key, todict(value, classkey))
-                     for key, value in obj.__dict__.items()
-                     if not callable(value) and not key.startswith('_')])
-        if classkey is not None and hasattr(obj, "__class__"):
-            data[classkey] = obj.__class__.__name__
-        return data
-    else:
-        return obj
+# IR objects that are shared by every header, kept shared when IR is passed between processes or cached
+IR_CONSTANTS = [NATIVE_HANDLE_TYPE]
 
+SUPPORTED_HEADERS_AND_BASE_CLASS = {
+    'tox.h': 'Tox',
+    'toxencryptsave.h': 'ToxEncryptSave',
+}
 
-def get_all_ir_classes(ir_classes: List[IRClass]) -> List[IRClass]:
-    all_ir_classes: List[IRClass] = [ir_class for ir_class in ir_classes]
-    for ir_class in ir_classes:
-        all_ir_classes.extend(get_all_ir_classes(ir_class.inner_classes))
+# The prefixes of the functions of classes whose functions aren't prefixed with the name of the class, e.g.
+# toxencryptsave.h names them tox_pass_encrypt() and tox_get_salt(). The first one that matches is removed.
+CLASS_FUNCTION_NAME_PREFIXES = {
+    'ToxEncryptSave': ('tox_pass_', 'tox_'),
+}
 
-    return all_ir_classes
+# The functions and properties of the classes must not keep the prefix of the C names
+C_NAME_PREFIX = 'tox_'
 
 
-def convert_functions_error_code_to_exception(ir_functions: List[IRFunction], ir_exceptions: List[IRException]):
+def convert_functions_error_code_to_exception(ir_functions: List[IRFunction], registry: IRRegistry):
     # Convert functions' error param to exception throwing
     for func in ir_functions:
         error_params: List[Union[IRParam, IRBufferWrapper]] = [param for param in func.params if param.name == 'error']
         if error_params:
             error_param: IRParam = error_params[0]
             error_ir_enum_name: str = error_param.type.name
-            possible_ir_exceptions: List[IRException] = [
-                ir_exception for ir_exception in ir_exceptions if ir_exception.enum_name == error_ir_enum_name
-            ]
-            if possible_ir_exceptions:
-                ir_exception = possible_ir_exceptions[0]
+            ir_exception: Optional[IRException] = registry.get_exception_by_enum_name(error_ir_enum_name)
+            if ir_exception:
                 func.params.remove(error_param)
                 func.throws = ir_exception.name
             else:
                 raise RuntimeError(f'Could not find appropriate exception class for the enum "{error_ir_enum_name}"')
 
 
-def require_class(ir_class_name: str, ir_classes: List[IRClass]) -> IRClass:
-    found_ir_classes: List[IRClass] = [ir_class for ir_class in ir_classes if ir_class.name == ir_class_name]
-    if found_ir_classes:
-        return found_ir_classes[0]
-    else:
-        new_class = IRClass(ir_class_name)
-        ir_classes.append(new_class)
-        return new_class
-
-
 def move_struct_alloc_functions_to_class(
         ir_functions: List[IRFunction],
-        ir_classes: List[IRClass],
-        known_structs: List[str]
+        registry: IRRegistry,
+        known_structs: Set[str]
 ):
-    for func in [func for func in ir_functions]:
+    leftover_functions: List[IRFunction] = []
+    for func in ir_functions:
         return_type: IRType = func.return_type.type
         return_type_ctype_name: str = return_type.ctype.name
         optimized_return_type_ctype_name = optimize_ctype_name(return_type_ctype_name)
-        if optimized_return_type_ctype_name in known_structs and 'new' in func.name:
+        if optimized_return_type_ctype_name in known_structs \
+                and any(keyword in func.name for keyword in STRUCT_ALLOC_FUNC_KEYWORDS):
+            ir_class = registry.require_class(return_type.name)
+            if isinstance(ir_class.handle, IRNativeHandle) and ir_class.handle.alloc_func:
+                func.is_static = True
+                registry.add_function(ir_class, func)
+                continue
             func.name = NATIVE_ALLOCATE_FUNC_NAME
             func.is_static = True
             func.return_type.replaced = func.return_type.type
             func.return_type.type = NATIVE_HANDLE_TYPE
             for ir_param in func.params:
-                ir_param.replaced_type = ir_param.type
-                ir_param.type = NATIVE_HANDLE_TYPE
-            ir_class = require_class(return_type.name, ir_classes)
+                # Structs are passed as handles, the other params (e.g. a passphrase) as they are
+                if optimize_ctype_name(ir_param.type.ctype.name) in known_structs:
+                    ir_param.replaced_type = ir_param.type
+                    ir_param.type = NATIVE_HANDLE_TYPE
             if not ir_class.handle:
                 ir_class.handle = IRNativeHandle()
-            ir_functions.remove(func)
             ir_class.handle.alloc_func = func
+            registry.set_function_owner(ir_class, func)
+        else:
+            leftover_functions.append(func)
+    ir_functions[:] = leftover_functions
 
 
-def move_struct_functions_to_class(ir_functions: List[IRFunction], ir_classes: List[IRClass], known_structs: List[str]):
-    for func in [func for func in ir_functions]:
+def move_struct_functions_to_class(ir_functions: List[IRFunction], registry: IRRegistry, known_structs: Set[str]):
+    leftover_functions: List[IRFunction] = []
+    for func in ir_functions:
         if func.params:
             first_param: IRParam = func.params[0]
             first_param_ctype_name: str = first_param.type.ctype.name
@@ -118,69 +128,57 @@ def move_struct_functions_to_class(ir_functions: List[IRFunction], ir_classes: L
                     first_param.name = 'handle'
                     first_param.replaced_type = first_param.type
                     first_param.type = NATIVE_HANDLE_TYPE
-                    ir_class = require_class(first_param.replaced_type.name, ir_classes)
+                    ir_class = registry.require_class(first_param.replaced_type.name)
                     if not ir_class.handle:
                         ir_class.handle = IRNativeHandle()
-                    ir_functions.remove(func)
                     ir_class.handle.dealloc_func = func
+                    registry.set_function_owner(ir_class, func)
                 else:
                     func.params.remove(first_param)
-                    ir_class = require_class(first_param.type.name, ir_classes)
-                    ir_functions.remove(func)
-                    ir_class.functions.append(func)
+                    ir_class = registry.require_class(first_param.type.name)
+                    registry.add_function(ir_class, func)
+                continue
+        leftover_functions.append(func)
+    ir_functions[:] = leftover_functions
 
 
-def move_leftover_functions_to_base_class(base_class: str, ir_functions: List[IRFunction], ir_classes: List[IRClass]):
+def move_leftover_functions_to_base_class(base_class: str, ir_functions: List[IRFunction], registry: IRRegistry):
     for func in ir_functions:
         func.is_static = True
 
-    ir_class = require_class(base_class, ir_classes)
-    ir_class.functions.extend(ir_functions)
+    ir_class = registry.require_class(base_class)
+    registry.add_functions(ir_class, ir_functions)
     ir_functions.clear()
 
 
-# https://stackoverflow.com/a/1176023
-def pascal_case_to_snake_case(ir_class_name: str) -> str:
-    pattern = re.compile(r'(?<!^)(?=[A-Z])')
-    return pattern.sub('_', ir_class_name).lower()
-
-
-def optimize_functions_name_in_classes(ir_classes: List[IRClass]):
+def optimize_functions_name_in_classes(ir_classes: List[IRClass], registry: IRRegistry):
     for ir_class in ir_classes:
+        prefixes = CLASS_FUNCTION_NAME_PREFIXES.get(ir_class.name, (pascal_case_to_snake_case(ir_class.name) + '_',))
         for func in ir_class.functions:
-            prefix = pascal_case_to_snake_case(ir_class.name) + '_'
-            if func.name.startswith(prefix):
-                func.name = func.name[len(prefix):]
-
-
-def is_size_func_name(func_name: str) -> bool:
-    return func_name.endswith('_size') or func_name.endswith('_length')
+            prefix = next((prefix for prefix in prefixes if func.name.startswith(prefix)), None)
+            if prefix:
+                registry.rename_function(ir_class, func, func.name[len(prefix):])
 
 
-def search_buffer_size_func(keyword: str, ir_class: IRClass, ir_classes: List[IRClass]) -> Optional[IRFunction]:
-    # Search for size functions in the same class
-    for func in ir_class.functions:
-        if keyword in func.name and is_size_func_name(func.name):
-            return func
+def functions_with_alloc_func(ir_class: IRClass) -> List[IRFunction]:
+    # The allocation function isn't one of the functions of the class, but its params are buffers like theirs
+    functions: List[IRFunction] = list(ir_class.functions)
+    if isinstance(ir_class.handle, IRNativeHandle) and ir_class.handle.alloc_func:
+        functions.append(ir_class.handle.alloc_func)
+    return functions
 
-    # Search for static size functions in other classes
-    for clazz in ir_classes:
-        for func in clazz.functions:
-            if func.is_static and keyword in func.name and is_size_func_name(func.name):
-                return func
-        for ir_property in clazz.properties:
-            if ir_property.is_static and keyword in ir_property.name and is_size_func_name(ir_property.name):
-                return ir_property.getter
 
-    return None
+def is_buffer_length_param(ir_param: Union[IRParam, IRBufferWrapper]) -> bool:
+    return 'length' in ir_param.name or ir_param.name.endswith('_len')
 
 
 def is_ir_type_of_string(ir_type: IRType) -> bool:
     return ir_type.name == 'char' and ir_type.is_array
 
 
-def set_buffer_size_func_to_return_types(ir_classes: List[IRClass]):
+def set_buffer_size_func_to_return_types(ir_classes: List[IRClass], registry: IRRegistry, rules: GeneratorRules):
     for ir_class in ir_classes:
+        keywords = rules.get_buffer_size_keywords('return_types', ir_class.name)
         for func in [func for func in ir_class.functions]:
             if (
                     func.return_type.type.is_array and not is_ir_type_of_string(func.return_type.type)
@@ -190,38 +188,36 @@ def set_buffer_size_func_to_return_types(ir_classes: List[IRClass]):
                     and 'event' in func.cname
                     and func.return_type.type.name != 'ToxEvents'
             ):
-                keyword = func.name[func.name.find(GETTER_SEARCH_KEYWORD) + len(GETTER_SEARCH_KEYWORD):]
-                if keyword == 'savedata_data':
-                    keyword = 'savedata'
-                elif ir_class.name == 'ToxEventFileRecvChunk' and func.name == 'get_data':
-                    keyword = ''
-                size_func = search_buffer_size_func(keyword, ir_class, ir_classes)
+                keyword = keywords.get(func.name)
+                if keyword is None:
+                    keyword = func.name[func.name.find(GETTER_SEARCH_KEYWORD) + len(GETTER_SEARCH_KEYWORD):]
+                size_func = registry.search_size_func(keyword, ir_class)
                 if not size_func:
                     raise RuntimeError(f'Could not find size getter function for the keyword "{keyword}"')
-                if GETTER_SEARCH_KEYWORD in size_func.name and size_func in ir_class.functions:
-                    ir_class.functions.remove(size_func)
+                if GETTER_SEARCH_KEYWORD in size_func.name and registry.has_function(ir_class, size_func):
+                    registry.remove_function(ir_class, size_func)
                 func.return_type.type.get_size_func = size_func
 
 
-def optimize_buffer_getters(ir_classes: List[IRClass]):
+def optimize_buffer_getters(ir_classes: List[IRClass], registry: IRRegistry, rules: GeneratorRules):
     for ir_class in ir_classes:
+        keywords = rules.get_buffer_size_keywords('getters', ir_class.name)
         for func in [func for func in ir_class.functions]:
-            if GETTER_SEARCH_KEYWORD in func.name or func.name == 'hash':
+            if GETTER_SEARCH_KEYWORD in func.name or func.name in keywords:
                 if func.return_type.type.name == 'void' or func.return_type.type.name == 'bool':
                     for param_index, ir_param in enumerate(func.params):
-                        if ir_param.type.is_array:
-                            keyword = func.name[func.name.find(GETTER_SEARCH_KEYWORD) + len(GETTER_SEARCH_KEYWORD):]
-                            if keyword == 'dht_id':  # Manual handling
-                                keyword = 'address'
-                            elif keyword == 'id':
-                                keyword = '_id'
-                            elif func.name == 'hash':
-                                keyword = 'hash'
-                            size_func = search_buffer_size_func(keyword, ir_class, ir_classes)
+                        # The getter fills a mutable buffer, the const ones are its input (tox_get_salt())
+                        if ir_param.type.is_array and ir_param.type.mutable:
+                            keyword = keywords.get(func.name)
+                            if keyword is None:
+                                keyword = func.name[func.name.find(GETTER_SEARCH_KEYWORD) +
+                                                    len(GETTER_SEARCH_KEYWORD):]
+                            size_func = registry.search_size_func(keyword, ir_class)
                             if not size_func:
                                 raise RuntimeError(f'Could not find size getter function for the keyword "{keyword}"')
-                            if GETTER_SEARCH_KEYWORD in size_func.name and size_func in ir_class.functions:
-                                ir_class.functions.remove(size_func)  # The function is specific to only one property
+                            if GETTER_SEARCH_KEYWORD in size_func.name and registry.has_function(ir_class, size_func):
+                                # The function is specific to only one property
+                                registry.remove_function(ir_class, size_func)
                             ir_param.type.get_size_func = size_func
                             # Convert the param to be returned
                             func.params.remove(ir_param)
@@ -231,62 +227,207 @@ def optimize_buffer_getters(ir_classes: List[IRClass]):
                             break
 
 
-def optimize_buffer_setters(ir_classes: List[IRClass]):
+def optimize_buffer_setters(ir_classes: List[IRClass], registry: IRRegistry, rules: GeneratorRules):
     for ir_class in ir_classes:
+        keywords = rules.get_buffer_size_keywords('setters', ir_class.name)
         for func in ir_class.functions:
             if SETTER_SEARCH_KEYWORD in func.name and func.return_type.type.name == 'void':
                 for ir_param in func.params:
                     if type(ir_param) == IRParam and ir_param.type.is_array:
-                        keyword = func.name[func.name.find(SETTER_SEARCH_KEYWORD) + len(SETTER_SEARCH_KEYWORD):]
-                        if keyword == 'savedata_data':  # Manual handling
-                            keyword = 'savedata'
-                        size_func = search_buffer_size_func(keyword, ir_class, ir_classes)
+                        keyword = keywords.get(func.name)
+                        if keyword is None:
+                            keyword = func.name[func.name.find(SETTER_SEARCH_KEYWORD) + len(SETTER_SEARCH_KEYWORD):]
+                        size_func = registry.search_size_func(keyword, ir_class)
                         if size_func:
-                            if SETTER_SEARCH_KEYWORD in size_func.name and size_func in ir_class.functions:
-                                ir_class.functions.remove(size_func)  # The function is specific to only one property
+                            if SETTER_SEARCH_KEYWORD in size_func.name and registry.has_function(ir_class, size_func):
+                                # The function is specific to only one property
+                                registry.remove_function(ir_class, size_func)
                             ir_param.type.set_size_func = size_func
                             break
 
 
-def set_buffer_size_func_to_params(ir_classes: List[IRClass]):
+def set_buffer_size_func_to_params(ir_classes: List[IRClass], registry: IRRegistry):
     for ir_class in ir_classes:
-        for func in ir_class.functions:
+        for func in functions_with_alloc_func(ir_class):
             for ir_param in func.params:
                 if type(ir_param) == IRParam and ir_param.type.is_array and not ir_param.type.get_size_func:
-                    size_func = search_buffer_size_func(ir_param.name, ir_class, ir_classes)
+                    size_func = registry.search_size_func(ir_param.name, ir_class)
                     if size_func:
                         ir_param.type.get_size_func = size_func
 
 
-def manual_buffer_size_func(ir_classes: List[IRClass]):
+def manual_buffer_size_func(ir_classes: List[IRClass], registry: IRRegistry, rules: GeneratorRules):
     for ir_class in ir_classes:
-        for func in ir_class.functions:
-            if func.name == 'conference_by_id':
-                keyword = '_id'
-            elif func.name == 'conference_by_uid':
-                keyword = '_uid'
-            else:
-                continue
+        for func_name, keyword in rules.get_buffer_size_keywords('params', ir_class.name).items():
+            for func in registry.get_functions_by_name(ir_class, func_name):
+                for ir_param in func.params:
+                    if ir_param.type.is_array:
+                        size_func = registry.search_size_func(keyword, ir_class)
+                        if size_func:
+                            ir_param.type.get_size_func = size_func
+                            break
 
+
+def set_buffer_ownership(ir_classes: List[IRClass], rules: GeneratorRules):
+    # Input buffers passed to a function are only used during the call, the ones passed to a callback only until it
+    # returns. A mutable buffer param of a function is an output the caller allocates and the function fills, like the
+    # buffer a getter fills (which becomes its return value). A returned pointer points to memory of the object.
+    # The rules override the cases these conventions get wrong.
+    for ir_class in ir_classes:
+        ownership_overrides = rules.get_buffer_ownerships(ir_class.name)
+        for func in functions_with_alloc_func(ir_class):
+            overrides = ownership_overrides.get(func.name, {})
             for ir_param in func.params:
-                if ir_param.type.is_array:
-                    size_func = search_buffer_size_func(keyword, ir_class, ir_classes)
-                    if size_func:
-                        ir_param.type.get_size_func = size_func
-                        break
+                buffer_param = ir_param.buffer_param if type(ir_param) == IRBufferWrapper else ir_param
+                if not buffer_param.type.is_array:
+                    continue
+                if ir_class.is_callback:
+                    params_ownership = BUFFER_BORROWED_FOR_CALLBACK
+                elif buffer_param.type.mutable:
+                    params_ownership = BUFFER_CALLER_OWNED_OUT
+                else:
+                    params_ownership = BUFFER_BORROWED_FOR_CALL
+                ir_param.ownership = overrides.get(buffer_param.name, params_ownership)
+                buffer_param.ownership = ir_param.ownership
+            return_type = func.return_type
+            if return_type.param_index is not None:
+                return_type.ownership = overrides.get('return', BUFFER_CALLER_OWNED)
+            elif return_type.type.is_array:
+                return_type.ownership = overrides.get('return', BUFFER_BORROWED_FROM_OBJECT)
+
+            unknown_names = set(overrides) - {'return'} - {
+                ir_param.buffer_param.name if type(ir_param) == IRBufferWrapper else ir_param.name
+                for ir_param in func.params
+            }
+            if unknown_names:
+                raise RuntimeError(f'The function {func.cname} has no buffers {", ".join(sorted(unknown_names))}')
+
+
+def fold_constant_buffer_sizes(ir_classes: List[IRClass], values: Dict[str, Any]):
+    # The size functions of fixed size buffers (keys, addresses, hashes...) only return a constant of the headers,
+    # e.g. tox_public_key_size() returns TOX_PUBLIC_KEY_SIZE. Its value (as pyclibrary evaluated it) is set to the
+    # types, so bindings can allocate the buffers without calling the function. That's the returned buffers and the
+    # params, whether set_buffer_size_func_to_params() or a setter (its set_size_func) gave them the size function.
+    for ir_class in ir_classes:
+        functions: List[IRFunction] = functions_with_alloc_func(ir_class)
+        for ir_property in ir_class.properties:
+            functions.extend(func for func in (ir_property.getter, ir_property.setter) if func)
+        for func in functions:
+            ir_types = [func.return_type.type]
+            ir_types.extend(ir_param.buffer_param.type if type(ir_param) == IRBufferWrapper else ir_param.type
+                            for ir_param in func.params)
+            for ir_type in ir_types:
+                # A string ends at its terminator, the size function of a string param is its maximum length
+                # (tox_max_status_message_length())
+                if is_ir_type_of_string(ir_type):
+                    continue
+                for size_func in (ir_type.get_size_func, ir_type.set_size_func):
+                    if size_func and size_func.is_static and not size_func.params and not size_func.throws:
+                        value = values.get(size_func.cname.upper())
+                        if type(value) == int:
+                            ir_type.constant_size = value
+                            break
 
 
-def add_callbacks(callbacks: List[IRFunction], ir_classes: List[IRClass]):
+def add_batch_layouts(ir_classes: List[IRClass], registry: IRRegistry):
+    # A function that returns the object at an index of a collection whose size is its size function (e.g.
+    # tox_events_get_friend_message() and tox_events_get_friend_message_size()) lets a binding read all the objects at
+    # once. The class of the objects gets a batch layout with a field for every property it has.
+    for ir_class in ir_classes:
+        for func in ir_class.functions:
+            item_type = func.return_type.type
+            if not item_type.ctype.is_pointer or not item_type.get_size_func or len(func.params) != 1 \
+                    or type(func.params[0]) != IRParam or func.params[0].type.ctype.name != 'uint32_t':
+                continue
+            item_class = registry.get_class(item_type.name)
+            if not item_class or item_class.is_callback:
+                continue
+            fields = [IRBatchField(ir_property.name, ir_property.getter.return_type.type, ir_property.getter)
+                      for ir_property in item_class.properties
+                      if not ir_property.is_static and not ir_property.getter.params]
+            item_class.batch_layout = IRBatchLayout(item_type.get_size_func, func, fields)
+
+
+def add_struct_layouts(ir_classes: List[IRClass], structs_defs: dict, rules: GeneratorRules):
+    # The fields of the struct of every class in the struct_layouts rule, in the order they are declared. The getter of
+    # a property reads the field of the same name (tox_options_get_udp_enabled() reads udp_enabled), so every property
+    # must have a field of its C type or the layout doesn't describe the object.
+    for ir_class in ir_classes:
+        if ir_class.name not in rules.struct_layouts or not isinstance(ir_class.handle, IRNativeHandle):
+            continue
+        struct_name = next((name for name in structs_defs if snake_case_to_pascal_case(name) == ir_class.name), None)
+        if struct_name is None:
+            raise RuntimeError(f'There is no struct of the class {ir_class.name} in the headers')
+        members = structs_defs[struct_name]['members']
+        properties_by_getter = {ir_property.getter.cname: ir_property for ir_property in ir_class.properties
+                                if not ir_property.is_static}
+        fields: List[IRStructField] = []
+        for field_name, field_type, _ in members:
+            ir_type = parse_type(field_type)
+            ir_property = properties_by_getter.pop(f'{struct_name.lower()}_get_{field_name}', None)
+            if ir_property:
+                getter_ctype = ir_property.getter.return_type.type.ctype
+                if optimize_ctype_name(getter_ctype.name) != optimize_ctype_name(ir_type.ctype.name):
+                    raise RuntimeError(f'The property {ir_class.name}.{ir_property.name} is a {getter_ctype.name} but '
+                                       f'the field {struct_name}.{field_name} is a {ir_type.ctype.name}')
+            fields.append(IRStructField(intern_name(field_name), ir_type, ir_property.name if ir_property else None))
+        # An opaque struct has no fields to check the properties against
+        if members and properties_by_getter:
+            raise RuntimeError(f'The properties {", ".join(p.name for p in properties_by_getter.values())} of '
+                               f'{ir_class.name} have no field in the struct {struct_name}')
+        ir_class.handle.struct_layout = IRStructLayout(intern_name(struct_name), bool(members), fields)
+
+
+def add_number_handle_metadata(registry: IRRegistry, rules: GeneratorRules):
+    # What a binding needs to keep one object per number handle and drop it when the number is no longer valid: the
+    # owners the number is relative to, its width, the functions that return numbers of the class (one or an array of
+    # them), their count (tox_conference_peer_count()) and the functions (tox_friend_delete()) and callbacks
+    # (tox_conference_peer_list_changed_cb, the end of a file transfer) after which the library may reuse a number
+    number_classes = {ir_class.name: ir_class for ir_class in registry.all_classes()
+                      if isinstance(ir_class.handle, IRNumberHandle)}
+    for ir_class in number_classes.values():
+        handle = ir_class.handle
+        handle.owner_chain = []
+        owner = registry.parent_of(ir_class)
+        while owner:
+            handle.owner_chain.insert(0, owner.name)
+            owner = registry.parent_of(owner)
+        handle.key_width = NUMBER_HANDLE_KEY_WIDTHS.get(handle.type.ctype.name)
+        handle.create_funcs = []
+        handle.enumerate_funcs = []
+        handle.count_funcs = []
+        handle.invalidate_funcs = [func for func_name in NUMBER_HANDLE_INVALIDATE_FUNC_NAMES
+                                   for func in registry.get_functions_by_name(ir_class, func_name)]
+        # The callbacks that the header doesn't declare are skipped, like the other rules
+        callback_classes = [registry.get_class(class_name)
+                            for class_name in rules.number_handle_invalidate_callbacks.get(ir_class.name, [])]
+        handle.invalidate_callbacks = [callback_class.functions[0] for callback_class in callback_classes
+                                       if callback_class and callback_class.is_callback]
+
+    for ir_class in registry.all_classes():
+        for func in ir_class.functions + [ir_property.getter for ir_property in ir_class.properties]:
+            return_type = func.return_type.type
+            number_class = number_classes.get(return_type.name) if return_type.contains_number_handle else None
+            if number_class:
+                handle = number_class.handle
+                (handle.enumerate_funcs if return_type.is_array else handle.create_funcs).append(func)
+        for inner_class in ir_class.inner_classes:
+            if isinstance(inner_class.handle, IRNumberHandle):
+                count_func_name = f'{pascal_case_to_snake_case(inner_class.name)}_count'
+                inner_class.handle.count_funcs.extend(registry.get_functions_by_name(ir_class, count_func_name))
+
+
+def add_callbacks(callbacks: List[IRFunction], registry: IRRegistry):
     for callback in callbacks:
-        callback_class = require_class(snake_case_to_pascal_case(callback.name), ir_classes)
+        callback_class = registry.require_class(snake_case_to_pascal_case(callback.name))
         callback_class.is_callback = True
         callback.name = 'callback'
-        callback_class.functions.append(callback)
+        registry.add_function(callback_class, callback)
 
 
 def wrap_buffer_parameters(ir_classes: List[IRClass]):
     for ir_class in ir_classes:
-        for func in ir_class.functions:
+        for func in functions_with_alloc_func(ir_class):
             new_params: List[Union[IRParam, IRBufferWrapper]] = []
             skip_param = False
             for index, ir_param in enumerate(func.params):
@@ -296,7 +437,7 @@ def wrap_buffer_parameters(ir_classes: List[IRClass]):
                 if index + 1 < len(func.params):
                     possible_length_param = func.params[index + 1]
                     if ir_param.type.is_array and not ir_param.type.get_size_func \
-                            and 'length' in possible_length_param.name:
+                            and is_buffer_length_param(possible_length_param):
                         new_params.append(IRBufferWrapper(ir_param, possible_length_param))
                         skip_param = True
                     else:
@@ -308,39 +449,59 @@ def wrap_buffer_parameters(ir_classes: List[IRClass]):
 
 
 def change_param_to_number_handle_wrapper(ir_param: IRParam, new_name: str, new_type_name: str):
-    ir_param.name = new_name
-    ir_param.type.name = new_type_name
+    ir_param.name = intern_name(new_name)
+    ir_param.type.name = intern_name(new_type_name)
     ir_param.type.contains_number_handle = True
 
 
-def move_number_holders_functions_to_inner_classes(ir_classes: List[IRClass]) -> bool:
-    found = False
-    for ir_class in ir_classes:
-        for func in [func for func in ir_class.functions]:
-            matches = [
-                ir_param for ir_param in func.params if type(ir_param) == IRParam and ir_param.name.endswith('_number')
-            ]
-            if matches:
-                found = True
-                param_match = matches[0]
-                class_snake_case_name = param_match.name.replace('_number', '')
-                ir_class_name = snake_case_to_pascal_case(class_snake_case_name)
-                if func.name == 'peer_number_is_ours' or (
-                        func.name == 'conference_invite' and ir_class.name == 'Friend'):
-                    change_param_to_number_handle_wrapper(
-                        param_match,
-                        new_name=class_snake_case_name,
-                        new_type_name=ir_class_name,
-                    )
-                else:
-                    num_holder_class = require_class(ir_class_name, ir_class.inner_classes)
-                    if not num_holder_class.handle:
-                        num_holder_class.handle = IRNumberHandle(param_match.type)
-                    func.params.remove(param_match)
-                    ir_class.functions.remove(func)
-                    num_holder_class.functions.append(func)
+def move_number_holders_functions_to_inner_classes(ir_class: IRClass, registry: IRRegistry,
+                                                   rules: GeneratorRules) -> List[IRClass]:
+    # Returns the inner classes that functions were moved to
+    changed_classes: List[IRClass] = []
+    kept_number_handle_params = rules.kept_number_handle_params.get(ir_class.name, set())
+    for func in [func for func in ir_class.functions]:
+        matches = [
+            ir_param for ir_param in func.params if type(ir_param) == IRParam and ir_param.name.endswith('_number')
+        ]
+        if matches:
+            param_match = matches[0]
+            class_snake_case_name = param_match.name.replace('_number', '')
+            ir_class_name = snake_case_to_pascal_case(class_snake_case_name)
+            if func.name in kept_number_handle_params:
+                change_param_to_number_handle_wrapper(
+                    param_match,
+                    new_name=class_snake_case_name,
+                    new_type_name=ir_class_name,
+                )
+            else:
+                num_holder_class = registry.require_class(ir_class_name, parent=ir_class)
+                if not num_holder_class.handle:
+                    num_holder_class.handle = IRNumberHandle(param_match.type)
+                func.params.remove(param_match)
+                registry.move_function(func, ir_class, num_holder_class)
+                if num_holder_class not in changed_classes:
+                    changed_classes.append(num_holder_class)
+
+    return changed_classes
+
+
+def move_number_holders_functions_until_fixpoint(registry: IRRegistry, rules: GeneratorRules):
+    # Functions moved to an inner class may have another '_number' parameter, so only the classes that received
+    # functions are visited again
+    worklist: Deque[IRClass] = deque(registry.all_classes())
+    queued: Set[int] = set(id(ir_class) for ir_class in worklist)
+    while worklist:
+        ir_class = worklist.popleft()
+        queued.discard(id(ir_class))
+        changed_classes = move_number_holders_functions_to_inner_classes(ir_class, registry, rules)
 
-    return found
+        # Remove class name as the prefix of the functions
+        optimize_functions_name_in_classes(changed_classes, registry)
+
+        for changed_class in changed_classes:
+            if id(changed_class) not in queued:
+                worklist.append(changed_class)
+                queued.add(id(changed_class))
 
 
 def convert_leftover_number_handle_function_params_to_wrappers(ir_classes: List[IRClass]):
@@ -359,61 +520,43 @@ def convert_leftover_number_handle_function_params_to_wrappers(ir_classes: List[
                 )
 
 
-def manual_handling_of_functions_returning_number_handle(ir_classes: List[IRClass]):
+def manual_handling_of_functions_returning_number_handle(ir_classes: List[IRClass], registry: IRRegistry,
+                                                         rules: GeneratorRules):
     for ir_class in ir_classes:
-        for func in ir_class.functions:
-            if func.name == 'self_get_friend_list' \
-                    or func.name == 'friend_add' \
-                    or func.name == 'friend_add_norequest' \
-                    or func.name == 'friend_by_public_key':
-                func.return_type.type.name = 'Friend'
-                func.return_type.type.contains_number_handle = True
-            elif func.name == 'conference_get_chatlist' \
-                    or func.name == 'conference_new' \
-                    or func.name == 'conference_by_id' \
-                    or func.name == 'conference_by_uid' \
-                    or func.name == 'conference_join':
-                func.return_type.type.name = 'Conference'
-                func.return_type.type.contains_number_handle = True
-            elif func.name == 'file_send':
-                func.return_type.type.name = 'File'
+        for func_name, type_name in rules.number_handle_return_types.get(ir_class.name, {}).items():
+            for func in registry.get_functions_by_name(ir_class, func_name):
+                func.return_type.type.name = intern_name(type_name)
                 func.return_type.type.contains_number_handle = True
 
 
-def manual_handling_of_functions(ir_classes: List[IRClass]):
+def manual_handling_of_functions(ir_classes: List[IRClass], registry: IRRegistry, rules: GeneratorRules):
     for ir_class in ir_classes:
-        if ir_class.name == 'ToxOptions':
-            for func in [func for func in ir_class.functions]:
-                if func.name == 'default':
-                    ir_class.functions.remove(func)
-                    ir_class.default_init = func
+        func_name = rules.default_inits.get(ir_class.name)
+        if func_name:
+            for func in registry.get_functions_by_name(ir_class, func_name):
+                registry.remove_function(ir_class, func)
+                ir_class.default_init = func
+                registry.set_function_owner(ir_class, func)
 
 
-def get_function_by_name(func_name: str, functions: List[IRFunction]) -> Optional[IRFunction]:
-    for func in functions:
-        if func.name == func_name:
-            return func
-    return None
-
-
-def convert_getters_setters_to_properties(ir_classes: List[IRClass]):
+def convert_getters_setters_to_properties(ir_classes: List[IRClass], registry: IRRegistry):
     for ir_class in ir_classes:
         for func in [func for func in ir_class.functions]:
             if GETTER_SEARCH_KEYWORD in func.name and not func.params:
                 property_name = func.name.replace(GETTER_SEARCH_KEYWORD, '')
                 setter_func_name = func.name.replace(GETTER_SEARCH_KEYWORD, SETTER_SEARCH_KEYWORD)
-                func.name = 'get'
+                registry.rename_function(ir_class, func, 'get')
                 ir_property = IRProperty(property_name)
                 ir_property.getter = func
-                setter_func = get_function_by_name(setter_func_name, ir_class.functions)
+                setter_func = registry.get_function_by_name(ir_class, setter_func_name)
                 if setter_func and len(setter_func.params) == 1:
-                    setter_func.name = 'set'
+                    registry.rename_function(ir_class, setter_func, 'set')
+                    registry.remove_function(ir_class, setter_func)
                     ir_property.setter = setter_func
-                ir_class.functions.remove(func)
-                ir_class.properties.append(ir_property)
-        setters_still_in_functions = [setter for setter in ir_class.functions if setter.name == 'set']
-        for setter in setters_still_in_functions:
-            ir_class.functions.remove(setter)
+                registry.remove_function(ir_class, func)
+                registry.add_property(ir_class, ir_property)
+        for setter in registry.get_functions_by_name(ir_class, 'set'):
+            registry.remove_function(ir_class, setter)
 
 
 def remove_bool_return_type_if_throws_exception(ir_classes: List[IRClass]):
@@ -424,201 +567,550 @@ def remove_bool_return_type_if_throws_exception(ir_classes: List[IRClass]):
                 func.return_type.type = IRType('void', True, False, CType('void', False))
 
 
-def convert_static_empty_params_functions_to_properties(ir_classes: List[IRClass]):
+def convert_static_empty_params_functions_to_properties(ir_classes: List[IRClass], registry: IRRegistry):
     for ir_class in ir_classes:
         for func in [func for func in ir_class.functions]:
             if func.is_static and not func.params:
                 property_name = func.name.replace(GETTER_SEARCH_KEYWORD, '')
-                func.name = 'get'
+                registry.rename_function(ir_class, func, 'get')
                 ir_property = IRProperty(property_name)
                 ir_property.getter = func
                 ir_property.is_static = True
-                ir_class.functions.remove(func)
-                ir_class.properties.append(ir_property)
+                registry.remove_function(ir_class, func)
+                registry.add_property(ir_class, ir_property)
 
 
-def manual_converting_of_functions_to_properties(ir_classes: List[IRClass]):
+def manual_converting_of_functions_to_properties(ir_classes: List[IRClass], registry: IRRegistry,
+                                                 rules: GeneratorRules):
     for ir_class in ir_classes:
-        for func in [func for func in ir_class.functions]:
-            if func.name == 'iteration_interval':
+        for func_name in rules.getter_properties.get(ir_class.name, []):
+            for func in registry.get_functions_by_name(ir_class, func_name):
                 property_name = func.name
-                func.name = 'get'
+                registry.rename_function(ir_class, func, 'get')
                 ir_property = IRProperty(property_name)
                 ir_property.getter = func
-                ir_class.functions.remove(func)
-                ir_class.properties.append(ir_property)
-
-
-rename_map = {
-    'Tox': {
-        'properties': {},
-        'functions': {
-            'friend_add': 'add_friend',
-            'friend_add_norequest': 'add_friend_norequest',
-            'conference_new': 'new_conference',
-        },
-    },
-    'Friend': {
-        'properties': {},
-        'functions': {
-            'file_send': 'send_file',
-        },
-    },
-    'File': {
-        'properties': {
-            'file_id': 'id',
-        },
-        'functions': {},
-    },
-    'Conference': {
-        'properties': {},
-        'functions': {
-            'peer_number_is_ours': 'peer_is_ours',
-        },
-    },
-}
+                registry.remove_function(ir_class, func)
+                registry.add_property(ir_class, ir_property)
 
 
-def manual_rename(ir_classes: List[IRClass]):
+def manual_rename(ir_classes: List[IRClass], registry: IRRegistry, rules: GeneratorRules):
     for ir_class in ir_classes:
-        for class_name, rename_spec in rename_map.items():
-            for property_name, new_property_name in rename_spec['properties'].items():
-                for ir_property in ir_class.properties:
-                    if ir_property.name == property_name:
-                        ir_property.name = new_property_name
-            for func_name, new_func_name in rename_spec['functions'].items():
-                for func in ir_class.functions:
-                    if func.name == func_name:
-                        func.name = new_func_name
+        for property_name, new_property_name in rules.renamed_properties.get(ir_class.name, {}).items():
+            for ir_property in registry.get_properties_by_name(ir_class, property_name):
+                registry.rename_property(ir_class, ir_property, new_property_name)
+        for func_name, new_func_name in rules.renamed_functions.get(ir_class.name, {}).items():
+            for func in registry.get_functions_by_name(ir_class, func_name):
+                registry.rename_function(ir_class, func, new_func_name)
 
 
-def main():
-    arg_parser = argparse.ArgumentParser(
-        formatter_class=argparse.RawDescriptionHelpFormatter,
-        description='Generate an Intermediate Representation of a Tox OOP API from c-toxcore.\n\n'
-                    f'Make sure the Tox headers are in a {HEADERS_DIR} directory. Otherwise download '
-                    'them with the --download-headers option.')
-    arg_parser.add_argument('--download-headers', action='store_true',
-                            help='download the Tox headers from the version this script supports')
-
-    if not os.path.exists(HEADERS_DIR):
-        os.mkdir(HEADERS_DIR)
-
-    supported_headers_and_base_class = {
-        'tox.h': 'Tox',
-    }
+def check_member_names(ir_classes: List[IRClass]):
+    # A function or property still named like its C function was missed by the passes removing the prefixes
+    for ir_class in ir_classes:
+        names = [func.name for func in ir_class.functions] + [ir_property.name for ir_property in ir_class.properties]
+        prefixed_names = [name for name in names if name.startswith(C_NAME_PREFIX)]
+        if prefixed_names:
+            raise RuntimeError(f'The members {", ".join(prefixed_names)} of {ir_class.name} keep the prefix '
+                               f'"{C_NAME_PREFIX}" of their C names')
+
+
+class HeaderContext:
+    def __init__(self, registry: IRRegistry, header_file: str, base_class: str,
+                 parse_cache: Optional[ParseCache] = None, rules: Optional[GeneratorRules] = None):
+        self.registry = registry
+        self.rules = rules or load_rules()
+        self.header_file = header_file
+        self.header = os.path.basename(header_file)
+        self.base_class = base_class
+        self.parse_cache = parse_cache
+        self.defs: dict = {}
+        self.ir_enums: List[IREnum] = []
+        self.ir_functions: List[IRFunction] = []
+        self.known_structs: Set[str] = set()
+
+
+def parse_header(ctx: HeaderContext):
+    if ctx.parse_cache:
+        ctx.defs = ctx.parse_cache.parse(ctx.header_file)
+    else:
+        parser = CParser(ctx.header_file, cache=f'{ctx.header_file}.cache')
+        ctx.defs = parser.file_defs[ctx.header]
+    ctx.known_structs = set(ctx.defs['structs'].keys())
+
+
+def parse_header_enums(ctx: HeaderContext):
+    enums_defs: dict = ctx.defs['enums']
+    ctx.ir_enums = parse_enums(enums_defs)
+    ctx.registry.enums.extend(ctx.ir_enums)
+
+
+def create_header_exceptions(ctx: HeaderContext):
+    # Create exceptions when the enums represent errors (name starts with 'ToxErr')
+    header_error_ir_enums = filter(lambda ir_enum: ir_enum.name.startswith('ToxErr'), ctx.ir_enums)
+    header_ir_exceptions: List[IRException] = list(map(
+        lambda ir_enum: IRException(
+            name=intern_name(ir_enum.name.replace('ToxErr', 'Tox')),
+            enum_name=ir_enum.name
+        ),
+        header_error_ir_enums,
+    ))
+    ctx.registry.add_exceptions(header_ir_exceptions)
+
+
+def parse_header_functions(ctx: HeaderContext):
+    # Parse functions to IR as they are
+    functions_defs: dict = ctx.defs['functions']
+    ir_functions: List[IRFunction] = parse_functions(functions_defs)
+    ctx.ir_functions = [ir_function for ir_function in ir_functions if 'operating_system' not in ir_function.name]
+
+
+def add_header_callbacks(ctx: HeaderContext):
+    callbacks_defs = {type_name: type_def for type_name, type_def in ctx.defs['types'].items() if
+                      type_name.endswith('_cb')}
+    callback_functions: List[IRFunction] = parse_functions(callbacks_defs)
+    add_callbacks(callback_functions, ctx.registry)
+
+
+def create_header_pipeline() -> PassManager:
+    pipeline = PassManager()
+    pipeline.add('parse_header', parse_header)
+    pipeline.add('parse_enums', parse_header_enums, depends_on=['parse_header'])
+    pipeline.add('create_exceptions', create_header_exceptions, depends_on=['parse_enums'])
+    pipeline.add('parse_functions', parse_header_functions, depends_on=['parse_header'])
+    pipeline.add('convert_functions_error_code_to_exception',
+                 lambda ctx: convert_functions_error_code_to_exception(ctx.ir_functions, ctx.registry),
+                 depends_on=['create_exceptions', 'parse_functions'])
+    # Move struct allocation functions (return type is a struct and name contains 'new' or 'derive') to the
+    # corresponding classes
+    pipeline.add('move_struct_alloc_functions_to_class',
+                 lambda ctx: move_struct_alloc_functions_to_class(ctx.ir_functions, ctx.registry, ctx.known_structs),
+                 depends_on=['convert_functions_error_code_to_exception'])
+    # Move struct functions (first parameter is a struct) to the corresponding classes
+    pipeline.add('move_struct_functions_to_class',
+                 lambda ctx: move_struct_functions_to_class(ctx.ir_functions, ctx.registry, ctx.known_structs),
+                 depends_on=['move_struct_alloc_functions_to_class'])
+    pipeline.add('move_leftover_functions_to_base_class',
+                 lambda ctx: move_leftover_functions_to_base_class(ctx.base_class, ctx.ir_functions, ctx.registry),
+                 depends_on=['move_struct_functions_to_class'])
+    # Remove class name as the prefix of the functions
+    pipeline.add('optimize_functions_name_in_classes',
+                 lambda ctx: optimize_functions_name_in_classes(ctx.registry.classes, ctx.registry),
+                 depends_on=['move_leftover_functions_to_base_class'])
+    # Move functions that their currently first parameter name ends with '_number'
+    # to an inner class that should contain that parameter as a field
+    pipeline.add('move_number_holders_functions_to_inner_classes',
+                 lambda ctx: move_number_holders_functions_until_fixpoint(ctx.registry, ctx.rules),
+                 depends_on=['optimize_functions_name_in_classes'])
+    pipeline.add('add_callbacks', add_header_callbacks,
+                 depends_on=['move_number_holders_functions_to_inner_classes'])
+    pipeline.add('convert_leftover_number_handle_function_params_to_wrappers',
+                 lambda ctx: convert_leftover_number_handle_function_params_to_wrappers(ctx.registry.all_classes()),
+                 depends_on=['add_callbacks'])
+    pipeline.add('set_buffer_size_func_to_return_types',
+                 lambda ctx: set_buffer_size_func_to_return_types(ctx.registry.all_classes(), ctx.registry, ctx.rules),
+                 depends_on=['convert_leftover_number_handle_function_params_to_wrappers'])
+    pipeline.add('optimize_buffer_getters',
+                 lambda ctx: optimize_buffer_getters(ctx.registry.all_classes(), ctx.registry, ctx.rules),
+                 depends_on=['set_buffer_size_func_to_return_types'])
+    pipeline.add('optimize_buffer_setters',
+                 lambda ctx: optimize_buffer_setters(ctx.registry.all_classes(), ctx.registry, ctx.rules),
+                 depends_on=['optimize_buffer_getters'])
+    pipeline.add('manual_buffer_size_func',
+                 lambda ctx: manual_buffer_size_func(ctx.registry.all_classes(), ctx.registry, ctx.rules),
+                 depends_on=['optimize_buffer_setters'])
+    pipeline.add('wrap_buffer_parameters',
+                 lambda ctx: wrap_buffer_parameters(ctx.registry.all_classes()),
+                 depends_on=['manual_buffer_size_func'])
+    pipeline.add('set_buffer_size_func_to_params',
+                 lambda ctx: set_buffer_size_func_to_params(ctx.registry.all_classes(), ctx.registry),
+                 depends_on=['wrap_buffer_parameters'])
+    # The returned arrays of number handles are those that optimize_buffer_getters() made of a getter's buffer param
+    pipeline.add('manual_handling_of_functions_returning_number_handle',
+                 lambda ctx: manual_handling_of_functions_returning_number_handle(ctx.registry.all_classes(), ctx.registry,
+                                                                                  ctx.rules),
+                 depends_on=['convert_leftover_number_handle_function_params_to_wrappers', 'optimize_buffer_getters'])
+    # The default init function leaves the functions of its class once the buffer passes saw every function
+    pipeline.add('manual_handling_of_functions',
+                 lambda ctx: manual_handling_of_functions(ctx.registry.all_classes(), ctx.registry, ctx.rules),
+                 depends_on=['move_number_holders_functions_to_inner_classes', 'set_buffer_size_func_to_params'])
+    pipeline.add('set_buffer_ownership',
+                 lambda ctx: set_buffer_ownership(ctx.registry.all_classes(), ctx.rules),
+                 depends_on=['set_buffer_size_func_to_params', 'manual_handling_of_functions_returning_number_handle',
+                             'manual_handling_of_functions'])
+    pipeline.add('convert_getters_setters_to_properties',
+                 lambda ctx: convert_getters_setters_to_properties(ctx.registry.all_classes(), ctx.registry),
+                 depends_on=['set_buffer_ownership'])
+    # The setters of properties keep their bool return type; the functions left lose it before the static ones
+    # become properties too
+    pipeline.add('remove_bool_return_type_if_throws_exception',
+                 lambda ctx: remove_bool_return_type_if_throws_exception(ctx.registry.all_classes()),
+                 depends_on=['convert_functions_error_code_to_exception', 'optimize_buffer_getters',
+                             'optimize_buffer_setters', 'convert_getters_setters_to_properties'])
+    pipeline.add('convert_static_empty_params_functions_to_properties',
+                 lambda ctx: convert_static_empty_params_functions_to_properties(ctx.registry.all_classes(),
+                                                                                 ctx.registry),
+                 depends_on=['convert_getters_setters_to_properties', 'remove_bool_return_type_if_throws_exception'])
+    pipeline.add('manual_converting_of_functions_to_properties',
+                 lambda ctx: manual_converting_of_functions_to_properties(ctx.registry.all_classes(), ctx.registry,
+                                                                          ctx.rules),
+                 depends_on=['convert_static_empty_params_functions_to_properties'])
+    pipeline.add('manual_rename',
+                 lambda ctx: manual_rename(ctx.registry.all_classes(), ctx.registry, ctx.rules),
+                 depends_on=['manual_converting_of_functions_to_properties'])
+    pipeline.add('add_batch_layouts',
+                 lambda ctx: add_batch_layouts(ctx.registry.all_classes(), ctx.registry),
+                 depends_on=['manual_rename'])
+    pipeline.add('add_struct_layouts',
+                 lambda ctx: add_struct_layouts(ctx.registry.all_classes(), ctx.defs['structs'], ctx.rules),
+                 depends_on=['manual_rename'])
+    pipeline.add('add_number_handle_metadata',
+                 lambda ctx: add_number_handle_metadata(ctx.registry, ctx.rules),
+                 depends_on=['manual_rename', 'manual_handling_of_functions_returning_number_handle'])
+    pipeline.add('fold_constant_buffer_sizes',
+                 lambda ctx: fold_constant_buffer_sizes(ctx.registry.all_classes(), ctx.defs['values']),
+                 depends_on=['convert_getters_setters_to_properties'])
+    pipeline.add('check_member_names',
+                 lambda ctx: check_member_names(ctx.registry.all_classes()),
+                 depends_on=['manual_rename'])
+    return pipeline
+
+
+def generate_header_ir(header_file: str, header_pipeline: Optional[PassManager] = None,
+                       parse_cache: Optional[ParseCache] = None, rules: Optional[GeneratorRules] = None) -> IRRegistry:
+    registry = IRRegistry()
+    base_class = SUPPORTED_HEADERS_AND_BASE_CLASS[os.path.basename(header_file)]
+    (header_pipeline or create_header_pipeline()).run(HeaderContext(registry, header_file, base_class, parse_cache,
+                                                                    rules))
+    return registry
+
+
+def generate_header_ir_in_worker(header_file: str, parse_cache: Optional[ParseCache],
+                                 rules: Optional[GeneratorRules]) -> bytes:
+    return dump_ir(generate_header_ir(header_file, parse_cache=parse_cache, rules=rules), IR_CONSTANTS)
+
+
+def generate_ir(header_files: List[str], registry: IRRegistry, header_pipeline: PassManager,
+                build_cache: Optional[BuildCache] = None, jobs: int = 1, parse_cache: Optional[ParseCache] = None,
+                rules: Optional[GeneratorRules] = None):
+    # Every header is generated into its own IR. With more than one job the headers are generated in worker processes
+    # (where the hooks of header_pipeline don't run). The IRs are merged in the order of header_files, so the result
+    # doesn't depend on the order the workers finish in.
+    header_keys: List[str] = build_cache.header_keys(header_files) if build_cache else []
+    fragments: Dict[int, IRFragment] = {}
+    pending_indexes: List[int] = []
+    for index in range(len(header_files)):
+        cached_ir = build_cache.load_ir(header_keys[index]) if build_cache else None
+        if cached_ir:
+            fragments[index] = cached_ir
+        else:
+            pending_indexes.append(index)
+
+    if jobs > 1 and len(pending_indexes) > 1:
+        with ProcessPoolExecutor(max_workers=min(jobs, len(pending_indexes))) as executor:
+            futures = {executor.submit(generate_header_ir_in_worker, header_files[index], parse_cache, rules): index
+                       for index in pending_indexes}
+            for future in as_completed(futures):
+                index = futures[future]
+                data = future.result()
+                if build_cache:
+                    build_cache.store_ir(header_keys[index], data)
+                fragments[index] = load_ir(data, IR_CONSTANTS)
+    else:
+        for index in pending_indexes:
+            header_registry = generate_header_ir(header_files[index], header_pipeline, parse_cache, rules)
+            if build_cache:
+                build_cache.store_ir(header_keys[index], dump_ir(header_registry, IR_CONSTANTS))
+            fragments[index] = (header_registry.enums, header_registry.exceptions, header_registry.classes)
 
-    args = arg_parser.parse_args()
-    if args.download_headers:
-        headers_to_download = ['toxcore/tox.h']
-        download_headers(HEADERS_DIR, 'v' + TOX_VERSION, headers_to_download)
+    for index in range(len(header_files)):
+        registry.merge(*fragments[index])
 
-    ir_enums: List[IREnum] = []
-    ir_exceptions: List[IRException] = []
-    ir_classes: List[IRClass] = []
 
-    headers = [header for header in os.listdir(HEADERS_DIR) if header.endswith('.h')]
+def find_header_files(headers_dir: str) -> List[str]:
+    headers = [header for header in os.listdir(headers_dir) if header.endswith('.h')]
     if not headers:
-        print(f'There are no headers in the {HEADERS_DIR} folder. Make sure to download them either with the '
+        print(f'There are no headers in the {headers_dir} folder. Make sure to download them either with the '
               '--download-headers option or manually.')
         exit(1)
     for header in headers:
-        if header not in supported_headers_and_base_class.keys():
-            print(f'The header {header} is not supported. Please remove it from the {HEADERS_DIR} directory.')
+        if header not in SUPPORTED_HEADERS_AND_BASE_CLASS.keys():
+            print(f'The header {header} is not supported. Please remove it from the {headers_dir} directory.')
             exit(1)
-        header_file = f'{HEADERS_DIR}/{header}'
-        parser = CParser(header_file, cache=f'{header_file}.cache')
-        defs: dict = parser.file_defs[header]
-
-        # Parse enums
-        enums_defs: dict = defs['enums']
-        header_ir_enums: List[IREnum] = parse_enums(enums_defs)
-        ir_enums.extend(header_ir_enums)
-
-        # Create exceptions when the enums represent errors (name starts with 'ToxErr')
-        header_error_ir_enums = filter(lambda ir_enum: ir_enum.name.startswith('ToxErr'), header_ir_enums)
-        header_ir_exceptions: List[IRException] = list(map(
-            lambda ir_enum: IRException(
-                name=ir_enum.name.replace('ToxErr', 'Tox'),
-                enum_name=ir_enum.name
-            ),
-            header_error_ir_enums,
-        ))
-        ir_exceptions.extend(header_ir_exceptions)
-
-        # Parse functions to IR as they are
-        functions_defs: dict = defs['functions']
-        ir_functions: List[IRFunction] = parse_functions(functions_defs)
-        ir_functions = [ir_function for ir_function in ir_functions if 'operating_system' not in ir_function.name]
-
-        convert_functions_error_code_to_exception(ir_functions, ir_exceptions)
+    return [f'{headers_dir}/{header}' for header in sorted(headers)]
 
-        known_structs = list(defs['structs'].keys())
 
-        # Move struct allocation functions (return type is a struct and name contains 'new') to the corresponding classes
-        move_struct_alloc_functions_to_class(ir_functions, ir_classes, known_structs)
+def write_shards(args: argparse.Namespace, output_dir: str, metadata: Dict[str, str], enums: List[IREnum],
+                 exceptions: List[IRException], classes: List[IRClass], jobs: int):
+    write_ir_shards(f'{output_dir}/{OUTPUT_FILENAME}', metadata, enums, exceptions, classes,
+                    deduplicate=args.deduplicate, string_table=args.string_table, compress=args.gzip, jobs=jobs)
 
-        # Move struct functions (first parameter is a struct) to the corresponding classes
-        move_struct_functions_to_class(ir_functions, ir_classes, known_structs)
 
-        move_leftover_functions_to_base_class(supported_headers_and_base_class[header], ir_functions, ir_classes)
+def generate_version(args: argparse.Namespace, tox_version: str, headers_dir: str, output_dir: str,
+                     build_cache: Optional[BuildCache], parse_cache: Optional[ParseCache], jobs: int,
+                     rules: GeneratorRules):
+    registry = IRRegistry()
+    header_pipeline = create_header_pipeline()
 
-        # Remove class name as the prefix of the functions
-        optimize_functions_name_in_classes(ir_classes)
-
-        found_number_holders_functions = True
-        while found_number_holders_functions:
-            # Move functions that their currently first parameter name ends with '_number'
-            # to an inner class that should contain that parameter as a field
-            found_number_holders_functions = move_number_holders_functions_to_inner_classes(
-                get_all_ir_classes(ir_classes))
-
-            # Remove class name as the prefix of the functions
-            optimize_functions_name_in_classes(get_all_ir_classes(ir_classes))
-
-        callbacks_defs = {type_name: type_def for type_name, type_def in defs['types'].items() if
-                          type_name.endswith('_cb')}
-        callback_functions: List[IRFunction] = parse_functions(callbacks_defs)
-        add_callbacks(callback_functions, ir_classes)
-
-        convert_leftover_number_handle_function_params_to_wrappers(get_all_ir_classes(ir_classes))
-
-        set_buffer_size_func_to_return_types(get_all_ir_classes(ir_classes))
-
-        optimize_buffer_getters(get_all_ir_classes(ir_classes))
-        optimize_buffer_setters(get_all_ir_classes(ir_classes))
-
-        manual_buffer_size_func(get_all_ir_classes(ir_classes))
+    profiler: Optional[PassProfiler] = None
+    if args.profile_passes:
+        profiler = PassProfiler(registry)
+        header_pipeline.add_hook(profiler)
+        profiler.start()
 
-        wrap_buffer_parameters(get_all_ir_classes(ir_classes))
+    header_files = find_header_files(headers_dir)
 
-        set_buffer_size_func_to_params(get_all_ir_classes(ir_classes))
-
-        manual_handling_of_functions_returning_number_handle(get_all_ir_classes(ir_classes))
-        manual_handling_of_functions(get_all_ir_classes(ir_classes))
-
-        convert_getters_setters_to_properties(get_all_ir_classes(ir_classes))
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+    output_extension = '.json' + ('.gz' if args.gzip else '')
+    output_file = f'{output_dir}/{OUTPUT_FILENAME}{output_extension}'
+    output_extensions = [output_extension] + ([BINARY_OUTPUT_EXTENSION] if args.binary else [])
+    metadata = {
+        'ir_version': IR_VERSION,
+        'tox_version': tox_version,
+    }
 
-        remove_bool_return_type_if_throws_exception(get_all_ir_classes(ir_classes))
+    output_key = ''
+    if build_cache:
+        output_key = build_cache.output_key(build_cache.header_keys(header_files),
+                                            f'tox_version={tox_version}\0deduplicate={args.deduplicate}\0'
+                                            f'string_table={args.string_table}')
+        if all([build_cache.load_output(output_key, extension, f'{output_dir}/{OUTPUT_FILENAME}{extension}')
+                for extension in output_extensions]):
+            if args.shards:
+                # Only the shards that differ from the restored output are written
+                restored_ir = load_ir_json(output_file)
+                write_shards(args, output_dir, metadata, restored_ir.enums, restored_ir.exceptions,
+                             restored_ir.classes, jobs)
+            print(f'The headers are unchanged, the output in {output_dir} was restored from the build cache.')
+            return
+
+    generate_ir(header_files, registry, header_pipeline, build_cache, jobs, parse_cache, rules)
+
+    # The outputs are written next to the old ones and replace them when complete, so readers never see a partial IR
+    with header_pipeline.stage('serialize', registry):
+        with open_ir_output(f'{output_file}.tmp', compress=args.gzip) as f:
+            write_ir_json(f, metadata, registry.enums, registry.exceptions, registry.classes,
+                          deduplicate=args.deduplicate, index=build_ir_index(registry.enums, registry.classes),
+                          string_table=args.string_table)
+        os.replace(f'{output_file}.tmp', output_file)
+    if args.binary:
+        with header_pipeline.stage('serialize_binary', registry):
+            binary_output_file = f'{output_dir}/{OUTPUT_FILENAME}{BINARY_OUTPUT_EXTENSION}'
+            with open(f'{binary_output_file}.tmp', 'wb') as f:
+                write_ir_binary(f, metadata, registry.enums, registry.exceptions, registry.classes)
+            os.replace(f'{binary_output_file}.tmp', binary_output_file)
+    if args.shards:
+        with header_pipeline.stage('serialize_shards', registry):
+            write_shards(args, output_dir, metadata, registry.enums, registry.exceptions, registry.classes, jobs)
+    if build_cache:
+        for extension in output_extensions:
+            build_cache.store_output(output_key, extension, f'{output_dir}/{OUTPUT_FILENAME}{extension}')
+
+    if profiler:
+        profiler.stop()
+        profiler.write_report(f'{output_dir}/{OUTPUT_FILENAME}.profile.json', metadata)
+        profiler.print_summary(sys.stderr)
+
+
+def create_build_cache(args: argparse.Namespace, rules: GeneratorRules) -> BuildCache:
+    # The IR of a header doesn't depend on the Tox version, so headers that are the same in many versions are
+    # generated once. Without the build cache they are still shared within the run.
+    return BuildCache(
+        directory=None if args.no_cache else CACHE_DIR,
+        salt=f'{IR_VERSION}\0{hash_generator_sources(os.path.dirname(os.path.abspath(__file__)))}\0'
+             f'{rules.source_hash}',
+        size_limit=args.cache_size_limit * 1024 * 1024,
+        # Profiling measures the passes, so nothing is read from the cache then
+        read=not args.rebuild and not args.profile_passes,
+        constants=IR_CONSTANTS,
+    )
+
+
+def get_file_state(path: str) -> Optional[Tuple[int, int]]:
+    # None for a file that is missing, e.g. while an editor renames it away to save it
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def get_header_states(headers_dir: str) -> Dict[str, Tuple[int, int]]:
+    # A header that disappears after it was listed is absent
+    states = {header: get_file_state(f'{headers_dir}/{header}')
+              for header in os.listdir(headers_dir) if header.endswith('.h')}
+    return {header: state for header, state in states.items() if state is not None}
+
+
+def get_generator_source_states() -> Dict[str, Optional[Tuple[int, int]]]:
+    generator_dir = os.path.dirname(os.path.abspath(__file__))
+    return {source: get_file_state(f'{generator_dir}/{source}')
+            for source in os.listdir(generator_dir) if source.endswith('.py')}
+
+
+def watch(args: argparse.Namespace, versions: List[Tuple[str, str, str]], rules: GeneratorRules,
+          build_cache: BuildCache, parse_cache: Optional[ParseCache]):
+    # Polls the headers and regenerates the IR of a version when its headers changed and stayed the same for one
+    # interval (editors write files in more than one step). The IRs of the unchanged headers come from the build cache
+    # and the declarations parsed before are reused, so only the changed declarations are parsed again.
+    # When the rule file changes, the rules are loaded again and every version is regenerated. The generator's code
+    # can't be reloaded safely, so the script restarts when it changes. Parsed headers are in the parse cache, so the
+    # restart doesn't parse them again.
+    generated_states = {headers_dir: get_header_states(headers_dir) for _, headers_dir, _ in versions}
+    last_states = dict(generated_states)
+    source_states = get_generator_source_states()
+    rules_state = get_file_state(args.rules)
+    print(f'Watching {", ".join(generated_states)} and {args.rules} for changes, press Ctrl+C to stop.', flush=True)
+    try:
+        while True:
+            time.sleep(args.watch_interval)
+            new_source_states = get_generator_source_states()
+            # The restart waits until a source that is being saved is back
+            if new_source_states != source_states and None not in new_source_states.values():
+                print('The generator changed, restarting.', flush=True)
+                os.execv(sys.executable, [sys.executable] + sys.argv)
+
+            rules_changed = False
+            new_rules_state = get_file_state(args.rules)
+            # A missing rule file is being saved, it's loaded once it's back
+            if new_rules_state is not None and new_rules_state != rules_state:
+                rules_state = new_rules_state
+                try:
+                    rules = load_rules(args.rules)
+                    build_cache = create_build_cache(args, rules)
+                    rules_changed = True
+                except (OSError, RuntimeError) as e:
+                    print(f'The rules were not reloaded: {e}', file=sys.stderr, flush=True)
+
+            for tox_version, headers_dir, output_dir in versions:
+                states = get_header_states(headers_dir)
+                if states != last_states[headers_dir]:
+                    last_states[headers_dir] = states
+                    continue
+                if states == generated_states[headers_dir] and not rules_changed:
+                    continue
+                changed_headers = sorted(header for header in set(states) | set(generated_states[headers_dir])
+                                         if states.get(header) != generated_states[headers_dir].get(header))
+                if rules_changed:
+                    changed_headers.append(os.path.basename(args.rules))
+                generated_states[headers_dir] = states
+
+                start = time.perf_counter()
+                try:
+                    generate_version(args, tox_version, headers_dir, output_dir, build_cache, parse_cache, 1, rules)
+                except (Exception, SystemExit) as e:
+                    # A header that is being edited may not parse, the next change is tried again
+                    print(f'Generating {output_dir} after changes to {", ".join(changed_headers)} failed: {e!r}',
+                          file=sys.stderr, flush=True)
+                    continue
+                print(f'Regenerated {output_dir} after changes to {", ".join(changed_headers)} in '
+                      f'{(time.perf_counter() - start) * 1000:.0f} ms', flush=True)
+    except KeyboardInterrupt:
+        pass
 
-        convert_static_empty_params_functions_to_properties(get_all_ir_classes(ir_classes))
 
-        manual_converting_of_functions_to_properties(get_all_ir_classes(ir_classes))
+def main():
+    arg_parser = argparse.ArgumentParser(
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        description='Generate an Intermediate Representation of a Tox OOP API from c-toxcore.\n\n'
+                    f'Make sure the Tox headers are in a {HEADERS_DIR} directory. Otherwise download '
+                    'them with the --download-headers option.')
+    arg_parser.add_argument('--download-headers', action='store_true',
+                            help='download the Tox headers from the version this script supports')
+    arg_parser.add_argument('--headers-from-git', metavar='REPO',
+                            help='copy the Tox headers of the version this script supports from a local clone or '
+                                 'mirror of c-toxcore instead of downloading them')
+    arg_parser.add_argument('--headers-from-tarball', metavar='TARBALL',
+                            help='extract the Tox headers from a c-toxcore release tarball instead of downloading '
+                                 'them, {version} in the path is replaced with the Tox version')
+    arg_parser.add_argument('--tarball-sha256', metavar='SHA256',
+                            help='expected SHA-256 of the tarball of --headers-from-tarball')
+    arg_parser.add_argument('--versions', type=lambda versions: versions.split(','), metavar='VERSION,...',
+                            help='generate an IR for each of these Tox versions from the headers in '
+                                 f'{HEADERS_DIR}/<version> to {OUTPUT_DIR}/<version>, parsing the declarations that '
+                                 'are the same in many versions once')
+    arg_parser.add_argument('--rules', default=RULES_FILE, metavar='FILE',
+                            help='file of the renames and other special cases of the generator (default: %(default)s)')
+    arg_parser.add_argument('--watch', action='store_true',
+                            help='stay running and regenerate the IR whenever the headers change')
+    arg_parser.add_argument('--watch-interval', type=float, default=0.1, metavar='SECONDS',
+                            help='how often --watch checks the headers for changes (default: %(default)s)')
+    arg_parser.add_argument('--profile-passes', action='store_true',
+                            help='measure the time, memory and IR size of every pipeline stage and write a report '
+                                 'next to the output')
+    arg_parser.add_argument('--deduplicate', action='store_true',
+                            help='write every object that is used in more than one place (e.g. size functions) '
+                                 'once in the "shared" section and refer to it by its id elsewhere')
+    arg_parser.add_argument('--string-table', action='store_true',
+                            help='write every name once in the "strings" section and refer to it by its index '
+                                 'elsewhere')
+    arg_parser.add_argument('--gzip', action='store_true', help='compress the output with gzip')
+    arg_parser.add_argument('--binary', action='store_true',
+                            help='also write the IR in the binary format, which can be read lazily with ir_binary')
+    arg_parser.add_argument('--shards', action='store_true',
+                            help=f'also write the IR split in a file per top-level class, one for the enums and one '
+                                 f'for the exceptions, listed with their SHA-256 in '
+                                 f'{OUTPUT_DIR}/{OUTPUT_FILENAME}/manifest.json')
+    arg_parser.add_argument('--jobs', type=int, default=os.cpu_count() or 1,
+                            help='number of processes that generate headers in parallel (default: %(default)s)')
+    arg_parser.add_argument('--parse-cache-dir', default=default_parse_cache_dir(), metavar='DIR',
+                            help='directory of the parsed headers cache, shared by every checkout and Tox version '
+                                 '(default: %(default)s)')
+    arg_parser.add_argument('--parse-cache-size-limit', type=int,
+                            default=DEFAULT_PARSE_CACHE_SIZE_LIMIT // (1024 * 1024), metavar='MIB',
+                            help='size limit of the parsed headers cache, the least recently used entries are removed '
+                                 'above it (default: %(default)s)')
+    arg_parser.add_argument('--no-parse-cache', action='store_true',
+                            help='parse the headers with pyclibrary\'s own cache next to them instead')
+    arg_parser.add_argument('--no-cache', action='store_true',
+                            help=f'don\'t read or write the build cache in the {CACHE_DIR} directory')
+    arg_parser.add_argument('--rebuild', action='store_true',
+                            help='generate everything again and replace the build cache entries')
+    arg_parser.add_argument('--cache-size-limit', type=int, default=DEFAULT_CACHE_SIZE_LIMIT // (1024 * 1024),
+                            metavar='MIB', help='size limit of the build cache, the least recently used entries are '
+                                                'removed above it (default: %(default)s)')
 
-        manual_rename(get_all_ir_classes(ir_classes))
+    if not os.path.exists(HEADERS_DIR):
+        os.mkdir(HEADERS_DIR)
 
-    # Construct final JSON
-    root = {
-        'ir_version': IR_VERSION,
-        'tox_version': TOX_VERSION,
-        'enums': todict(ir_enums),
-        'exceptions': todict(ir_exceptions),
-        'classes': todict(ir_classes),
-    }
-    if not os.path.exists(OUTPUT_DIR):
-        os.mkdir(OUTPUT_DIR)
-    with open(f'{OUTPUT_DIR}/{OUTPUT_FILENAME}.json', 'w') as f:
-        f.write(json.dumps(root))
+    args = arg_parser.parse_args()
+    versions: List[Tuple[str, str, str]] = [(TOX_VERSION, HEADERS_DIR, OUTPUT_DIR)]
+    if args.versions:
+        versions = [(version, f'{HEADERS_DIR}/{version}', f'{OUTPUT_DIR}/{version}') for version in args.versions]
+    if args.download_headers or args.headers_from_git or args.headers_from_tarball:
+        headers_to_download = ['toxcore/tox.h', 'toxencryptsave/toxencryptsave.h']
+        for tox_version, headers_dir, _ in versions:
+            if not os.path.exists(headers_dir):
+                os.mkdir(headers_dir)
+            # Only the headers that changed since the last time are written
+            if args.headers_from_git:
+                read_headers_from_git(headers_dir, args.headers_from_git, 'v' + tox_version, headers_to_download)
+            elif args.headers_from_tarball:
+                read_headers_from_tarball(headers_dir, args.headers_from_tarball.replace('{version}', tox_version),
+                                          headers_to_download, args.tarball_sha256)
+            else:
+                download_headers(headers_dir, 'v' + tox_version, headers_to_download)
+
+    rules = load_rules(args.rules)
+    build_cache = create_build_cache(args, rules)
+    parse_cache: Optional[ParseCache] = None
+    if not args.no_parse_cache:
+        # Like the build cache, the parse cache isn't read when profiling, so parsing is measured
+        parse_cache = ParseCache(args.parse_cache_dir, DeclarationParser() if args.versions or args.watch else None,
+                                 read=not args.profile_passes,
+                                 size_limit=args.parse_cache_size_limit * 1024 * 1024)
+    # The passes are profiled in this process. Versions (and the regenerations of --watch) are generated in this process
+    # one after another, so they share the declarations that were already parsed.
+    jobs = 1 if args.profile_passes or args.versions or args.watch else args.jobs
+
+    for tox_version, headers_dir, output_dir in versions:
+        generate_version(args, tox_version, headers_dir, output_dir, build_cache, parse_cache, jobs, rules)
+    if parse_cache and parse_cache.declaration_parser and parse_cache.declaration_parser.parsed_count:
+        declaration_parser = parse_cache.declaration_parser
+        print(f'Parsed {declaration_parser.parsed_count} declarations, reused {declaration_parser.reused_count} '
+              'declarations that were the same in other headers.')
+
+    if args.watch:
+        watch(args, versions, rules, build_cache, parse_cache)
 
 
 if __name__ == '__main__':
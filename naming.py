@@ -0,0 +1,29 @@
+from functools import lru_cache
+import re
+import sys
+
+# Position before every capital letter except the first one
+PASCAL_CASE_WORD_START_PATTERN = re.compile(r'(?<!^)(?=[A-Z])')
+
+
+# The names of the IR (C names, type names, parameter names...) repeat many times, so every name is interned: equal
+# names are a single string object. The conversions between naming conventions are memoized and return interned names.
+
+def intern_name(name: str) -> str:
+    return sys.intern(name)
+
+
+@lru_cache(maxsize=None)
+def optimize_ctype_name(ctype_name: str) -> str:
+    return sys.intern(ctype_name.replace('struct ', ''))
+
+
+@lru_cache(maxsize=None)
+def snake_case_to_pascal_case(string: str) -> str:
+    return sys.intern(''.join(word[0].upper() + word[1:] for word in string.split('_')))
+
+
+# https://stackoverflow.com/a/1176023
+@lru_cache(maxsize=None)
+def pascal_case_to_snake_case(ir_class_name: str) -> str:
+    return sys.intern(PASCAL_CASE_WORD_START_PATTERN.sub('_', ir_class_name).lower())
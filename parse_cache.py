@@ -0,0 +1,176 @@
+from typing import Any, Dict, List, Optional
+from collections import OrderedDict
+from pyclibrary import CParser
+from build_cache import evict_least_recently_used, touch
+import hashlib
+import os
+import pickle
+import re
+import zlib
+
+PARSE_CACHE_FORMAT_VERSION = 2
+PARSE_CACHE_MAGIC = b'TOXPARSE'
+PARSE_CACHE_EXTENSION = '.defs'
+DEFAULT_PARSE_CACHE_SIZE_LIMIT = 64 * 1024 * 1024
+# The number of declarations a DeclarationParser keeps, about ten Tox versions of tox.h
+DEFAULT_MAX_DECLARATIONS = 10000
+
+# The parts of CParser.file_defs that the generator uses
+USED_DEFS = ('enums', 'functions', 'structs', 'types', 'values')
+
+# Quoted strings are matched first so comment markers inside them are kept, like in CParser.remove_comments()
+COMMENT_PATTERN = re.compile(r'("(?:[^"\\\n]|\\.)*"|\'(?:[^\'\\\n]|\\.)*\')|/\*.*?\*/|//[^\n]*', re.DOTALL)
+IDENTIFIER_PATTERN = re.compile(r'[A-Za-z_][A-Za-z0-9_]*')
+
+
+def default_parse_cache_dir() -> str:
+    cache_home = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(cache_home, 'tox-oop-api-ir', 'parse')
+
+
+def remove_comments(text: str) -> str:
+    # The same as CParser.remove_comments() but much faster than its pyparsing grammar
+    return COMMENT_PATTERN.sub(lambda match: match.group(1) or '', text)
+
+
+def split_declarations(text: str) -> List[str]:
+    # Splits preprocessed C code at every ';' outside of braces
+    declarations: List[str] = []
+    depth = 0
+    start = 0
+    for match in re.finditer(r'[{};]', text):
+        char = match.group()
+        if char == '{':
+            depth += 1
+        elif char == '}':
+            depth -= 1
+        elif depth == 0:
+            declarations.append(text[start:match.end()].strip())
+            start = match.end()
+    if text[start:].strip():
+        declarations.append(text[start:].strip())
+    return declarations
+
+
+# Parses headers declaration by declaration and parses every declaration once, also when it appears in many headers
+# (e.g. in the headers of different Tox versions). A declaration is reused when its text and the values of the
+# constants it refers to are the same. The least recently used declarations are dropped above max_declarations, so
+# a long --watch session doesn't keep every version of the declarations it parsed.
+class DeclarationParser:
+    def __init__(self, max_declarations: int = DEFAULT_MAX_DECLARATIONS):
+        self._declarations: 'OrderedDict[str, Dict[str, Dict[str, Any]]]' = OrderedDict()
+        self.max_declarations = max_declarations
+        self.parsed_count = 0
+        self.reused_count = 0
+
+    def parse(self, header_file: str) -> dict:
+        parser = CParser(header_file, process_all=False)
+        parser.files[header_file] = remove_comments(parser.files[header_file])
+        parser.preprocess(header_file)
+        header = os.path.basename(header_file)
+        if len(parser.pack_list[header_file]) > 1:
+            # Struct packing depends on the line of the struct, so the header is parsed as a whole
+            parser.parse_defs(header_file)
+            return parser.file_defs.get(header, {kind: {} for kind in parser.data_list})
+
+        text = parser.files[header_file]
+        defs: Dict[str, Dict[str, Any]] = {kind: {} for kind in parser.data_list}
+        for kind, kind_defs in parser.file_defs.get(header, {}).items():
+            defs[kind].update(kind_defs)
+        for declaration in split_declarations(text):
+            values = parser.defs['values']
+            key = declaration + '\0' + repr(sorted((name, values[name]) for name in
+                                                   set(IDENTIFIER_PATTERN.findall(declaration)) if name in values))
+            declaration_defs = self._declarations.get(key)
+            if declaration_defs is None:
+                parser.file_defs = {}
+                parser.files[header_file] = declaration
+                parser.parse_defs(header_file)
+                declaration_defs = parser.file_defs.get(header, {})
+                self._declarations[key] = declaration_defs
+                if len(self._declarations) > self.max_declarations:
+                    self._declarations.popitem(last=False)
+                self.parsed_count += 1
+            else:
+                self._declarations.move_to_end(key)
+                for kind, kind_defs in declaration_defs.items():
+                    parser.defs[kind].update(kind_defs)
+                self.reused_count += 1
+            for kind, kind_defs in declaration_defs.items():
+                defs[kind].update(kind_defs)
+        return defs
+
+
+def get_pyclibrary_version() -> str:
+    try:
+        from importlib.metadata import version, PackageNotFoundError
+    except ImportError:  # Python < 3.8
+        return ''
+    try:
+        return version('pyclibrary')
+    except PackageNotFoundError:
+        return ''
+
+
+# Cache of parsed header definitions that is shared between checkouts and Tox versions. Entries are keyed by the
+# content of the header (not its path), so a header that was parsed once anywhere is never parsed again.
+# An entry is the magic, the format version and the zlib compressed pickle of the used definitions.
+# With a declaration parser, headers that aren't cached reuse the declarations it already parsed.
+# Like the build cache, entries are evicted least recently used first when the cache grows over its size limit.
+class ParseCache:
+    def __init__(self, directory: Optional[str] = None, declaration_parser: Optional[DeclarationParser] = None,
+                 read: bool = True, size_limit: int = DEFAULT_PARSE_CACHE_SIZE_LIMIT):
+        self.directory = directory or default_parse_cache_dir()
+        self.declaration_parser = declaration_parser
+        self.size_limit = size_limit
+        # When not reading, the headers are parsed and stored again so the next run can use them
+        self.read = read
+        self._key_prefix = f'{PARSE_CACHE_FORMAT_VERSION}\0{get_pyclibrary_version()}\0'.encode()
+
+    def key(self, header_content: bytes) -> str:
+        return hashlib.sha256(self._key_prefix + header_content).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key + PARSE_CACHE_EXTENSION)
+
+    def load(self, key: str) -> Optional[dict]:
+        path = self._path(key)
+        if not touch(path):
+            return None
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+
+        header = PARSE_CACHE_MAGIC + bytes([PARSE_CACHE_FORMAT_VERSION])
+        if not data.startswith(header):
+            return None
+        try:
+            return pickle.loads(zlib.decompress(data[len(header):]))
+        except (zlib.error, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+            # A corrupt entry is parsed again and overwritten
+            return None
+
+    def store(self, key: str, defs: dict):
+        os.makedirs(self.directory, exist_ok=True)
+        data = zlib.compress(pickle.dumps({kind: defs[kind] for kind in USED_DEFS}, protocol=4))
+        path = self._path(key)
+        temp_path = f'{path}.{os.getpid()}.tmp'
+        with open(temp_path, 'wb') as f:
+            f.write(PARSE_CACHE_MAGIC + bytes([PARSE_CACHE_FORMAT_VERSION]) + data)
+        os.replace(temp_path, path)
+        evict_least_recently_used(self.directory, self.size_limit, PARSE_CACHE_EXTENSION)
+
+    def parse(self, header_file: str) -> dict:
+        with open(header_file, 'rb') as f:
+            key = self.key(f.read())
+        defs = self.load(key) if self.read else None
+        if defs is None:
+            if self.declaration_parser:
+                defs = self.declaration_parser.parse(header_file)
+            else:
+                parser = CParser(header_file)
+                defs = parser.file_defs[os.path.basename(header_file)]
+            self.store(key, defs)
+        return defs
@@ -1,9 +1,6 @@
 from typing import Dict
 from ir import *
-
-
-def optimize_ctype_name(ctype_name: str) -> str:
-    return ctype_name.replace('struct ', '')
+from naming import intern_name, optimize_ctype_name, pascal_case_to_snake_case, snake_case_to_pascal_case
 
 
 primitives_ctype_ir_map: Dict[str, str] = {
@@ -18,12 +15,6 @@ primitives_ctype_ir_map: Dict[str, str] = {
 }
 
 
-def snake_case_to_pascal_case(string: str) -> str:
-    words: List[str] = string.split('_')
-    words_pascal_cased: List[str] = list(map(lambda word: word[0].upper() + word[1:], words))
-    return "".join(words_pascal_cased)
-
-
 def get_ir_type_from_ctype(ctype: CType, mutable: bool) -> IRType:
     optimized_ctype_name: str = optimize_ctype_name(ctype.name)
 
@@ -56,13 +47,14 @@ def parse_type(cparser_type) -> IRType:
             if type_qual == 'const':
                 mutable = False
 
-    return get_ir_type_from_ctype(CType(ctype_name, is_pointer), mutable)
+    return get_ir_type_from_ctype(CType(intern_name(ctype_name), is_pointer), mutable)
 
 
 def parse_functions(functions_defs: dict) -> List[IRFunction]:
     functions: List[IRFunction] = []
 
     for func_name, func_def in functions_defs.items():
+        func_name = intern_name(func_name)
         return_type = func_def.type_spec
         declarators = func_def.declarators[0]
 
@@ -70,6 +62,7 @@ def parse_functions(functions_defs: dict) -> List[IRFunction]:
         empty = declarators[0][1].type_spec == 'void' and not declarators[0][0]
         if not empty:
             for param_name, param_type, _ in declarators:
+                param_name = intern_name(param_name)
                 ir_param_type: IRType = parse_type(param_type)
 
                 # Check if the type acts as a string
@@ -91,10 +84,12 @@ def parse_enums(enums_defs: dict) -> List[IREnum]:
 
     for enum_name, enum_values in enums_defs.items():
         ir_enum_values: List[IREnumValue] = [
-            IREnumValue(name=value_name.replace(enum_name.upper() + '_', ''), cname=value_name, ordinal=value_ordinal)
+            IREnumValue(name=intern_name(value_name.replace(enum_name.upper() + '_', '')),
+                        cname=intern_name(value_name), ordinal=value_ordinal)
             for value_name, value_ordinal in enum_values.items()
         ]
-        ir_enum_name = enum_name.replace('_', '')
+        enum_name = intern_name(enum_name)
+        ir_enum_name = intern_name(enum_name.replace('_', ''))
         if enum_name != 'T':  # A weird bug
             enums.append(IREnum(ir_enum_name, enum_name, ir_enum_values))
 
@@ -0,0 +1,92 @@
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set
+
+
+# Subscriber to the events of running passes. Pass hooks to PassManager.add_hook() or to register_hook() to receive the
+# events of every pass manager.
+class PassHook:
+    def on_pass_start(self, pass_name: str, context: Any):
+        pass
+
+    def on_pass_end(self, pass_name: str, context: Any):
+        pass
+
+
+_global_hooks: List[PassHook] = []
+
+
+def register_hook(hook: PassHook):
+    _global_hooks.append(hook)
+
+
+def unregister_hook(hook: PassHook):
+    _global_hooks.remove(hook)
+
+
+class Pass:
+    def __init__(self, name: str, run: Callable[[Any], None], depends_on: List[str]):
+        self.name = name
+        self.run = run
+        self.depends_on = depends_on
+
+
+class PassManager:
+    def __init__(self):
+        self._passes: Dict[str, Pass] = {}
+        self._ordered_passes: Optional[List[Pass]] = None
+        self._hooks: List[PassHook] = []
+
+    def add_hook(self, hook: PassHook):
+        self._hooks.append(hook)
+
+    def remove_hook(self, hook: PassHook):
+        self._hooks.remove(hook)
+
+    def add(self, name: str, run: Callable[[Any], None], depends_on: Optional[List[str]] = None):
+        if name in self._passes:
+            raise RuntimeError(f'The pass "{name}" is already registered')
+        self._passes[name] = Pass(name, run, depends_on or [])
+        self._ordered_passes = None
+
+    def ordered_passes(self) -> List[Pass]:
+        if self._ordered_passes is None:
+            self._ordered_passes = self._sort_passes()
+        return self._ordered_passes
+
+    def _sort_passes(self) -> List[Pass]:
+        for ir_pass in self._passes.values():
+            for dependency in ir_pass.depends_on:
+                if dependency not in self._passes:
+                    raise RuntimeError(f'The pass "{ir_pass.name}" depends on the unknown pass "{dependency}"')
+
+        # Topological sort that keeps the registration order between passes that don't depend on each other
+        ordered_passes: List[Pass] = []
+        done: Set[str] = set()
+        pending: List[Pass] = list(self._passes.values())
+        while pending:
+            ready = next((ir_pass for ir_pass in pending if all(dep in done for dep in ir_pass.depends_on)), None)
+            if not ready:
+                raise RuntimeError(f'Cyclic dependency between the passes {[ir_pass.name for ir_pass in pending]}')
+            pending.remove(ready)
+            done.add(ready.name)
+            ordered_passes.append(ready)
+
+        return ordered_passes
+
+    def run(self, context: Any):
+        for ir_pass in self.ordered_passes():
+            with self.stage(ir_pass.name, context):
+                ir_pass.run(context)
+
+    # Reports a step that is not a registered pass (e.g. serialization) to the hooks as if it was one
+    @contextmanager
+    def stage(self, name: str, context: Any) -> Iterator[None]:
+        hooks = self._hooks + _global_hooks
+        for hook in hooks:
+            hook.on_pass_start(name, context)
+        # The hooks see the end of a pass that raised too, so the timers of profilers stay balanced
+        try:
+            yield
+        finally:
+            for hook in reversed(hooks):
+                hook.on_pass_end(name, context)
@@ -0,0 +1,90 @@
+from typing import Any, Dict, List, Optional, TextIO
+from ir import IRObject
+from ir_registry import IRRegistry
+from pass_manager import PassHook
+import json
+import time
+import tracemalloc
+
+
+def count_ir_nodes(roots: List[Any]) -> Dict[str, int]:
+    # Every IR object is counted once even if it's referenced from multiple places
+    counts: Dict[str, int] = {}
+    visited = set()
+    stack = list(roots)
+    while stack:
+        obj = stack.pop()
+        if isinstance(obj, list):
+            stack.extend(obj)
+        elif isinstance(obj, IRObject) and id(obj) not in visited:
+            visited.add(id(obj))
+            counts[obj.object_name] = counts.get(obj.object_name, 0) + 1
+            stack.extend(obj.field_values())
+    return counts
+
+
+class PassProfiler(PassHook):
+    def __init__(self, registry: IRRegistry):
+        self.registry = registry
+        self.records: List[dict] = []
+        self._start_wall_time = 0.0
+        self._start_cpu_time = 0.0
+        self._start_memory = 0
+        self._started_tracing = False
+
+    def start(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+
+    def stop(self):
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    def on_pass_start(self, pass_name: str, context: Any):
+        if hasattr(tracemalloc, 'reset_peak'):
+            tracemalloc.reset_peak()
+        else:  # Python < 3.9
+            tracemalloc.stop()
+            tracemalloc.start()
+        self._start_memory = tracemalloc.get_traced_memory()[0]
+        self._start_cpu_time = time.process_time()
+        self._start_wall_time = time.perf_counter()
+
+    def on_pass_end(self, pass_name: str, context: Any):
+        wall_time = time.perf_counter() - self._start_wall_time
+        cpu_time = time.process_time() - self._start_cpu_time
+        memory, memory_peak = tracemalloc.get_traced_memory()
+        # Headers are generated into their own registry. Functions of a header that are not in a class yet are part of
+        # the IR too.
+        registry: IRRegistry = getattr(context, 'registry', self.registry)
+        ir_nodes = count_ir_nodes([registry.enums, registry.exceptions, registry.classes,
+                                   getattr(context, 'ir_functions', [])])
+        self.records.append({
+            'stage': pass_name,
+            'header': getattr(context, 'header', None),
+            'wall_time': wall_time,
+            'cpu_time': cpu_time,
+            'memory_peak': max(memory_peak - self._start_memory, 0),
+            'memory_delta': memory - self._start_memory,
+            'ir_nodes': sum(ir_nodes.values()),
+            'ir_nodes_by_type': ir_nodes,
+        })
+
+    def write_report(self, path: str, metadata: Optional[dict] = None):
+        report = dict(metadata or {})
+        report['total_wall_time'] = sum(record['wall_time'] for record in self.records)
+        report['total_cpu_time'] = sum(record['cpu_time'] for record in self.records)
+        report['stages'] = self.records
+        with open(path, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    def print_summary(self, stream: TextIO):
+        total_wall_time = sum(record['wall_time'] for record in self.records) or 1.0
+        print(f'{"stage":<70} {"wall ms":>10} {"cpu ms":>10} {"%":>6} {"peak KiB":>10} {"nodes":>8}', file=stream)
+        for record in sorted(self.records, key=lambda r: r['wall_time'], reverse=True):
+            stage = f'{record["header"]}:{record["stage"]}' if record['header'] else record['stage']
+            print(f'{stage:<70} {record["wall_time"] * 1000:>10.2f} {record["cpu_time"] * 1000:>10.2f} '
+                  f'{record["wall_time"] / total_wall_time * 100:>6.1f} {record["memory_peak"] / 1024:>10.1f} '
+                  f'{record["ir_nodes"]:>8}', file=stream)
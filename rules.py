@@ -0,0 +1,124 @@
+from typing import Any, Dict, List, Set
+from ir import BUFFER_OWNERSHIPS
+import hashlib
+import json
+import os
+
+RULES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'rules.json')
+
+BUFFER_SIZE_KEYWORD_KINDS = ('return_types', 'getters', 'setters', 'params')
+
+
+def _check_mapping(value: Any, path: str) -> Dict[str, Any]:
+    if not isinstance(value, dict):
+        raise RuntimeError(f'The rule "{path}" must be an object')
+    return value
+
+
+def _check_names(value: Any, path: str) -> List[str]:
+    if not isinstance(value, list) or not all(isinstance(name, str) for name in value):
+        raise RuntimeError(f'The rule "{path}" must be a list of names')
+    return list(value)
+
+
+def _check_name_map(value: Any, path: str) -> Dict[str, str]:
+    if not all(isinstance(name, str) for name in _check_mapping(value, path).values()):
+        raise RuntimeError(f'The values of the rule "{path}" must be names')
+    return dict(value)
+
+
+# The special cases of the generator (renames, number handles, buffer size keywords...) that the header conventions
+# don't cover. They are read from a JSON rule file and compiled into dictionaries keyed by the class name and then
+# the function (or property) name, so a pass finds the rules of a class with one lookup and applies them only there.
+class GeneratorRules:
+    def __init__(self, rules: Dict[str, Any], source_hash: str = ''):
+        self.source_hash = source_hash
+        self.renamed_functions: Dict[str, Dict[str, str]] = {}
+        self.renamed_properties: Dict[str, Dict[str, str]] = {}
+        for class_name, class_renames in _check_mapping(rules.get('rename', {}), 'rename').items():
+            path = f'rename.{class_name}'
+            unknown_keys = set(_check_mapping(class_renames, path)) - {'functions', 'properties'}
+            if unknown_keys:
+                raise RuntimeError(f'Unknown keys {", ".join(sorted(unknown_keys))} in the rule "{path}"')
+            if 'functions' in class_renames:
+                self.renamed_functions[class_name] = _check_name_map(class_renames['functions'], f'{path}.functions')
+            if 'properties' in class_renames:
+                self.renamed_properties[class_name] = _check_name_map(class_renames['properties'],
+                                                                      f'{path}.properties')
+
+        # Functions whose '_number' parameter is another handle and not the class they belong in
+        self.kept_number_handle_params: Dict[str, Set[str]] = {
+            class_name: set(_check_names(names, f'keep_number_handle_params.{class_name}'))
+            for class_name, names in _check_mapping(rules.get('keep_number_handle_params', {}),
+                                                    'keep_number_handle_params').items()
+        }
+        # The number handle class that a function returns
+        self.number_handle_return_types: Dict[str, Dict[str, str]] = {
+            class_name: _check_name_map(return_types, f'number_handle_return_types.{class_name}')
+            for class_name, return_types in _check_mapping(rules.get('number_handle_return_types', {}),
+                                                           'number_handle_return_types').items()
+        }
+        # The function that initializes a struct with the default values
+        self.default_inits: Dict[str, str] = _check_name_map(rules.get('default_init', {}), 'default_init')
+        # Functions that are getters of properties, although their name doesn't say so
+        self.getter_properties: Dict[str, List[str]] = {
+            class_name: _check_names(names, f'getter_properties.{class_name}')
+            for class_name, names in _check_mapping(rules.get('getter_properties', {}), 'getter_properties').items()
+        }
+        # The keyword to search the size function of a buffer with, when it isn't the name of the function without
+        # 'get_' or 'set_'
+        self.buffer_size_keywords: Dict[str, Dict[str, Dict[str, str]]] = {kind: {} for kind in
+                                                                           BUFFER_SIZE_KEYWORD_KINDS}
+        buffer_size_keywords = _check_mapping(rules.get('buffer_size_keywords', {}), 'buffer_size_keywords')
+        for kind, classes_keywords in buffer_size_keywords.items():
+            if kind not in BUFFER_SIZE_KEYWORD_KINDS:
+                raise RuntimeError(f'Unknown kind "{kind}" of buffer size keywords')
+            for class_name, keywords in _check_mapping(classes_keywords, f'buffer_size_keywords.{kind}').items():
+                self.buffer_size_keywords[kind][class_name] = _check_name_map(
+                    keywords, f'buffer_size_keywords.{kind}.{class_name}')
+
+        # The ownership of buffers that the default ownership of their kind doesn't describe, by parameter name
+        # ('return' for the returned buffer), e.g. the options that keep the pointers they are given
+        self.buffer_ownerships: Dict[str, Dict[str, Dict[str, str]]] = {}
+        buffer_ownerships = _check_mapping(rules.get('buffer_ownership', {}), 'buffer_ownership')
+        for class_name, functions_ownerships in buffer_ownerships.items():
+            path = f'buffer_ownership.{class_name}'
+            self.buffer_ownerships[class_name] = {}
+            for func_name, ownerships in _check_mapping(functions_ownerships, path).items():
+                ownerships = _check_name_map(ownerships, f'{path}.{func_name}')
+                unknown_ownerships = set(ownerships.values()) - set(BUFFER_OWNERSHIPS)
+                if unknown_ownerships:
+                    raise RuntimeError(f'Unknown buffer ownerships {", ".join(sorted(unknown_ownerships))} in the rule '
+                                       f'"{path}.{func_name}"')
+                self.buffer_ownerships[class_name][func_name] = ownerships
+
+        # The classes whose native handle gets the field layout of its struct, checked against their properties
+        self.struct_layouts: List[str] = _check_names(rules.get('struct_layouts', []), 'struct_layouts')
+        # The callback classes after which the library may reuse the numbers of a number handle class
+        self.number_handle_invalidate_callbacks: Dict[str, List[str]] = {
+            class_name: _check_names(names, f'number_handle_invalidate_callbacks.{class_name}')
+            for class_name, names in _check_mapping(rules.get('number_handle_invalidate_callbacks', {}),
+                                                    'number_handle_invalidate_callbacks').items()
+        }
+
+        unknown_keys = set(rules) - {'rename', 'keep_number_handle_params', 'number_handle_return_types',
+                                     'default_init', 'getter_properties', 'buffer_size_keywords', 'buffer_ownership',
+                                     'struct_layouts', 'number_handle_invalidate_callbacks'}
+        if unknown_keys:
+            raise RuntimeError(f'Unknown rules {", ".join(sorted(unknown_keys))}')
+
+    def get_buffer_size_keywords(self, kind: str, class_name: str) -> Dict[str, str]:
+        return self.buffer_size_keywords[kind].get(class_name, {})
+
+    def get_buffer_ownerships(self, class_name: str) -> Dict[str, Dict[str, str]]:
+        return self.buffer_ownerships.get(class_name, {})
+
+
+def load_rules(path: str = RULES_FILE) -> GeneratorRules:
+    with open(path, 'rb') as f:
+        data = f.read()
+    try:
+        rules = json.loads(data)
+    except ValueError as e:
+        raise RuntimeError(f'The rule file {path} is not valid JSON: {e}')
+    return GeneratorRules(_check_mapping(rules, path), hashlib.sha256(data).hexdigest())